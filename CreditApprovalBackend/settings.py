@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 from decouple import config, Csv
 
@@ -29,6 +30,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestIdMiddleware",
+    "core.middleware.AdmissionControlMiddleware",
+    "core.middleware.ProfilingMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -117,3 +122,161 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "custom_auth.User"
+
+# Seconds a stored `Idempotency-Key` response can be replayed before it is evicted
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60, cast=int)
+
+# Seconds a view-loan / view-loans response stays in the cache for a given loans version
+LOAN_RESPONSE_CACHE_TIMEOUT = config("LOAN_RESPONSE_CACHE_TIMEOUT", default=60 * 60, cast=int)
+
+# Raise when a view decorated with `core.decorators.query_budget` exceeds its query budget
+QUERY_BUDGET_ENFORCED = config("QUERY_BUDGET_ENFORCED", default=False, cast=bool)
+
+# Pricing policy used for the "default" product when no PricingPolicy row exists for it.
+# Bands are [min_score, rate_floor] pairs: scores above min_score get at least rate_floor
+# (null approves the requested rate), scores at or below every band are rejected.
+DEFAULT_PRICING_POLICY = config(
+    "DEFAULT_PRICING_POLICY",
+    default='{"max_dti_ratio": 0.5, "bands": [[50, null], [30, 12], [10, 16]]}',
+    cast=json.loads,
+)
+# Seconds a worker keeps a compiled pricing policy before reloading it from the database
+PRICING_POLICY_RELOAD_SECONDS = config("PRICING_POLICY_RELOAD_SECONDS", default=60, cast=int)
+
+# Seconds the generated swagger schema is cached; it is only built on the first docs request
+API_SCHEMA_CACHE_TIMEOUT = config("API_SCHEMA_CACHE_TIMEOUT", default=60 * 60, cast=int)
+
+# Longest loan tenure issued, in months. When set, `Loan.objects.active()` also bounds
+# date_of_approval so PostgreSQL can prune partitions (see `partition_loans`). Credit scoring
+# reads every loan of the customer whatever its approval date, so it is never pruned.
+LOAN_MAX_TENURE_MONTHS = config("LOAN_MAX_TENURE_MONTHS", default=0, cast=int)
+
+# Per job type override of how many jobs a `run_jobs` worker runs at once, e.g. {"bulk_eligibility": 4}
+JOB_CONCURRENCY = config("JOB_CONCURRENCY", default="{}", cast=json.loads)
+# A `run_jobs` worker refreshes the heartbeat of its running jobs every JOB_HEARTBEAT_INTERVAL
+# seconds. Running jobs without a heartbeat for JOB_LEASE_SECONDS belong to a dead worker: they
+# are queued again, or failed once they have been started JOB_MAX_ATTEMPTS times.
+JOB_HEARTBEAT_INTERVAL = config("JOB_HEARTBEAT_INTERVAL", default=30, cast=float)
+JOB_LEASE_SECONDS = config("JOB_LEASE_SECONDS", default=300, cast=float)
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", default=3, cast=int)
+# Job types `run_jobs` workers enqueue once a day, for that day's date
+JOB_DAILY = config("JOB_DAILY", default="snapshot_scores", cast=Csv())
+
+# On PostgreSQL, score the customer, check limits and insert the loan of a create-loan
+# request in a single SQL statement (see `core.exposure`) instead of several queries
+LOAN_CREATE_SINGLE_STATEMENT = config("LOAN_CREATE_SINGLE_STATEMENT", default=True, cast=bool)
+
+# Read money from the integer paise columns (exact sums) instead of the float columns.
+# Both are always written; run `backfill_minor_units` for rows written before the switch.
+MONEY_MINOR_UNITS_READS = config("MONEY_MINOR_UNITS_READS", default=False, cast=bool)
+
+# Request profiling (see `core.middleware.ProfilingMiddleware`). A request is profiled when it
+# sends PROFILING_HEADER set to PROFILING_TOKEN, or at random for PROFILING_SAMPLE_RATE (0-1)
+# of the traffic. With no token and a zero rate the middleware is not loaded at all.
+PROFILING_TOKEN = config("PROFILING_TOKEN", default="")
+PROFILING_HEADER = config("PROFILING_HEADER", default="X-Profile")
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+# Number of most recent captures kept
+PROFILING_MAX_CAPTURES = config("PROFILING_MAX_CAPTURES", default=200, cast=int)
+
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+# At most LOG_SAMPLE_BURST records per message template are written every
+# LOG_SAMPLE_WINDOW seconds, the rest are counted as suppressed. 0 disables sampling.
+# Errors are always written.
+LOG_SAMPLE_BURST = config("LOG_SAMPLE_BURST", default=20, cast=int)
+LOG_SAMPLE_WINDOW = config("LOG_SAMPLE_WINDOW", default=60, cast=float)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "core.log.JsonFormatter"},
+    },
+    "filters": {
+        "request_context": {"()": "core.log.RequestContextFilter"},
+        "sampling": {
+            "()": "core.log.SamplingFilter",
+            "burst": LOG_SAMPLE_BURST,
+            "window": LOG_SAMPLE_WINDOW,
+        },
+    },
+    "handlers": {
+        "json": {
+            "()": "core.log.QueueStreamHandler",
+            "formatter": "json",
+            "filters": ["request_context", "sampling"],
+        },
+    },
+    "root": {"handlers": ["json"], "level": LOG_LEVEL},
+    "loggers": {
+        "django": {"handlers": ["json"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
+
+# Hash sharding of customers and their loans (see `core.sharding`). A JSON list with one
+# object per extra shard, each overriding keys of the default database, e.g.
+# [{"NAME": "credit_1"}, {"NAME": "credit_2", "HOST": "db2"}]. Empty disables sharding.
+DATABASE_SHARDS = config("DATABASE_SHARDS", default="[]", cast=json.loads)
+for index, override in enumerate(DATABASE_SHARDS, start=1):
+    DATABASES[f"shard_{index}"] = {**DATABASES["default"], **override}
+SHARD_DATABASES = ["default", *(f"shard_{index}" for index in range(1, len(DATABASE_SHARDS) + 1))]
+# Customers and loans with ids up to this one were created before sharding and stay on default
+SHARD_LEGACY_MAX_ID = config("SHARD_LEGACY_MAX_ID", default=0, cast=int)
+DATABASE_ROUTERS = ["core.sharding.ShardRouter"] if DATABASE_SHARDS else []
+
+# Event feed (see `core.outbox`): longest a request may wait for new events, and the most
+# events returned per request. A waiting request holds a gunicorn thread (see
+# creditApproval.conf), keep the wait short. Threads that waited keep a connection
+# listening to each shard's outbox inserts open.
+EVENT_FEED_MAX_WAIT = config("EVENT_FEED_MAX_WAIT", default=20, cast=float)
+EVENT_FEED_MAX_LIMIT = config("EVENT_FEED_MAX_LIMIT", default=1000, cast=int)
+
+# Admission control (see `core.middleware.AdmissionControlMiddleware`). Each client, identified
+# by ADMISSION_CLIENT_HEADER or else its address, may send ADMISSION_RATE requests per second
+# with bursts of ADMISSION_BURST (0 disables). Requests that waited in the proxy's queue for
+# more than ADMISSION_MAX_QUEUE_DELAY_MS (from `X-Request-Start`, 0 disables) are shed.
+ADMISSION_RATE = config("ADMISSION_RATE", default=0.0, cast=float)
+ADMISSION_BURST = config("ADMISSION_BURST", default=20, cast=int)
+ADMISSION_CLIENT_HEADER = config("ADMISSION_CLIENT_HEADER", default="")
+ADMISSION_MAX_QUEUE_DELAY_MS = config("ADMISSION_MAX_QUEUE_DELAY_MS", default=0, cast=float)
+# Requests of a `limit_concurrency` pool run at once across all workers, e.g. {"scoring": 2}
+ADMISSION_CONCURRENCY = config("ADMISSION_CONCURRENCY", default="{}", cast=json.loads)
+# Seconds after which a concurrency slot is freed even if its request never finished
+ADMISSION_SLOT_TIMEOUT = config("ADMISSION_SLOT_TIMEOUT", default=90, cast=int)
+ADMISSION_RETRY_AFTER = config("ADMISSION_RETRY_AFTER", default=1, cast=int)
+# Cache holding the buckets and slots. It has to be shared by the workers, a per-process
+# LocMemCache is refused. The "admission" cache is a table created by `prepare_server`.
+ADMISSION_CACHE = config("ADMISSION_CACHE", default="admission")
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "admission": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "core_admission_cache",
+    },
+}
+
+# Tests (see `core.testing.TestRunner`): processes to run them in ("auto" for one per core,
+# --parallel overrides it), and customers of the synthetic book loaded once into the "seed"
+# test database for scale tests. The runner adds the "seed" alias for it.
+TEST_RUNNER = "core.testing.TestRunner"
+TEST_PARALLEL = config("TEST_PARALLEL", default="auto")
+TEST_SEED_CUSTOMERS = config("TEST_SEED_CUSTOMERS", default=2000, cast=int)
+
+# API responses: render JSON with orjson when it is installed (see `core.renderers`), and
+# compress JSON bodies of RESPONSE_COMPRESSION_MIN_SIZE bytes or more with the first of
+# RESPONSE_COMPRESSION the client accepts (see `core.middleware.CompressionMiddleware`),
+# e.g. "zstd,gzip". zstd needs the zstandard package. Empty disables compression.
+API_FAST_JSON = config("API_FAST_JSON", default=False, cast=bool)
+JSON_RENDERER = (
+    "core.renderers.FastJSONRenderer" if API_FAST_JSON else "rest_framework.renderers.JSONRenderer"
+)
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        JSON_RENDERER,
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+RESPONSE_COMPRESSION = config("RESPONSE_COMPRESSION", default="", cast=Csv())
+RESPONSE_COMPRESSION_MIN_SIZE = config("RESPONSE_COMPRESSION_MIN_SIZE", default=1024, cast=int)
+RESPONSE_COMPRESSION_GZIP_LEVEL = config("RESPONSE_COMPRESSION_GZIP_LEVEL", default=6, cast=int)
+RESPONSE_COMPRESSION_ZSTD_LEVEL = config("RESPONSE_COMPRESSION_ZSTD_LEVEL", default=3, cast=int)
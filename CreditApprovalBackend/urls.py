@@ -1,30 +1,55 @@
+from functools import lru_cache
+
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Credit Approval System API",
-        default_version="v1",
-        description="API Documentation for Credit Approval System",
-        contact=openapi.Contact(email="henishpatel9045@gmail.com"),
-    ),
-    public=True,
-)
+
+
+@lru_cache(maxsize=None)
+def get_api_schema_view():
+    """Build the drf_yasg schema view on first use instead of at worker boot."""
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    return get_schema_view(
+        openapi.Info(
+            title="Credit Approval System API",
+            default_version="v1",
+            description="API Documentation for Credit Approval System",
+            contact=openapi.Contact(email="henishpatel9045@gmail.com"),
+        ),
+        public=True,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema_json_view():
+    return get_api_schema_view().without_ui(
+        cache_timeout=settings.API_SCHEMA_CACHE_TIMEOUT
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema_swagger_ui_view():
+    return get_api_schema_view().with_ui(
+        "swagger", cache_timeout=settings.API_SCHEMA_CACHE_TIMEOUT
+    )
+
+
+def schema_json_view(request, *args, **kwargs):
+    return get_schema_json_view()(request, *args, **kwargs)
+
+
+def schema_swagger_ui_view(request, *args, **kwargs):
+    return get_schema_swagger_ui_view()(request, *args, **kwargs)
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("core.urls")),
-    path(
-        "swagger<format>/", schema_view.without_ui(cache_timeout=0), name="schema-json"
-    ),
-    path(
-        "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
+    path("swagger<format>/", schema_json_view, name="schema-json"),
+    path("swagger/", schema_swagger_ui_view, name="schema-swagger-ui"),
 ]
 
 urlpatterns += staticfiles_urlpatterns()
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CreditApprovalBackend.settings')
 
 application = get_wsgi_application()
+
+# Resolve the URLconf (and import every view module) now, so that gunicorn's
+# --preload does it once in the master instead of on each worker's first request.
+from django.urls import get_resolver  # noqa: E402
+
+get_resolver().url_patterns
@@ -1,3 +1,14 @@
 from django.contrib import admin
 
-# Register your models here.
+from core.models import PricingBand, PricingPolicy
+
+
+class PricingBandInline(admin.TabularInline):
+    model = PricingBand
+    extra = 0
+
+
+@admin.register(PricingPolicy)
+class PricingPolicyAdmin(admin.ModelAdmin):
+    list_display = ("product", "max_dti_ratio", "updated_at")
+    inlines = (PricingBandInline,)
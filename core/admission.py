@@ -0,0 +1,84 @@
+import math
+import random
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+# Accepted units of a request start timestamp, largest first: microseconds, milliseconds, seconds
+REQUEST_START_UNITS = ((1e15, 1e6), (1e12, 1e3), (0, 1))
+
+
+def get_cache():
+    """Cache shared by all workers; a per-process cache would only limit each worker on its own"""
+    cache = caches[settings.ADMISSION_CACHE]
+    if isinstance(cache, LocMemCache):
+        raise ImproperlyConfigured(
+            f"ADMISSION_CACHE {settings.ADMISSION_CACHE!r} is a LocMemCache, which the "
+            "workers do not share."
+        )
+    return cache
+
+
+def client_key(request) -> str:
+    if settings.ADMISSION_CLIENT_HEADER:
+        header = "HTTP_" + settings.ADMISSION_CLIENT_HEADER.upper().replace("-", "_")
+        client = request.META.get(header)
+        if client:
+            return client[:64]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def take_token(client: str, now: float | None = None) -> float:
+    """Take a token from the bucket of `client`, return 0 or the seconds until one is available
+
+    Buckets hold up to `ADMISSION_BURST` tokens and refill at `ADMISSION_RATE`
+    tokens per second. The read-modify-write is not atomic, so concurrent
+    requests of one client can occasionally both take the last token.
+    """
+    rate, burst = settings.ADMISSION_RATE, settings.ADMISSION_BURST
+    now = time.time() if now is None else now
+    cache, key = get_cache(), f"admission:bucket:{client}"
+    tokens, updated = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + max(now - updated, 0) * rate)
+    wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+    # An untouched bucket is full again after `burst / rate` seconds, let it expire then.
+    cache.set(key, (tokens - 1 if not wait else tokens, now), math.ceil(burst / rate) + 1)
+    return wait
+
+
+def queue_delay_ms(request, now: float | None = None) -> float | None:
+    """Time the request waited before reaching Django, from the proxy's `X-Request-Start`
+
+    Accepts `t=<epoch>` or a bare epoch in seconds, milliseconds or microseconds
+    (nginx `t=${msec}`, Heroku, ...). `None` without a usable header.
+    """
+    value = request.META.get("HTTP_X_REQUEST_START", "").removeprefix("t=")
+    try:
+        start = float(value)
+    except ValueError:
+        return None
+    if not start > 0:
+        return None
+    per_second = next(per_second for above, per_second in REQUEST_START_UNITS if start > above)
+    now = time.time() if now is None else now
+    return max(now - start / per_second, 0) * 1000
+
+
+def acquire_slot(pool: str, limit: int) -> str | None:
+    """Take one of `limit` slots of `pool` across all workers, return its key or `None`
+
+    Each slot is a cache key added atomically. Slots expire after
+    `ADMISSION_SLOT_TIMEOUT` seconds, so a worker killed mid-request can't leak one.
+    """
+    cache = get_cache()
+    for index in random.sample(range(limit), limit):
+        key = f"admission:slot:{pool}:{index}"
+        if cache.add(key, 1, settings.ADMISSION_SLOT_TIMEOUT):
+            return key
+    return None
+
+
+def release_slot(key: str) -> None:
+    get_cache().delete(key)
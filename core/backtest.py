@@ -0,0 +1,133 @@
+import datetime
+import io
+import math
+from django.db import connections
+
+from core.exposure import APPROVED, DTI_EXCEEDED, RATE_UPDATED, REJECTED
+from core.models import MINOR_UNITS_PER_RUPEE, CustomerScoreSnapshot
+from core.pricing import CompiledPricingPolicy
+from core.sharding import for_each_shard
+from core.utils import calculate_emi
+
+# Ordered like the checks of `determine_loan_eligibility`, earlier ones win.
+OUTCOMES = (DTI_EXCEEDED, REJECTED, RATE_UPDATED, APPROVED)
+# Snapshot columns a backtest reads, all NOT NULL and sent as int8 by binary COPY.
+BACKTEST_COLUMNS = ("credit_score", "monthly_salary_paise", "total_monthly_payment_paise")
+# Signature, flags and header extension length of binary COPY output; trailer: -1 field count.
+COPY_HEADER_LENGTH = 19
+COPY_TRAILER_LENGTH = 2
+
+
+def load_snapshots(alias: str, day: datetime.date):
+    """The `BACKTEST_COLUMNS` of a day's snapshots on a shard, as a numpy record array
+
+    Every row of the binary COPY has the same width, so the payload is read as
+    is instead of converting one Python object per value.
+    """
+    import numpy as np
+
+    fields = [("field_count", ">i2")]
+    for column in BACKTEST_COLUMNS:
+        fields += [(f"{column}_length", ">i4"), (column, ">i8")]
+    columns = ", ".join(f"{column}::int8" for column in BACKTEST_COLUMNS)
+    buffer = io.BytesIO()
+    with connections[alias].cursor() as cursor:
+        cursor.copy_expert(
+            cursor.mogrify(
+                f"COPY (SELECT {columns} FROM {CustomerScoreSnapshot._meta.db_table} "
+                "WHERE date = %s) TO STDOUT WITH (FORMAT binary)",
+                [day],
+            ).decode(),
+            buffer,
+        )
+    payload = buffer.getbuffer()[COPY_HEADER_LENGTH:-COPY_TRAILER_LENGTH]
+    return np.frombuffer(payload, dtype=np.dtype(fields))
+
+
+def decide(snapshots, policy: CompiledPricingPolicy, interest_rate: float, monthly_payment: float):
+    """Index into `OUTCOMES` of the decision on a loan request for every snapshot
+
+    Same checks as `determine_loan_eligibility`, on whole columns at once.
+    """
+    import numpy as np
+
+    thresholds = np.array(policy.thresholds, dtype=np.int64)
+    rate_floors = np.array(
+        [math.nan if floor is None else floor for floor in policy.rate_floors] + [math.nan]
+    )
+    # `CompiledPricingPolicy.price`: the highest band whose min_score the score exceeds.
+    band = np.searchsorted(thresholds, snapshots["credit_score"], side="left") - 1
+    rejected = band < 0
+    # Rejected scores point at the trailing NaN.
+    rate_floor = rate_floors[band]
+    rate_updated = interest_rate < rate_floor
+    dti_exceeded = (
+        snapshots["total_monthly_payment_paise"] / MINOR_UNITS_PER_RUPEE + monthly_payment
+        > snapshots["monthly_salary_paise"] / MINOR_UNITS_PER_RUPEE * policy.max_dti_ratio
+    )
+    return np.select([dti_exceeded, rejected, rate_updated], [0, 1, 2], default=3)
+
+
+def backtest_shard(
+    alias: str,
+    days: list[datetime.date],
+    policy: CompiledPricingPolicy,
+    interest_rate: float,
+    monthly_payment: float,
+) -> dict[str, list]:
+    """Per month: `[snapshots, sum of credit scores, count of each of OUTCOMES]`"""
+    import numpy as np
+
+    months = {}
+    for day in days:
+        snapshots = load_snapshots(alias, day)
+        totals = months.setdefault(day.strftime("%Y-%m"), [0, 0, [0] * len(OUTCOMES)])
+        totals[0] += len(snapshots)
+        totals[1] += int(snapshots["credit_score"].sum())
+        counts = np.bincount(
+            decide(snapshots, policy, interest_rate, monthly_payment), minlength=len(OUTCOMES)
+        )
+        totals[2] = [total + int(count) for total, count in zip(totals[2], counts)]
+    return months
+
+
+def backtest_policy(
+    policy: CompiledPricingPolicy,
+    loan_amount: float,
+    interest_rate: float,
+    tenure: int,
+    since: datetime.date,
+    until: datetime.date,
+    step: int = 1,
+) -> list[dict]:
+    """Decide the same loan request for every customer on every snapshot day in a range
+
+    Reads the `CustomerScoreSnapshot`s of every `step`-th day from `since` to
+    `until` and returns, per month, the number of snapshots, the mean credit
+    score and how many decisions had each outcome. Days without snapshots are
+    skipped.
+    """
+    days, day = [], since
+    while day <= until:
+        days.append(day)
+        day += datetime.timedelta(days=step)
+    monthly_payment = calculate_emi(loan_amount, tenure, interest_rate)
+    months = {}
+    for shard_months in for_each_shard(
+        backtest_shard, days, policy, interest_rate, monthly_payment
+    ).values():
+        for month, (snapshots, score_sum, counts) in shard_months.items():
+            totals = months.setdefault(month, [0, 0, [0] * len(OUTCOMES)])
+            totals[0] += snapshots
+            totals[1] += score_sum
+            totals[2] = [total + count for total, count in zip(totals[2], counts)]
+    return [
+        {
+            "month": month,
+            "snapshots": snapshots,
+            "mean_credit_score": round(score_sum / snapshots, 2),
+            **dict(zip(OUTCOMES, counts)),
+        }
+        for month, (snapshots, score_sum, counts) in sorted(months.items())
+        if snapshots
+    ]
@@ -0,0 +1,69 @@
+import gzip
+
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # zstd is only offered when the package is installed
+    zstandard = None
+
+# Content types compressed, matched on their start. Only JSON: HTML pages (e.g. the
+# browsable API) hold the CSRF token, which compression would expose to BREACH.
+COMPRESSIBLE_CONTENT_TYPES = ("application/json",)
+
+
+def gzip_compress(data: bytes) -> bytes:
+    # mtime=0 keeps the output, and so the bytes on the wire, stable for the same body.
+    return gzip.compress(data, compresslevel=settings.RESPONSE_COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=settings.RESPONSE_COMPRESSION_ZSTD_LEVEL).compress(data)
+
+
+COMPRESSORS = {"gzip": gzip_compress}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = zstd_compress
+
+
+def offered_encodings() -> list[str]:
+    """`RESPONSE_COMPRESSION` encodings this process can produce, most preferred first"""
+    return [encoding for encoding in settings.RESPONSE_COMPRESSION if encoding in COMPRESSORS]
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Codings of an `Accept-Encoding` header with their q-values"""
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(header: str, offered: list[str]) -> str | None:
+    """The offered encoding the client ranks highest, `None` to send the body as is
+
+    Ties go to the earlier encoding in `offered`. Codings with q=0 are refused,
+    `*` stands for every coding not listed.
+    """
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in offered:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return COMPRESSORS[encoding](data)
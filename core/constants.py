@@ -1,5 +1,18 @@
 LOAN_SUCCESSFUL_MESSAGE = "Eligible for loan."
 LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE = "Monthly payment exceeds 50% of salary."
-LOAN_UNSUCCESSFUL_12_MESSAGE = "Interest rate updated to 12% for low credit score."
-LOAN_UNSUCCESSFUL_16_MESSAGE = "Interest rate updated to 16% for low credit score."
+LOAN_INTEREST_RATE_UPDATED_MESSAGE = "Interest rate updated to {rate:g}% for low credit score."
 LOAN_UNSUCCESSFUL_MESSAGE = "Eligible for loan."
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_TOO_LONG_MESSAGE = "Idempotency-Key must be at most 255 characters."
+IDEMPOTENCY_KEY_REUSED_MESSAGE = "Idempotency-Key was already used with a different request body."
+
+CUSTOMER_NOT_FOUND_MESSAGE = "Customer not found."
+
+DEFAULT_PRICING_PRODUCT = "default"
+UNKNOWN_PRICING_PRODUCT_MESSAGE = "Unknown loan product."
+
+RATE_LIMITED_MESSAGE = "Too many requests, retry later."
+SERVER_BUSY_MESSAGE = "Server is busy, retry later."
+
+JOB_LEASE_EXPIRED_MESSAGE = "The worker running this job stopped, it was started too many times."
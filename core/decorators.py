@@ -1,12 +1,102 @@
+import hashlib
+import logging
+from datetime import datetime, time, timedelta
 from functools import wraps
+from time import perf_counter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework import status
 
+from core.admission import acquire_slot, release_slot
+from core.constants import (
+    IDEMPOTENCY_KEY_HEADER,
+    IDEMPOTENCY_KEY_REUSED_MESSAGE,
+    IDEMPOTENCY_KEY_TOO_LONG_MESSAGE,
+    SERVER_BUSY_MESSAGE,
+)
+from core.models import IdempotencyKey
+from core.sharding import shard_for_customer
+from core.utils import get_customer_loans_version, request_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries: int):
+    """Declare the maximum number of SQL queries a view may run per request.
+
+    The budget is only checked when `settings.QUERY_BUDGET_ENFORCED` is set (the
+    test suite turns it on), so production requests pay nothing for it. Apply it
+    outside `handle_exceptions` so a violation is not turned into a 500 response,
+    and inside `limit_concurrency`, whose slots cost cache queries of their own.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.QUERY_BUDGET_ENFORCED:
+                return func(*args, **kwargs)
+            from django.test.utils import CaptureQueriesContext
+
+            with CaptureQueriesContext(connection) as queries:
+                response = func(*args, **kwargs)
+            if len(queries) > max_queries:
+                raise QueryBudgetExceeded(
+                    f"{func.__qualname__} ran {len(queries)} queries, budget is {max_queries}:\n"
+                    + "\n".join(query["sql"] for query in queries.captured_queries)
+                )
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
+
+
+def limit_concurrency(pool: str):
+    """Run at most `settings.ADMISSION_CONCURRENCY[pool]` requests of the views in `pool`
+    at once, across all workers, and answer the rest with 503 and `Retry-After`.
+
+    Keeps slow views from taking every worker, so cheap requests are still served
+    under load. Without a limit configured for the pool the view runs unchecked.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            limit = settings.ADMISSION_CONCURRENCY.get(pool)
+            if not limit:
+                return func(*args, **kwargs)
+            slot = acquire_slot(pool, limit)
+            if slot is None:
+                logger.warning("Concurrency limit reached", extra={"pool": pool})
+                return Response(
+                    {"message": SERVER_BUSY_MESSAGE},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+                )
+            try:
+                return func(*args, **kwargs)
+            finally:
+                release_slot(slot)
+
+        return wrapper
+
+    return decorator
+
 
 def handle_exceptions(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        start = perf_counter()
         try:
             return func(*args, **kwargs)
         except ValidationError as e:
@@ -14,11 +104,166 @@ def handle_exceptions(func):
                 {"message": e.detail},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        except Exception as e:
-            print(e)
+        except Exception:
+            request = args[1] if len(args) > 1 else None
+            data = getattr(request, "data", None)
+            logger.exception(
+                "Unhandled error in %s",
+                func.__qualname__,
+                extra={
+                    "view": func.__qualname__,
+                    "path": getattr(request, "path", None),
+                    "customer_id": kwargs.get("customer_id")
+                    or (data.get("customer_id") if isinstance(data, dict) else None),
+                    "duration_ms": round((perf_counter() - start) * 1000, 2),
+                },
+            )
             return Response(
                 {"message": "Internal Server Error"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
     return wrapper
+
+
+def idempotency_key_shard(data) -> str:
+    """Shard the view writes to: the one of the body's `customer_id`, if it has a valid one"""
+    try:
+        return shard_for_customer(int(data.get("customer_id")))
+    except (AttributeError, TypeError, ValueError):
+        return DEFAULT_DB_ALIAS
+
+
+def idempotent(func):
+    """Replay the stored response when a request repeats an `Idempotency-Key` header.
+
+    The key row is stored on the shard of the request's `customer_id` (`default`
+    without one) and inserted (or locked) inside a transaction on that shard
+    wrapping the view, so the loan and the response stored for the key commit
+    together. Concurrent retries with the same key wait for the first one to
+    finish and then replay its response instead of running the view again.
+    Responses with a 5xx status are not stored, which lets the client retry them.
+    Keys are unique per shard: a key reused for another customer's shard is not
+    detected as reused.
+    """
+
+    @wraps(func)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return func(view, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            raise ValidationError(IDEMPOTENCY_KEY_TOO_LONG_MESSAGE)
+
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        request_hash = request_fingerprint(request.data)
+        shard = idempotency_key_shard(request.data)
+        keys = IdempotencyKey.objects.using(shard)
+        with transaction.atomic(using=shard):
+            # ON CONFLICT DO NOTHING waits for a concurrent insert of the same key to commit.
+            keys.bulk_create(
+                [
+                    IdempotencyKey(
+                        key=key, request_hash=request_hash, expires_at=expires_at
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+            record = keys.select_for_update().get(key=key)
+            if record.expires_at <= now:
+                record.request_hash = request_hash
+                record.status_code = None
+                record.response_body = None
+                record.expires_at = expires_at
+                record.save()
+            if record.request_hash != request_hash:
+                return Response(
+                    {"message": IDEMPOTENCY_KEY_REUSED_MESSAGE},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.status_code is not None:
+                response = Response(record.response_body, status=record.status_code)
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            response = func(view, request, *args, **kwargs)
+            if response.status_code >= 500:
+                record.delete()
+                return response
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=["status_code", "response_body"])
+            return response
+
+    return wrapper
+
+
+def conditional_customer_response(resolve_customer_id):
+    """Serve conditional GETs of customer loan data from the customer's loans version.
+
+    `resolve_customer_id` receives the view kwargs and returns the customer id
+    whose loans the response depends on. The ETag and the server-side cache key
+    are derived from that customer's `CustomerLoansVersion` and today's date
+    (repayments left change daily), so unchanged polls are answered with a 304
+    or from the cache without querying the Loan table.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            customer_id = resolve_customer_id(**kwargs)
+            version = (
+                get_customer_loans_version(customer_id)
+                if customer_id is not None
+                else None
+            )
+            if version is None:
+                return func(view, request, *args, **kwargs)
+
+            today = timezone.localdate()
+            version_number, updated_at = version
+            last_modified = max(
+                updated_at,
+                timezone.make_aware(datetime.combine(today, time.min)),
+            )
+            tag = hashlib.md5(
+                f"{request.get_full_path()}:{customer_id}:{version_number}:{today}".encode()
+            ).hexdigest()
+            etag = quote_etag(tag)
+            headers = {
+                "ETag": etag,
+                "Last-Modified": http_date(last_modified.timestamp()),
+                "Cache-Control": "no-cache",
+            }
+
+            if_none_match = request.headers.get("If-None-Match")
+            if_modified_since = parse_http_date_safe(
+                request.headers.get("If-Modified-Since") or ""
+            )
+            if if_none_match is not None:
+                # Weak comparison: `CompressionMiddleware` weakens the tag of compressed bodies.
+                not_modified = if_none_match == "*" or etag in {
+                    match.removeprefix("W/") for match in parse_etags(if_none_match)
+                }
+            else:
+                not_modified = (
+                    if_modified_since is not None
+                    and int(last_modified.timestamp()) <= if_modified_since
+                )
+            if not_modified:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            cache_key = f"customer-loans-response:{tag}"
+            data = cache.get(cache_key)
+            if data is None:
+                response = func(view, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                cache.set(cache_key, data, settings.LOAN_RESPONSE_CACHE_TIMEOUT)
+            return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,273 @@
+import datetime
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from core.constants import (
+    LOAN_INTEREST_RATE_UPDATED_MESSAGE,
+    LOAN_SUCCESSFUL_MESSAGE,
+    LOAN_UNSUCCESSFUL_MESSAGE,
+    LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE,
+)
+from core.models import (
+    MINOR_UNITS_PER_RUPEE,
+    Customer,
+    CustomerLoanHistory,
+    CustomerLoansVersion,
+    Loan,
+    OutboxEvent,
+    to_basis_points,
+    to_minor_units,
+)
+from core.outbox import LOAN_PAYLOAD_FIELDS
+from core.pricing import CompiledPricingPolicy
+from core.sharding import shard_for_customer
+from core.utils import calculate_emi
+
+APPROVED = "approved"
+RATE_UPDATED = "rate_updated"
+REJECTED = "rejected"
+DTI_EXCEEDED = "dti_exceeded"
+
+# Mirrors `calculate_credit_score`, the DTI check and `CompiledPricingPolicy.price`
+# of `determine_loan_eligibility`, then inserts the loan, bumps the customer's loans
+# version and appends the `loan.created` outbox event only when it is approved.
+# Float arithmetic is done in float8 in the same order as the Python code, and
+# round() on float8 rounds half to even like Python's round().
+CREATE_LOAN_SQL = """
+WITH customer AS (
+    SELECT customer_id, approved_limit, monthly_salary
+    FROM {customer_table}
+    WHERE customer_id = %(customer_id)s
+),
+customer_loans AS (
+    SELECT
+        *,
+        end_date >= %(today)s AND tenure > emis_paid_on_time AS active
+    FROM {loan_table}
+    WHERE customer_id = %(customer_id)s
+),
+loans AS (
+    SELECT
+        COALESCE(SUM(loan_amount) FILTER (WHERE active), 0) AS total_amount,
+        {total_monthly_payment} AS total_monthly_payment,
+        COUNT(*) AS total_loan,
+        COUNT(*) FILTER (WHERE date_of_approval >= %(last_year)s) AS last_year_loan,
+        COALESCE(SUM(emis_paid_on_time), 0) AS emi_paid,
+        COALESCE(SUM(
+            CASE
+                WHEN %(today)s > end_date OR emis_paid_on_time = tenure THEN tenure
+                ELSE (%(today_year)s - EXTRACT(YEAR FROM date_of_approval)::int) * 12
+                    + %(today_month)s - EXTRACT(MONTH FROM date_of_approval)::int
+            END
+        ), 0) AS total_emi
+    FROM customer_loans
+),
+totals AS (
+    SELECT
+        c.customer_id,
+        c.approved_limit,
+        c.monthly_salary,
+        l.total_amount,
+        l.total_monthly_payment,
+        l.last_year_loan,
+        l.total_loan + COALESCE(h.total_loan, 0) AS total_loan,
+        l.emi_paid + COALESCE(h.emi_paid, 0) AS emi_paid,
+        l.total_emi + COALESCE(h.total_emi, 0) AS total_emi
+    FROM customer c
+    CROSS JOIN loans l
+    LEFT JOIN {history_table} h ON h.customer_id = c.customer_id
+),
+scored AS (
+    SELECT *, {credit_score} AS credit_score
+    FROM totals
+),
+decision AS (
+    SELECT
+        s.customer_id,
+        s.credit_score,
+        band.rate_floor,
+        CASE
+            WHEN s.total_monthly_payment + %(monthly_payment)s
+                > s.monthly_salary * %(max_dti_ratio)s THEN %(dti_exceeded)s
+            WHEN band.min_score IS NULL THEN %(rejected)s
+            WHEN band.rate_floor IS NOT NULL AND %(interest_rate)s < band.rate_floor
+                THEN %(rate_updated)s
+            ELSE %(approved)s
+        END AS outcome
+    FROM scored s
+    LEFT JOIN LATERAL (
+        SELECT min_score, rate_floor
+        FROM ({bands}) AS bands (min_score, rate_floor)
+        WHERE min_score < s.credit_score
+        ORDER BY min_score DESC
+        LIMIT 1
+    ) band ON true
+),
+inserted AS (
+    INSERT INTO {loan_table} (
+        customer_id, loan_amount, tenure, interest_rate, monthly_payment,
+        emis_paid_on_time, date_of_approval, end_date, interest_rate_bps, monthly_payment_paise
+    )
+    SELECT
+        customer_id, %(loan_amount)s, %(tenure)s, %(interest_rate)s, %(installment)s,
+        0, %(today)s, %(end_date)s, %(interest_rate_bps)s, %(installment_paise)s
+    FROM decision
+    WHERE outcome = %(approved)s
+    RETURNING *
+),
+bumped AS (
+    UPDATE {version_table} v
+    SET version = v.version + 1, updated_at = %(now)s
+    FROM inserted i
+    WHERE v.customer_id = i.customer_id
+),
+event AS (
+    INSERT INTO {outbox_table} (event_type, customer_id, loan_id, payload, created_at)
+    SELECT %(loan_created)s, customer_id, loan_id, {loan_payload}, %(now)s
+    FROM inserted
+)
+SELECT outcome, credit_score, rate_floor, (SELECT loan_id FROM inserted)
+FROM decision
+"""
+# Same keys as `core.outbox.loan_payload`
+LOAN_PAYLOAD_SQL = "jsonb_build_object({})".format(
+    ", ".join(f"'{field}', {field}" for field in LOAN_PAYLOAD_FIELDS)
+)
+# `calculate_credit_score` over columns named after the `get_loan_aggregates` figures
+CREDIT_SCORE_SQL = """
+CASE
+    WHEN approved_limit <= total_amount THEN 0
+    ELSE round(
+        LEAST(20, last_year_loan * 10)
+        + LEAST(
+            80,
+            LEAST(80, total_loan * 30)::float8
+            * (emi_paid::float8 / COALESCE(NULLIF(total_emi, 0), 1))
+        )
+    )
+END
+"""
+TOTAL_MONTHLY_PAYMENT_SQL = "COALESCE(SUM(monthly_payment) FILTER (WHERE active), 0)"
+# Same as `calculate_credit_score` with `MONEY_MINOR_UNITS_READS`: an exact sum in paise.
+TOTAL_MONTHLY_PAYMENT_MINOR_UNITS_SQL = (
+    "COALESCE(SUM(COALESCE(monthly_payment_paise, round(monthly_payment * {per_rupee})::bigint)) "
+    "FILTER (WHERE active), 0)::float8 / {per_rupee}"
+).format(per_rupee=MINOR_UNITS_PER_RUPEE)
+
+
+def can_create_loan_in_one_statement(loan_amount: float) -> bool:
+    """Whether `create_loan_if_eligible` can serve a create-loan request
+
+    Fractional amounts are left to the regular path, where `LoanSerializer`
+    rejects them once the loan is approved.
+    """
+    return (
+        settings.LOAN_CREATE_SINGLE_STATEMENT
+        and connection.vendor == "postgresql"
+        and float(loan_amount).is_integer()
+    )
+
+
+def bands_sql(policy: CompiledPricingPolicy) -> tuple[str, dict]:
+    """Render the policy bands as a VALUES list with named parameters"""
+    if not policy.thresholds:
+        return "SELECT NULL::int, NULL::float8 WHERE false", {}
+    rows, params = [], {}
+    for index, band in enumerate(zip(policy.thresholds, policy.rate_floors)):
+        rows.append(f"(%(band_{index}_min_score)s::int, %(band_{index}_rate_floor)s::float8)")
+        params[f"band_{index}_min_score"], params[f"band_{index}_rate_floor"] = band
+    return "VALUES " + ", ".join(rows), params
+
+
+def create_loan_if_eligible(
+    customer_id: int,
+    loan_amount: float,
+    interest_rate: float,
+    tenure: int,
+    policy: CompiledPricingPolicy,
+    end_date: datetime.date,
+    today: datetime.date | None = None,
+) -> tuple[bool, bool, dict, str, Loan | None]:
+    """Score the customer, run the limit and DTI checks and insert the loan in one statement
+
+    Returns what `determine_loan_eligibility` returns, plus the created loan
+    (`None` unless the loan was approved as requested). Raises
+    `Customer.DoesNotExist` for an unknown customer.
+    """
+    today = today or datetime.date.today()
+    monthly_payment = calculate_emi(loan_amount, tenure, interest_rate)
+    bands, band_params = bands_sql(policy)
+    sql = CREATE_LOAN_SQL.format(
+        customer_table=Customer._meta.db_table,
+        loan_table=Loan._meta.db_table,
+        history_table=CustomerLoanHistory._meta.db_table,
+        version_table=CustomerLoansVersion._meta.db_table,
+        outbox_table=OutboxEvent._meta.db_table,
+        loan_payload=LOAN_PAYLOAD_SQL,
+        bands=bands,
+        credit_score=CREDIT_SCORE_SQL,
+        total_monthly_payment=(
+            TOTAL_MONTHLY_PAYMENT_MINOR_UNITS_SQL
+            if settings.MONEY_MINOR_UNITS_READS
+            else TOTAL_MONTHLY_PAYMENT_SQL
+        ),
+    )
+    params = {
+        "customer_id": customer_id,
+        "loan_amount": int(loan_amount),
+        "interest_rate": interest_rate,
+        "tenure": tenure,
+        "monthly_payment": monthly_payment,
+        "installment": int(monthly_payment),
+        # Exact, `monthly_payment` keeps the installment truncated to rupees.
+        "installment_paise": to_minor_units(monthly_payment),
+        "interest_rate_bps": to_basis_points(interest_rate),
+        "max_dti_ratio": policy.max_dti_ratio,
+        "today": today,
+        "today_year": today.year,
+        "today_month": today.month,
+        "last_year": today - datetime.timedelta(days=365),
+        "end_date": end_date,
+        "now": timezone.now(),
+        "approved": APPROVED,
+        "rate_updated": RATE_UPDATED,
+        "rejected": REJECTED,
+        "dti_exceeded": DTI_EXCEEDED,
+        "loan_created": OutboxEvent.LOAN_CREATED,
+        **band_params,
+    }
+    shard = shard_for_customer(customer_id)
+    with connections[shard].cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        raise Customer.DoesNotExist("Customer matching query does not exist.")
+    outcome, _, rate_floor, loan_id = row
+
+    res_data = {"monthly_payment": monthly_payment, "interest_rate": interest_rate}
+    if outcome == DTI_EXCEEDED:
+        message = LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE
+        return False, False, res_data, message, None
+    if outcome == REJECTED:
+        return False, False, res_data, LOAN_UNSUCCESSFUL_MESSAGE, None
+    if outcome == RATE_UPDATED:
+        res_data["interest_rate"] = rate_floor
+        res_data["monthly_payment"] = calculate_emi(loan_amount, tenure, rate_floor)
+        message = LOAN_INTEREST_RATE_UPDATED_MESSAGE.format(rate=rate_floor)
+        return True, True, res_data, message, None
+    loan = Loan(
+        loan_id=loan_id,
+        customer_id=customer_id,
+        loan_amount=int(loan_amount),
+        tenure=tenure,
+        interest_rate=interest_rate,
+        monthly_payment=int(monthly_payment),
+        monthly_payment_paise=params["installment_paise"],
+        emis_paid_on_time=0,
+        date_of_approval=today,
+        end_date=end_date,
+    )
+    loan.set_minor_units()
+    loan._state.adding, loan._state.db = False, shard
+    return True, False, res_data, LOAN_SUCCESSFUL_MESSAGE, loan
@@ -0,0 +1,251 @@
+import traceback
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.constants import CUSTOMER_NOT_FOUND_MESSAGE, JOB_LEASE_EXPIRED_MESSAGE
+from core.models import Customer, Job
+from core.pricing import get_pricing_policy
+from core.sharding import for_each_shard, group_by_shard
+from core.utils import calculate_credit_score, determine_loan_eligibility
+
+
+class JobType:
+    def __init__(self, name: str, handler, concurrency: int, public: bool) -> None:
+        self.name = name
+        self.handler = handler
+        self.public = public
+        self._concurrency = concurrency
+
+    @property
+    def concurrency(self) -> int:
+        """Maximum number of jobs of this type a worker runs at once, overridable with `JOB_CONCURRENCY`"""
+        return settings.JOB_CONCURRENCY.get(self.name, self._concurrency)
+
+
+JOB_TYPES: dict[str, JobType] = {}
+
+
+def register_job(name: str, concurrency: int = 1, public: bool = False):
+    """Register a function as the handler of a job type
+
+    The handler receives the job payload and returns a JSON serializable result.
+    Only `public` job types can be enqueued through the API.
+    """
+
+    def decorator(func):
+        JOB_TYPES[name] = JobType(name, func, concurrency, public)
+        return func
+
+    return decorator
+
+
+def enqueue_job(job_type: str, payload: dict | None = None) -> Job:
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type {job_type!r}.")
+    return Job.objects.create(job_type=job_type, payload=payload or {})
+
+
+def claim_job(job_types: list[str]) -> Job | None:
+    """Mark the oldest pending job of one of `job_types` as running and return it
+
+    Locked rows are skipped, so several workers can poll the same table.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.PENDING, job_type__in=job_types)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_at", "heartbeat_at", "attempts"])
+    return job
+
+
+def heartbeat_jobs(job_ids) -> int:
+    """Extend the lease of running jobs, see `requeue_expired_jobs`"""
+    return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(
+        heartbeat_at=timezone.now()
+    )
+
+
+def requeue_expired_jobs() -> tuple[int, int]:
+    """Take back running jobs whose worker stopped sending heartbeats
+
+    Jobs left without a heartbeat for `JOB_LEASE_SECONDS` were claimed by a
+    worker that died. They go back to pending, or are failed once they have
+    been started `JOB_MAX_ATTEMPTS` times. Returns the numbers of jobs
+    re-queued and failed.
+    """
+    now = timezone.now()
+    expired = Job.objects.filter(
+        status=Job.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOB_LEASE_SECONDS),
+    )
+    failed = expired.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error=JOB_LEASE_EXPIRED_MESSAGE, finished_at=now
+    )
+    requeued = expired.update(status=Job.PENDING, started_at=None, heartbeat_at=None)
+    return requeued, failed
+
+
+def enqueue_daily_jobs(job_types) -> list[Job]:
+    """Enqueue today's job of each `JOB_DAILY` type among `job_types` unless it exists
+
+    The payload holds the day the job is for. Every worker checks, so the job
+    table is locked while a missing job is created, for only one to create it.
+    """
+    today = timezone.localdate().isoformat()
+    enqueued = []
+    for job_type in settings.JOB_DAILY:
+        if job_type not in job_types:
+            continue
+        due = Job.objects.filter(job_type=job_type, payload__date=today)
+        if due.exists():
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {Job._meta.db_table} IN SHARE ROW EXCLUSIVE MODE")
+            if not due.exists():
+                enqueued.append(enqueue_job(job_type, {"date": today}))
+    return enqueued
+
+
+def fail_job(job: Job, error: str) -> None:
+    """Record a job as failed when its worker could not, e.g. its process crashed"""
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+        status=Job.FAILED, error=error, finished_at=timezone.now()
+    )
+
+
+def run_job(job: Job) -> Job:
+    try:
+        job.result = JOB_TYPES[job.job_type].handler(job.payload)
+        job.status = Job.SUCCEEDED
+    except Exception:
+        job.error = traceback.format_exc()
+        job.status = Job.FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["result", "error", "status", "finished_at"])
+    return job
+
+
+def run_job_by_id(job_id: int) -> str:
+    """Entry point for worker processes, which can not receive model instances"""
+    return run_job(Job.objects.get(pk=job_id)).status
+
+
+@register_job("bulk_eligibility", concurrency=2, public=True)
+def bulk_eligibility(payload: dict) -> dict:
+    """Check eligibility for a list of loan requests shaped like the check-eligibility body"""
+    from core.serializers import LoanRequestBodySerializer
+
+    serializer = LoanRequestBodySerializer(data=payload.get("requests", []), many=True)
+    serializer.is_valid(raise_exception=True)
+    loan_requests = serializer.validated_data
+    customers = {}
+    for alias, customer_ids in group_by_shard(
+        {loan_request["customer_id"] for loan_request in loan_requests}
+    ).items():
+        customers.update(
+            Customer.objects.using(alias).select_related("loan_history").in_bulk(customer_ids)
+        )
+    results = []
+    for loan_request in loan_requests:
+        customer = customers.get(loan_request["customer_id"])
+        if customer is None:
+            results.append(
+                {"customer_id": loan_request["customer_id"], "error": CUSTOMER_NOT_FOUND_MESSAGE}
+            )
+            continue
+        is_eligible, _, updated_data, _ = determine_loan_eligibility(
+            loan_request["loan_amount"],
+            loan_request["interest_rate"],
+            loan_request["tenure"],
+            customer,
+            get_pricing_policy(loan_request["product"]),
+        )
+        results.append(
+            {
+                "customer_id": customer.customer_id,
+                "approval": is_eligible,
+                "interest_rate": loan_request["interest_rate"],
+                "corrected_interest_rate": updated_data["interest_rate"],
+                "tenure": loan_request["tenure"],
+                "monthly_installment": updated_data["monthly_payment"],
+            }
+        )
+    return {"results": results}
+
+
+@register_job("rescore_portfolio", public=True)
+def rescore_portfolio(payload: dict) -> dict:
+    """Recompute every customer's credit score and summarise the distribution"""
+    distribution = sum(for_each_shard(score_distribution).values(), Counter())
+    return {
+        "customers": sum(distribution.values()),
+        "score_distribution": {
+            f"{bucket}-{bucket + 9 if bucket < 90 else 100}": count
+            for bucket, count in sorted(distribution.items())
+        },
+    }
+
+
+def score_distribution(alias: str) -> Counter:
+    distribution = Counter()
+    for customer in (
+        Customer.objects.using(alias).select_related("loan_history").iterator(chunk_size=1000)
+    ):
+        credit_score, _ = calculate_credit_score(customer)
+        distribution[min(credit_score // 10 * 10, 90)] += 1
+    return distribution
+
+
+@register_job("backtest_policy", public=True)
+def backtest_policy(payload: dict) -> dict:
+    """Decide a loan request for every customer on past snapshot days, summarised by month"""
+    from core.backtest import backtest_policy as run_backtest
+    from core.serializers import BacktestRequestSerializer
+
+    serializer = BacktestRequestSerializer(data=payload)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    return {
+        "months": run_backtest(
+            get_pricing_policy(params["product"]),
+            params["loan_amount"],
+            params["interest_rate"],
+            params["tenure"],
+            params["since"],
+            params["until"],
+            params["step"],
+        )
+    }
+
+
+@register_job("snapshot_scores")
+def snapshot_scores(payload: dict) -> None:
+    """Snapshot the day of the payload, today by default (see `enqueue_daily_jobs`)"""
+    call_command(
+        "snapshot_scores",
+        *(["--date", payload["date"]] if "date" in payload else []),
+        stdout=StringIO(),
+    )
+
+
+@register_job("load_data_from_excel")
+def load_data_from_excel(payload: dict) -> None:
+    call_command("load_data_from_excel", stdout=StringIO())
+
+
+@register_job("archive_loans")
+def archive_loans(payload: dict) -> None:
+    call_command("archive_loans", chunk_size=payload.get("chunk_size", 1000), stdout=StringIO())
@@ -0,0 +1,138 @@
+import contextvars
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))
+) | {"message", "asctime", "suppressed"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra` fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES
+        )
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Add the id of the request being served (see `RequestIdMiddleware`) to every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # django.request logs the response once the middleware chain has returned.
+        record.request_id = request_id_var.get() or getattr(
+            getattr(record, "request", None), "request_id", None
+        )
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Let through at most `burst` records per message template every `window` seconds
+
+    The first record let through in the next window carries the number of
+    records dropped in between as `suppressed`. A `burst` of 0 disables sampling.
+    ERROR and CRITICAL records are never dropped: many views share one error
+    template, and an incident is when every one of them matters.
+    """
+
+    def __init__(self, burst: int = 10, window: float = 60.0) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.lock = threading.Lock()
+        # (logger, template) -> [window start, records seen, records dropped]
+        self.counters: dict[tuple[str, object], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.burst or record.levelno >= logging.ERROR:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            counter = self.counters.setdefault((record.name, record.msg), [now, 0, 0])
+            if now - counter[0] >= self.window:
+                record.suppressed = counter[2]
+                counter[:] = [now, 0, 0]
+            counter[1] += 1
+            if counter[1] > self.burst:
+                counter[2] += 1
+                return False
+        return True
+
+
+class QueueStreamHandler(QueueHandler):
+    """Hand records to a background thread that writes them to stderr
+
+    Filters run in the logging thread, formatting and I/O in the listener. The
+    listener is (re)started in every process on first use, so it survives the
+    fork of gunicorn `--preload` workers and `run_jobs --pool process`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler()
+        self.listener = None
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+
+    def setFormatter(self, fmt: logging.Formatter | None) -> None:
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only render what can't cross threads safely; JSON is built by the listener.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.listener_pid != os.getpid():
+            self.start_listener()
+        super().enqueue(record)
+
+    def start_listener(self) -> None:
+        with self.listener_lock:
+            if self.listener_pid == os.getpid():
+                return
+            # A forked child inherits a queue nobody drains and a dead listener thread.
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self.listener_pid = os.getpid()
+
+    def close(self) -> None:
+        """Flush the queue, called for every configured handler by `logging.shutdown` at exit"""
+        with self.listener_lock:
+            if self.listener_pid == os.getpid():
+                self.listener.stop()
+            self.listener_pid = None
+        super().close()
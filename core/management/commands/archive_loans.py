@@ -0,0 +1,101 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from core.models import ArchivedLoan, CustomerLoanHistory, Loan
+from core.sharding import get_shards
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed loans older than a year from the loan table into the archive, "
+        "keeping the per-customer counters the credit score needs. Works in chunks, "
+        "each in its own transaction, so it can be stopped and re-run at any time."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-chunks",
+            type=int,
+            default=0,
+            help="Stop after this many chunks (0 archives everything).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between chunks to limit load on the database.",
+        )
+
+    def handle(self, *args, **options):
+        archived = chunks = 0
+        for alias in get_shards():
+            while not options["max_chunks"] or chunks < options["max_chunks"]:
+                with transaction.atomic(using=alias):
+                    moved = self.archive_chunk(alias, options["chunk_size"])
+                if not moved:
+                    break
+                archived += moved
+                chunks += 1
+                self.stdout.write(f"Archived {archived} loans...")
+                if options["sleep"]:
+                    time.sleep(options["sleep"])
+        logger.info(
+            "Archived %d loans in %d chunks",
+            archived,
+            chunks,
+            extra={"archived": archived, "chunks": chunks},
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} loans in {chunks} chunks."))
+
+    def archive_chunk(self, alias: str, chunk_size: int) -> int:
+        loans = list(
+            Loan.objects.using(alias)
+            .archivable()
+            .select_for_update()
+            .order_by("loan_id")[:chunk_size]
+        )
+        if not loans:
+            return 0
+
+        ArchivedLoan.objects.using(alias).bulk_create(
+            ArchivedLoan(
+                loan_id=loan.loan_id,
+                customer_id=loan.customer_id,
+                loan_amount=loan.loan_amount,
+                tenure=loan.tenure,
+                interest_rate=loan.interest_rate,
+                monthly_payment=loan.monthly_payment,
+                monthly_payment_paise=loan.monthly_payment_paise,
+                emis_paid_on_time=loan.emis_paid_on_time,
+                date_of_approval=loan.date_of_approval,
+                end_date=loan.end_date,
+            )
+            for loan in loans
+        )
+
+        histories = CustomerLoanHistory.objects.using(alias).select_for_update().in_bulk(
+            {loan.customer_id for loan in loans}
+        )
+        new_histories = {}
+        for loan in loans:
+            history = histories.get(loan.customer_id) or new_histories.get(loan.customer_id)
+            if history is None:
+                history = new_histories[loan.customer_id] = CustomerLoanHistory(
+                    customer_id=loan.customer_id
+                )
+            history.total_loan += 1
+            history.emi_paid += loan.emis_paid_on_time
+            # A closed loan is due in full (see `calculate_emis_till_date`).
+            history.total_emi += loan.tenure
+        CustomerLoanHistory.objects.using(alias).bulk_update(
+            histories.values(), ["total_loan", "emi_paid", "total_emi"]
+        )
+        CustomerLoanHistory.objects.using(alias).bulk_create(new_histories.values())
+
+        Loan.objects.using(alias).filter(loan_id__in=[loan.loan_id for loan in loans]).delete()
+        return len(loans)
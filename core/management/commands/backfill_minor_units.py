@@ -0,0 +1,85 @@
+import time
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from core.models import ArchivedLoan, Customer, Loan
+from core.sharding import get_shards
+from core.utils import basis_points, minor_units
+
+# Model -> (column checked for NULL, columns to fill)
+BACKFILLS = (
+    (Customer, "monthly_salary_paise", {"monthly_salary_paise": minor_units("monthly_salary")}),
+    (
+        Loan,
+        "monthly_payment_paise",
+        {
+            "monthly_payment_paise": minor_units("monthly_payment"),
+            "interest_rate_bps": basis_points("interest_rate"),
+        },
+    ),
+    (
+        ArchivedLoan,
+        "monthly_payment_paise",
+        {
+            "monthly_payment_paise": minor_units("monthly_payment"),
+            "interest_rate_bps": basis_points("interest_rate"),
+        },
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the integer paise / basis point columns of rows written before they were "
+        "added. Works in chunks, each in its own transaction, so it can run against a "
+        "live database and be stopped and re-run at any time."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between chunks to limit load on the database.",
+        )
+
+    def handle(self, *args, **options):
+        for model, null_column, values in BACKFILLS:
+            filled = 0
+            for alias in get_shards():
+                last_pk = None
+                while True:
+                    with transaction.atomic(using=alias):
+                        updated, last_pk = self.backfill_chunk(
+                            model.objects.using(alias),
+                            null_column,
+                            values,
+                            options["chunk_size"],
+                            last_pk,
+                        )
+                    if last_pk is None:
+                        break
+                    filled += updated
+                    self.stdout.write(f"Filled {filled} {model._meta.verbose_name_plural}...")
+                    if options["sleep"]:
+                        time.sleep(options["sleep"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Filled {filled} {model._meta.verbose_name_plural}.")
+            )
+
+    def backfill_chunk(
+        self, objects, null_column: str, values: dict, chunk_size: int, after_pk
+    ) -> tuple[int, object]:
+        """Fill the next `chunk_size` rows after `after_pk`, return `(rows filled, last pk)`
+
+        Walking the primary key keeps every chunk an index range scan instead of
+        rescanning the already filled rows for NULLs.
+        """
+        queryset = objects.filter(**{f"{null_column}__isnull": True})
+        if after_pk is not None:
+            queryset = queryset.filter(pk__gt=after_pk)
+        pks = list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return 0, None
+        return objects.filter(pk__in=pks).update(**values), pks[-1]
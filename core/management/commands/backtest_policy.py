@@ -0,0 +1,60 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from core.backtest import OUTCOMES, backtest_policy
+from core.constants import DEFAULT_PRICING_PRODUCT
+from core.pricing import load_pricing_policy
+
+
+class Command(BaseCommand):
+    help = (
+        "Decide the same loan request for every customer on every day with score "
+        "snapshots (see snapshot_scores) and report the outcomes per month, to see how a "
+        "pricing policy would have treated the book."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--product", default=DEFAULT_PRICING_PRODUCT)
+        parser.add_argument("--loan-amount", type=float, default=100000)
+        parser.add_argument("--interest-rate", type=float, default=12)
+        parser.add_argument("--tenure", type=int, default=12)
+        parser.add_argument("--since", type=datetime.date.fromisoformat, required=True)
+        parser.add_argument(
+            "--until",
+            type=datetime.date.fromisoformat,
+            help="Last day to read (today by default).",
+        )
+        parser.add_argument("--step", type=int, default=1, help="Days between days read.")
+
+    def handle(self, *args, **options):
+        until = options["until"] or datetime.date.today()
+        if options["since"] > until:
+            raise CommandError("--since must not be after --until.")
+        if options["step"] < 1:
+            raise CommandError("--step must be at least 1.")
+        start = time.perf_counter()
+        months = backtest_policy(
+            load_pricing_policy(options["product"]),
+            options["loan_amount"],
+            options["interest_rate"],
+            options["tenure"],
+            options["since"],
+            until,
+            options["step"],
+        )
+        self.stdout.write(
+            f"{'month':<8} {'snapshots':>10} {'score':>6} "
+            + " ".join(f"{outcome:>12}" for outcome in OUTCOMES)
+        )
+        for month in months:
+            self.stdout.write(
+                f"{month['month']:<8} {month['snapshots']:>10} {month['mean_credit_score']:>6} "
+                + " ".join(f"{month[outcome]:>12}" for outcome in OUTCOMES)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backtested {sum(month['snapshots'] for month in months)} snapshots "
+                f"in {time.perf_counter() - start:.1f}s."
+            )
+        )
@@ -0,0 +1,72 @@
+import datetime
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Count, Sum
+
+from core.models import Customer, Loan
+from core.utils import calculate_credit_score
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the loan queries on the hot path against the current database, "
+        "e.g. before and after partitioning or archiving a large book."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--customers",
+            type=int,
+            default=200,
+            help="Number of randomly sampled customers to run per-customer queries for.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        customer_ids = list(Customer.objects.values_list("customer_id", flat=True))
+        if not customer_ids:
+            self.stdout.write(self.style.ERROR("No customers in database."))
+            return
+        sample = random.Random(options["seed"]).sample(
+            customer_ids, min(options["customers"], len(customer_ids))
+        )
+        customers = Customer.objects.in_bulk(sample)
+        today = datetime.date.today()
+
+        self.report(
+            "credit score aggregate",
+            [lambda c=customers[i]: calculate_credit_score(c) for i in sample],
+        )
+        self.report(
+            "active loans of a customer",
+            [
+                lambda i=i: Loan.objects.filter(customer_id=i)
+                .active()
+                .aggregate(Sum("loan_amount"), Sum("monthly_payment"))
+                for i in sample
+            ],
+        )
+        self.report(
+            "loans approved last year (portfolio)",
+            [
+                lambda: Loan.objects.approved_since(
+                    today - datetime.timedelta(days=365)
+                ).aggregate(Count("loan_id"))
+            ]
+            * 5,
+        )
+
+    def report(self, name: str, calls: list) -> None:
+        timings = []
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{name:<40} n={len(timings):<5} "
+            f"median={statistics.median(timings):8.2f}ms p95={p95:8.2f}ms"
+        )
@@ -0,0 +1,99 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+
+from core.compression import COMPRESSORS, compress
+from core.models import ArchivedLoan, Loan
+from core.renderers import FastJSONRenderer, orjson
+from core.serializers import CustomerLoanSerializer
+from core.sharding import shard_for_customer
+
+# Columns `CustomerLoansAPIView` loads
+LOAN_FIELDS = (
+    "loan_id",
+    "loan_amount",
+    "interest_rate",
+    "monthly_payment",
+    "tenure",
+    "emis_paid_on_time",
+    "date_of_approval",
+    "end_date",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the JSON encoding of CustomerLoanSerializer output with DRF's renderer and "
+        "the orjson one, and the size and time of each response compression, for the "
+        "customer with the most loans (as served by view-loans) and for a bulk page of loans."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--customer-id",
+            type=int,
+            help="Customer whose loans to render (the one with the most loans by default).",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=10000,
+            help="Loans in the bulk payload, standing in for bulk and export responses.",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs of each step.")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        customer_id = options["customer_id"]
+        if customer_id is None:
+            heaviest = (
+                Loan.objects.values("customer_id")
+                .annotate(loans=Count("loan_id"))
+                .order_by("-loans")
+                .first()
+            )
+            if heaviest is None:
+                raise CommandError("No loans in database.")
+            customer_id = heaviest["customer_id"]
+        shard = shard_for_customer(customer_id)
+        loans = [
+            *Loan.objects.using(shard).filter(customer_id=customer_id).only(*LOAN_FIELDS),
+            *ArchivedLoan.objects.using(shard).filter(customer_id=customer_id),
+        ]
+        self.benchmark(f"customer {customer_id} ({len(loans)} loans)", loans, options["repeat"])
+        if options["rows"]:
+            loans = list(Loan.objects.only(*LOAN_FIELDS).order_by("loan_id")[: options["rows"]])
+            self.benchmark(f"bulk ({len(loans)} loans)", loans, options["repeat"])
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, both renderers match."))
+
+    def benchmark(self, name: str, loans: list, repeat: int) -> None:
+        data = CustomerLoanSerializer(loans, many=True).data
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            content, median = self.time(repeat, renderer.render, data)
+            self.stdout.write(
+                f"  {'render ' + type(renderer).__name__:<28} "
+                f"median={median:8.2f}ms bytes={len(content):>10}"
+            )
+        for encoding in COMPRESSORS:
+            compressed, median = self.time(repeat, compress, content, encoding)
+            self.stdout.write(
+                f"  {'compress ' + encoding:<28} median={median:8.2f}ms "
+                f"bytes={len(compressed):>10} ratio={len(content) / len(compressed):5.1f}x"
+            )
+        if len(content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            self.stdout.write("  (below RESPONSE_COMPRESSION_MIN_SIZE, served uncompressed)")
+
+    @staticmethod
+    def time(repeat: int, function, *args):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F, Max
+from django.db.models.functions import Mod
+
+from core.models import Customer, Loan
+from core.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Set up the customer and loan id sequences of every shard so that shard i of N "
+        "only hands out ids with (id - 1) % N == i (see `core.sharding.shard_for_id`). "
+        "Run after migrating each shard and whenever shards are added; safe to re-run."
+    )
+
+    def handle(self, *args, **options):
+        shards = get_shards()
+        for alias in shards:
+            if connections[alias].vendor != "postgresql":
+                raise CommandError("Sharded id allocation requires PostgreSQL.")
+        for model in (Customer, Loan):
+            self.check_placement(model, shards)
+            floor = max(
+                settings.SHARD_LEGACY_MAX_ID,
+                *(
+                    model.objects.using(alias).aggregate(max_id=Max("pk"))["max_id"] or 0
+                    for alias in shards
+                ),
+            )
+            for index, alias in enumerate(shards):
+                # The first id above every existing one that belongs to this shard.
+                start = floor + 1 + (index - floor) % len(shards)
+                self.configure_sequence(alias, model, start, len(shards))
+                self.stdout.write(
+                    f"{alias}: {model._meta.verbose_name} ids from {start} every {len(shards)}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Configured {len(shards)} shards."))
+
+    def check_placement(self, model, shards: list[str]) -> None:
+        """Refuse to run when rows past the legacy range sit on the wrong shard"""
+        for index, alias in enumerate(shards):
+            misplaced = (
+                model.objects.using(alias)
+                .filter(pk__gt=settings.SHARD_LEGACY_MAX_ID)
+                .annotate(shard_index=Mod(F("pk") - 1, len(shards)))
+                .exclude(shard_index=index)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if misplaced is not None:
+                raise CommandError(
+                    f"{alias} holds {model._meta.verbose_name} {misplaced}, which belongs on "
+                    f"another shard. Raise SHARD_LEGACY_MAX_ID above the ids created before "
+                    f"sharding was enabled."
+                )
+
+    def configure_sequence(self, alias: str, model, start: int, increment: int) -> None:
+        table, column = model._meta.db_table, model._meta.pk.column
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, column])
+            (sequence,) = cursor.fetchone()
+            if sequence is None:
+                raise CommandError(f"{table}.{column} has no sequence on {alias}.")
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence} INCREMENT BY {increment:d} RESTART WITH {start:d}"
+            )
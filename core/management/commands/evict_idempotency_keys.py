@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+from core.sharding import for_each_shard
+
+
+def evict_expired_keys(alias: str) -> int:
+    deleted, _ = IdempotencyKey.objects.using(alias).filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+class Command(BaseCommand):
+    help = "Delete stored idempotency keys whose TTL has expired, on every shard."
+
+    def handle(self, *args, **options):
+        deleted = sum(for_each_shard(evict_expired_keys).values())
+        self.stdout.write(self.style.SUCCESS(f"Evicted {deleted} expired idempotency keys."))
@@ -0,0 +1,332 @@
+import datetime
+import io
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from core.management.commands.load_data_from_excel import CONFIG
+from core.models import (
+    BASIS_POINTS_PER_PERCENT,
+    MINOR_UNITS_PER_RUPEE,
+    Customer,
+    CustomerLoansVersion,
+    Loan,
+)
+
+FIRST_NAMES = (
+    "Aarav", "Aditi", "Amit", "Ananya", "Arjun", "Diya", "Ishaan", "Kavya", "Meera",
+    "Neha", "Nikhil", "Priya", "Rahul", "Riya", "Rohan", "Sanjay", "Sneha", "Vikram",
+)
+LAST_NAMES = (
+    "Agarwal", "Bose", "Desai", "Gupta", "Iyer", "Joshi", "Kapoor", "Khan", "Mehta",
+    "Nair", "Patel", "Reddy", "Shah", "Sharma", "Singh", "Verma",
+)
+TENURES = (6, 12, 18, 24, 36, 48, 60, 72, 84, 96, 120, 144, 180)
+TENURE_WEIGHTS = (4, 10, 6, 12, 14, 10, 12, 6, 5, 4, 8, 5, 4)
+# Column types that can be sent with binary COPY, with their wire format.
+BINARY_COPY_TYPES = {
+    "smallint": ">i2",
+    "integer": ">i4",
+    "bigint": ">i8",
+    "double precision": ">f8",
+    "date": ">i4",
+    "timestamp with time zone": ">i8",
+}
+POSTGRES_EPOCH = datetime.date(2000, 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic book of customers and loans with realistic, "
+        "heavy-tailed distributions. Writes to the database (COPY on PostgreSQL) and/or "
+        "exports files in the layout read by load_data_from_excel."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--customers", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            default=datetime.date(2010, 1, 1),
+            help="Earliest approval date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--as-of",
+            type=datetime.date.fromisoformat,
+            default=datetime.date.today(),
+            help=(
+                "Day the book is generated as of (today by default): latest approval date "
+                "and the day EMIs paid are counted up to. Fix it to get the same book on any day."
+            ),
+        )
+        parser.add_argument(
+            "--export-dir",
+            help="Also write customer_data and loan_data files to this directory.",
+        )
+        parser.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+        parser.add_argument(
+            "--no-db", action="store_true", help="Only export, do not write to the database."
+        )
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to write to, the customers are not spread over shards.",
+        )
+        parser.add_argument(
+            "--revalidate-foreign-keys",
+            action="store_true",
+            help=(
+                "PostgreSQL only: drop the foreign keys of the loaded tables and re-add them "
+                "after the load, validating every row in one pass instead of one check per "
+                "row at commit. Locks those tables for the duration of the load."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        # Imported here so that the numeric stack is only loaded by this command
+        import numpy as np
+        import pandas as pd
+
+        if options["no_db"] and not options["export_dir"]:
+            raise CommandError("--no-db requires --export-dir.")
+        if options["since"] >= options["as_of"]:
+            raise CommandError("--since must be before --as-of.")
+        self.connection = connections[options["database"]]
+        start = time.perf_counter()
+        rng = np.random.default_rng(options["seed"])
+        customers = self.generate_customers(rng, options["customers"], np, pd)
+        loans = self.generate_loans(
+            rng, customers, options["since"], options["as_of"], np, pd
+        )
+        self.stdout.write(
+            f"Generated {len(customers)} customers and {len(loans)} loans "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+        if not options["no_db"]:
+            start = time.perf_counter()
+            with transaction.atomic(using=options["database"]):
+                self.write_to_db(
+                    customers,
+                    loans,
+                    options["batch_size"],
+                    options["revalidate_foreign_keys"],
+                    np,
+                    pd,
+                )
+            elapsed = time.perf_counter() - start
+            rows = len(customers) + len(loans)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Wrote {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)."
+                )
+            )
+        if options["export_dir"]:
+            self.export(customers, loans, options["export_dir"], options["format"])
+
+    def generate_customers(self, rng, count: int, np, pd):
+        salary = np.clip(rng.lognormal(np.log(45_000), 0.65, count), 10_000, 1_500_000)
+        salary = (np.round(salary / 1000) * 1000).astype(np.int64)
+        return pd.DataFrame(
+            {
+                "customer_id": np.arange(1, count + 1),
+                "first_name": rng.choice(FIRST_NAMES, count),
+                "last_name": rng.choice(LAST_NAMES, count),
+                "age": np.clip(rng.normal(38, 10, count), 21, 70).astype(np.int64),
+                "phone_number": rng.integers(6_000_000_000, 9_999_999_999, count).astype(str),
+                "monthly_salary": salary,
+                # Same rule as `CustomerSerializer.calculate_approved_limit`
+                "approved_limit": (np.round(36 * salary / 100_000) * 100_000).astype(np.int64),
+                "monthly_salary_paise": salary * MINOR_UNITS_PER_RUPEE,
+            }
+        )
+
+    def generate_loans(
+        self, rng, customers, since: datetime.date, as_of: datetime.date, np, pd
+    ):
+        count = len(customers)
+        # Heavy tail: most customers hold a few loans, a handful hold dozens.
+        per_customer = np.where(
+            rng.random(count) < 0.15, 0, np.minimum(rng.zipf(1.9, count), 150)
+        )
+        customer_index = np.repeat(np.arange(count), per_customer)
+        total = len(customer_index)
+
+        tenure = rng.choice(TENURES, total, p=np.array(TENURE_WEIGHTS) / sum(TENURE_WEIGHTS))
+        interest_rate = np.round(np.clip(rng.normal(12, 3, total), 6, 24), 2)
+        salary = customers["monthly_salary"].to_numpy()[customer_index]
+        loan_amount = np.clip(salary * rng.lognormal(np.log(8), 0.8, total), 10_000, 10_000_000)
+        loan_amount = (np.round(loan_amount / 1000) * 1000).astype(np.int64)
+        r = interest_rate / 12 / 100
+        growth = (1 + r) ** tenure
+        monthly_payment = np.round(loan_amount * r * growth / (growth - 1))
+
+        # Skewed towards recent approvals, as the book grows over time.
+        today = np.datetime64(as_of, "D")
+        span = (today - np.datetime64(since, "D")).astype(np.int64)
+        approval = today - (span * (1 - rng.beta(2, 1, total))).astype("timedelta64[D]")
+        # Same month arithmetic as `CreateLoanAPIView.calculate_end_date`
+        approval_month = approval.astype("datetime64[M]")
+        day = approval - approval_month.astype("datetime64[D]")
+        end_month = approval_month + tenure.astype("timedelta64[M]")
+        month_length = (end_month + 1).astype("datetime64[D]") - end_month.astype("datetime64[D]")
+        end_date = end_month.astype("datetime64[D]") + np.minimum(day, month_length - 1)
+
+        elapsed = (today.astype("datetime64[M]") - approval_month).astype(np.int64)
+        due = np.minimum(elapsed, tenure)
+        on_time_ratio = rng.beta(8, 1.5, total)
+        emis_paid_on_time = np.floor(due * on_time_ratio).astype(np.int64)
+
+        return pd.DataFrame(
+            {
+                "loan_id": np.arange(1, total + 1),
+                "customer_id": customers["customer_id"].to_numpy()[customer_index],
+                "loan_amount": loan_amount,
+                "tenure": tenure,
+                "interest_rate": interest_rate,
+                "monthly_payment": monthly_payment,
+                "emis_paid_on_time": emis_paid_on_time,
+                "date_of_approval": approval,
+                "end_date": end_date,
+                # Same rounding as `to_basis_points` / `to_minor_units`
+                "interest_rate_bps": np.round(interest_rate * BASIS_POINTS_PER_PERCENT).astype(
+                    np.int64
+                ),
+                "monthly_payment_paise": np.round(
+                    monthly_payment * MINOR_UNITS_PER_RUPEE
+                ).astype(np.int64),
+            }
+        )
+
+    def write_to_db(
+        self, customers, loans, batch_size: int, revalidate_foreign_keys: bool, np, pd
+    ) -> None:
+        using = self.connection.alias
+        # Append after existing rows; ids are explicit so loans can reference customers.
+        customer_offset = Customer.objects.using(using).order_by("-customer_id").values_list(
+            "customer_id", flat=True
+        ).first() or 0
+        loan_offset = Loan.objects.using(using).order_by("-loan_id").values_list(
+            "loan_id", flat=True
+        ).first() or 0
+        customers = customers.assign(customer_id=customers["customer_id"] + customer_offset)
+        loans = loans.assign(
+            loan_id=loans["loan_id"] + loan_offset,
+            customer_id=loans["customer_id"] + customer_offset,
+        )
+        versions = pd.DataFrame(
+            {
+                "customer_id": customers["customer_id"],
+                "version": 0,
+                "updated_at": timezone.now(),
+            }
+        )
+        tables = (
+            (Customer, customers),
+            (CustomerLoansVersion, versions),
+            (Loan, loans),
+        )
+        foreign_keys = []
+        if revalidate_foreign_keys and self.connection.vendor == "postgresql":
+            foreign_keys = self.drop_foreign_keys([model for model, _ in tables])
+        for model, frame in tables:
+            for batch_start in range(0, len(frame), batch_size):
+                self.insert(model, frame.iloc[batch_start : batch_start + batch_size], np)
+        with self.connection.cursor() as cursor:
+            for table, name, definition in foreign_keys:
+                cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+        with self.connection.cursor() as cursor:
+            for sql in self.connection.ops.sequence_reset_sql(no_style(), [Customer, Loan]):
+                cursor.execute(sql)
+
+    def drop_foreign_keys(self, models) -> list[tuple[str, str, str]]:
+        """Drop the foreign keys declared on the tables of `models`, returning their definitions"""
+        tables = [model._meta.db_table for model in models]
+        with self.connection.cursor() as cursor:
+            # Constraints inherited by partitions follow their parent's.
+            cursor.execute(
+                "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) "
+                "FROM pg_constraint WHERE contype = 'f' AND conparentid = 0 "
+                "AND conrelid::regclass::text = ANY(%s)",
+                [tables],
+            )
+            foreign_keys = cursor.fetchall()
+            for table, name, _ in foreign_keys:
+                cursor.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{name}"')
+        return foreign_keys
+
+    def insert(self, model, frame, np) -> None:
+        if self.connection.vendor != "postgresql":
+            model.objects.using(self.connection.alias).bulk_create(
+                model(**row) for row in frame.to_dict("records")
+            )
+            return
+        columns = ", ".join(f'"{column}"' for column in frame.columns)
+        db_types = {
+            field.column: field.db_type(self.connection) for field in model._meta.concrete_fields
+        }
+        if all(db_types[column] in BINARY_COPY_TYPES for column in frame.columns):
+            buffer, copy_format = self.binary_copy_buffer(frame, db_types, np), "binary"
+        else:
+            buffer, copy_format = io.StringIO(), "csv"
+            frame.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY "{model._meta.db_table}" ({columns}) FROM STDIN WITH (FORMAT {copy_format})',
+                buffer,
+            )
+
+    def binary_copy_buffer(self, frame, db_types: dict, np) -> io.BytesIO:
+        """Encode a frame of fixed-width columns in PostgreSQL's binary COPY format
+
+        Every row is a field count followed by (length, value) pairs, so the whole
+        payload is one packed numpy record array. Avoids formatting millions of
+        numbers and dates as text, which dominates the cost of a CSV COPY.
+        """
+        fields = [("field_count", ">i2")]
+        for column in frame.columns:
+            fields += [(f"{column}_length", ">i4"), (column, BINARY_COPY_TYPES[db_types[column]])]
+        rows = np.empty(len(frame), dtype=np.dtype(fields))
+        rows["field_count"] = len(frame.columns)
+        epoch = np.datetime64(POSTGRES_EPOCH, "D")
+        for column in frame.columns:
+            values = frame[column].to_numpy()
+            db_type = db_types[column]
+            if db_type == "date":
+                values = (values.astype("datetime64[D]") - epoch).astype(np.int64)
+            elif db_type == "timestamp with time zone":
+                values = (
+                    frame[column].dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()
+                    .astype("datetime64[us]") - epoch
+                ).astype(np.int64)
+            rows[f"{column}_length"] = rows.dtype[column].itemsize
+            rows[column] = values
+        # Header: signature, flags and header extension length; trailer: -1 field count.
+        return io.BytesIO(
+            b"PGCOPY\n\xff\r\n\x00" + bytes(8) + rows.tobytes() + b"\xff\xff"
+        )
+
+    def export(self, customers, loans, export_dir: str, file_format: str) -> None:
+        os.makedirs(export_dir, exist_ok=True)
+        customer_mapping, loan_mapping = (
+            {"customer_id": "Customer ID", **config["mapping"]} for config in CONFIG
+        )
+        loan_mapping["loan_id"] = "Loan ID"
+        for name, frame, mapping in (
+            ("customer_data", customers, customer_mapping),
+            ("loan_data", loans, loan_mapping),
+        ):
+            frame = frame[list(mapping)].rename(columns=mapping)
+            path = os.path.join(export_dir, f"{name}.{file_format}")
+            if file_format == "csv":
+                frame.to_csv(path, index=False)
+            else:
+                frame.to_excel(path, index=False)
+            self.stdout.write(self.style.SUCCESS(f"Exported {len(frame)} rows to {path}."))
@@ -1,8 +1,12 @@
+import logging
+from contextlib import ExitStack
 from django.core.management.base import BaseCommand, CommandParser
 from django.db import transaction
-import pandas as pd
 
 from core.models import Customer, Loan
+from core.sharding import get_shards, shard_for_customer
+
+logger = logging.getLogger(__name__)
 
 CONFIG = [
     {
@@ -45,32 +49,69 @@ class Command(BaseCommand):
             default=True,
             required=False,
         )
+        parser.add_argument(
+            "--customer-file",
+            help="Customer .xlsx or .csv file to load instead of the bundled one.",
+        )
+        parser.add_argument(
+            "--loan-file",
+            help="Loan .xlsx or .csv file to load instead of the bundled one.",
+        )
 
     def handle(self, *args, **options):
-        if Customer.objects.all().count() != 0 or Loan.objects.all().count() != 0:
+        shards = get_shards()
+        if any(
+            Customer.objects.using(alias).exists() or Loan.objects.using(alias).exists()
+            for alias in shards
+        ):
             self.stdout.write(self.style.ERROR("Data already exists in database."))
             return
+        # Imported here so that boots with an already populated database skip pandas entirely
+        import pandas as pd
+
         self.stdout.write(
             self.style.SUCCESS("Loading initial data from excel file....")
         )
         try:
-            for model_config in CONFIG:
-                with transaction.atomic():
-                    df = pd.read_excel(model_config["file_path"])
-                    print(df.head())
+            file_paths = (options["customer_file"], options["loan_file"])
+            # Database ids of the customers by their id in the file, which the database
+            # does not keep: with sharding each shard hands out its own ids.
+            customer_ids = {}
+            with ExitStack() as stack:
+                # Nothing is kept unless every file loads on every shard.
+                for alias in shards:
+                    stack.enter_context(transaction.atomic(using=alias))
+                for model_config, file_path in zip(CONFIG, file_paths):
+                    file_path = file_path or model_config["file_path"]
+                    if file_path.endswith(".csv"):
+                        df = pd.read_csv(file_path)
+                    else:
+                        df = pd.read_excel(file_path)
+                    model = model_config.get("model")
                     for index, row in df.iterrows():
-                        obj = model_config.get("model")()
+                        obj = model()
                         for key, value in model_config["mapping"].items():
                             setattr(obj, key, row[value])
-                        obj.save()
-                        self.stdout.write(
-                            self.style.SUCCESS(f"{obj} created successfully.")
-                        )
+                        if model is Customer:
+                            # Spread over the shards, each taking the id from its sequence.
+                            obj.save(using=shards[index % len(shards)])
+                            customer_ids[row.get("Customer ID", index + 1)] = obj.pk
+                        else:
+                            obj.customer_id = customer_ids[obj.customer_id]
+                            obj.save(using=shard_for_customer(obj.customer_id))
+                    logger.info(
+                        "Loaded %d %s rows from %s",
+                        len(df),
+                        model._meta.model_name,
+                        file_path,
+                        extra={"model": model._meta.model_name, "rows": len(df)},
+                    )
 
             self.stdout.write(
                 self.style.SUCCESS("Data loaded successfully from excel file....")
             )
         except Exception as e:
+            logger.exception("Loading initial data failed")
             self.stdout.write(self.style.ERROR(f"Error occurred: {e}"))
             self.stdout.write(self.style.ERROR("Data not loaded from excel file...."))
             return
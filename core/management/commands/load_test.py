@@ -0,0 +1,126 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models import Max
+
+from core.models import Customer
+
+ENDPOINTS = ("check-eligibility", "create-loan", "view-loans")
+
+
+class Command(BaseCommand):
+    help = (
+        "Send requests to a running server at a fixed arrival rate, whether or not earlier "
+        "ones have been answered, and report latency percentiles per status code. Run it at "
+        "a multiple of the server's capacity to see how the server copes with overload."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--endpoint", choices=ENDPOINTS, default="check-eligibility")
+        parser.add_argument("--rate", type=float, required=True, help="Requests per second.")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to send for.")
+        parser.add_argument("--timeout", type=float, default=90, help="Client timeout in seconds.")
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=1,
+            help="Spread requests over this many `X-Client-ID` values.",
+        )
+        parser.add_argument(
+            "--max-customer-id",
+            type=int,
+            help="Pick customers between 1 and this id (the largest in the database by default).",
+        )
+        parser.add_argument(
+            "--request-start",
+            action="store_true",
+            help="Send `X-Request-Start` like a proxy, so the server can shed queued requests.",
+        )
+        parser.add_argument("--threads", type=int, default=512)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        max_customer_id = options["max_customer_id"] or Customer.objects.aggregate(
+            max_id=Max("customer_id")
+        )["max_id"]
+        if not max_customer_id:
+            raise CommandError("No customers in database, pass --max-customer-id.")
+        rng = random.Random(options["seed"])
+        total = int(options["rate"] * options["duration"])
+        requests = [
+            self.build_request(
+                options,
+                rng.randint(1, max_customer_id),
+                f"load-test-{index % options['clients']}",
+            )
+            for index in range(total)
+        ]
+
+        results = defaultdict(list)
+        lock = threading.Lock()
+
+        def send(request: urllib.request.Request, scheduled: float) -> None:
+            if options["request_start"]:
+                request.add_header("X-Request-Start", f"t={time.time():.6f}")
+            try:
+                with urllib.request.urlopen(request, timeout=options["timeout"]) as response:
+                    response.read()
+                    outcome = response.status
+            except urllib.error.HTTPError as error:
+                outcome = error.code
+            except OSError as error:
+                outcome = type(error).__name__
+            # Measured from when the request was due, so a saturated client still counts.
+            latency = (time.perf_counter() - scheduled) * 1000
+            with lock:
+                results[outcome].append(latency)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as executor:
+            for index, request in enumerate(requests):
+                scheduled = start + index / options["rate"]
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, request, scheduled)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{options['endpoint']} at {options['rate']:g} req/s for {options['duration']:g}s: "
+            f"{total} requests, finished in {elapsed:.1f}s"
+        )
+        for outcome, latencies in sorted(results.items(), key=lambda item: str(item[0])):
+            self.report(str(outcome), latencies, elapsed)
+        self.report(
+            "all", [latency for latencies in results.values() for latency in latencies], elapsed
+        )
+
+    def build_request(self, options: dict, customer_id: int, client: str) -> urllib.request.Request:
+        headers = {"X-Client-ID": client}
+        url = f"{options['url'].rstrip('/')}/{options['endpoint']}"
+        if options["endpoint"] == "view-loans":
+            return urllib.request.Request(f"{url}/{customer_id}", headers=headers)
+        body = {
+            "customer_id": customer_id,
+            "loan_amount": 100000,
+            "interest_rate": 12,
+            "tenure": 12,
+        }
+        headers["Content-Type"] = "application/json"
+        return urllib.request.Request(url, data=json.dumps(body).encode(), headers=headers)
+
+    def report(self, name: str, timings: list, elapsed: float) -> None:
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f"{name:<20} n={len(timings):<6} rate={len(timings) / elapsed:7.1f}/s "
+            f"median={statistics.median(timings):9.1f}ms p99={p99:9.1f}ms max={timings[-1]:9.1f}ms"
+        )
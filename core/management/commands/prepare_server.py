@@ -0,0 +1,38 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandParser
+
+from core.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Collect static files, apply migrations and load the initial data in a single "
+        "process, so the container pays for one Django start-up instead of three."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--skip-collectstatic",
+            action="store_true",
+            help="Do not run collectstatic, e.g. when static files are baked into the image.",
+        )
+
+    def handle(self, *args, **options):
+        verbosity = options["verbosity"]
+        if not options["skip_collectstatic"]:
+            call_command(
+                "collectstatic", interactive=False, verbosity=verbosity, stdout=self.stdout
+            )
+        for alias in get_shards():
+            call_command(
+                "migrate",
+                database=alias,
+                interactive=False,
+                verbosity=verbosity,
+                stdout=self.stdout,
+            )
+        call_command("createcachetable", verbosity=verbosity, stdout=self.stdout)
+        if len(get_shards()) > 1:
+            # Before loading, so the initial customers already take ids of their shard.
+            call_command("configure_shards", verbosity=verbosity, stdout=self.stdout)
+        call_command("load_data_from_excel", verbosity=verbosity, stdout=self.stdout)
@@ -0,0 +1,158 @@
+import multiprocessing
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+
+from core.jobs import (
+    JOB_TYPES,
+    claim_job,
+    enqueue_daily_jobs,
+    fail_job,
+    heartbeat_jobs,
+    requeue_expired_jobs,
+    run_job,
+    run_job_by_id,
+)
+
+
+def run_job_in_thread(job) -> str:
+    try:
+        return run_job(job).status
+    finally:
+        # Each pool thread owns a connection, don't leave it open between jobs.
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the job table with a local thread or process pool, "
+        "enqueuing the JOB_DAILY job types once a day."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--workers", type=int, default=4, help="Size of the pool.")
+        parser.add_argument(
+            "--pool",
+            choices=("thread", "process"),
+            default="thread",
+            help="Use processes for CPU-bound job types such as portfolio re-scoring.",
+        )
+        parser.add_argument(
+            "--job-type",
+            action="append",
+            dest="job_types",
+            help="Only run jobs of this type (repeatable). Defaults to every registered type.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling again when no job can be claimed.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no pending job is left instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        job_types = options["job_types"] or list(JOB_TYPES)
+        unknown = set(job_types) - set(JOB_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown job types: {', '.join(sorted(unknown))}")
+
+        self.pool = options["pool"]
+        self.workers = options["workers"]
+        self.executor = self.create_executor()
+        running = {}
+        running_per_type = Counter()
+        last_heartbeat = None
+        try:
+            while True:
+                if (
+                    last_heartbeat is None
+                    or time.monotonic() - last_heartbeat >= settings.JOB_HEARTBEAT_INTERVAL
+                ):
+                    self.keep_leases([job.pk for job in running.values()])
+                    for job in enqueue_daily_jobs(job_types):
+                        self.stdout.write(f"Enqueued {job}")
+                    last_heartbeat = time.monotonic()
+
+                available = [
+                    job_type
+                    for job_type in job_types
+                    if running_per_type[job_type] < JOB_TYPES[job_type].concurrency
+                ]
+                job = (
+                    claim_job(available)
+                    if available and len(running) < self.workers
+                    else None
+                )
+                if job is not None:
+                    running[self.submit(job)] = job
+                    running_per_type[job.job_type] += 1
+                    self.stdout.write(f"Started {job}")
+                    continue
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                done, _ = wait(
+                    running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    job = running.pop(future)
+                    running_per_type[job.job_type] -= 1
+                    try:
+                        status = future.result()
+                    except BrokenProcessPool:
+                        # Every job of the pool is lost with it, not only this one.
+                        for lost in [job, *running.values()]:
+                            self.fail(lost, "The worker process running this job died.")
+                        running.clear()
+                        running_per_type.clear()
+                        self.executor.shutdown(wait=False)
+                        self.executor = self.create_executor()
+                        break
+                    except Exception:
+                        self.fail(job, traceback.format_exc())
+                        continue
+                    self.stdout.write(f"Finished {job.job_type} #{job.pk}: {status}")
+        finally:
+            self.executor.shutdown()
+
+    def create_executor(self):
+        if self.pool == "process":
+            return ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("fork")
+            )
+        return ThreadPoolExecutor(self.workers)
+
+    def submit(self, job):
+        if self.pool == "process":
+            # Workers are forked on demand and must not share our database connection.
+            connections.close_all()
+            return self.executor.submit(run_job_by_id, job.pk)
+        return self.executor.submit(run_job_in_thread, job)
+
+    def keep_leases(self, job_ids: list[int]) -> None:
+        """Refresh our jobs' heartbeats and take back the jobs of dead workers"""
+        heartbeat_jobs(job_ids)
+        requeued, failed = requeue_expired_jobs()
+        if requeued or failed:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Re-queued {requeued} and failed {failed} jobs of workers that stopped."
+                )
+            )
+
+    def fail(self, job, error: str) -> None:
+        fail_job(job, error)
+        self.stderr.write(f"Failed {job.job_type} #{job.pk}: {error.strip().splitlines()[-1]}")
@@ -0,0 +1,194 @@
+import cProfile
+import logging
+import math
+import random
+import re
+import time
+import uuid
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+
+from core.admission import client_key, get_cache, queue_delay_ms, take_token
+from core.compression import (
+    COMPRESSIBLE_CONTENT_TYPES,
+    compress,
+    negotiate_encoding,
+    offered_encodings,
+)
+from core.constants import RATE_LIMITED_MESSAGE, SERVER_BUSY_MESSAGE
+from core.log import request_id_var
+from core.models import ProfileCapture
+from core.profiling import dump_stats
+
+REQUEST_ID_PATTERN = re.compile(r"[\w.-]{1,64}")
+
+logger = logging.getLogger(__name__)
+
+
+class RequestIdMiddleware:
+    """Tag the request with an id, reused from `X-Request-ID` when the client or proxy
+    sent a sane one, so every log record it produces can be correlated."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get("HTTP_X_REQUEST_ID", "")
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        token = request_id_var.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response["X-Request-ID"] = request_id
+        return response
+
+
+class AdmissionControlMiddleware:
+    """Turn away requests the server should not spend a worker on, before any work is done
+
+    - 503 when the request already queued longer than `ADMISSION_MAX_QUEUE_DELAY_MS`
+      in front of the workers (per the proxy's `X-Request-Start`): its client has
+      likely given up, and serving it only delays the requests queued behind it.
+    - 429 when the client has used up its token bucket (`ADMISSION_RATE`, `ADMISSION_BURST`).
+
+    Both carry `Retry-After`. Expensive views additionally limit how many of them
+    run at once with `core.decorators.limit_concurrency`.
+    """
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_RATE and not settings.ADMISSION_MAX_QUEUE_DELAY_MS:
+            raise MiddlewareNotUsed
+        if settings.ADMISSION_RATE:
+            get_cache()  # Refuse a cache the workers do not share at start-up.
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.ADMISSION_MAX_QUEUE_DELAY_MS:
+            delay = queue_delay_ms(request)
+            if delay is not None and delay > settings.ADMISSION_MAX_QUEUE_DELAY_MS:
+                logger.warning("Request shed after queueing", extra={"queue_delay_ms": delay})
+                return overloaded_response(SERVER_BUSY_MESSAGE, 503, settings.ADMISSION_RETRY_AFTER)
+        if settings.ADMISSION_RATE:
+            client = client_key(request)
+            wait = take_token(client)
+            if wait:
+                logger.warning("Client rate limited", extra={"client": client})
+                return overloaded_response(RATE_LIMITED_MESSAGE, 429, wait)
+        return self.get_response(request)
+
+
+def overloaded_response(message: str, status: int, retry_after: float) -> JsonResponse:
+    response = JsonResponse({"message": message}, status=status)
+    response["Retry-After"] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+class ProfilingMiddleware:
+    """Capture a cProfile of requests that carry `PROFILING_HEADER` set to
+    `PROFILING_TOKEN`, or of a `PROFILING_SAMPLE_RATE` share of all requests.
+
+    Captures are listed and downloaded through the `/profiles/` endpoints. With
+    neither a token nor a sample rate configured the middleware removes itself
+    from the chain at startup, so it costs nothing when left installed.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_TOKEN and not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = "HTTP_" + settings.PROFILING_HEADER.upper().replace("-", "_")
+
+    def get_trigger(self, request) -> str | None:
+        token = request.META.get(self.header)
+        if token and settings.PROFILING_TOKEN and constant_time_compare(
+            token, settings.PROFILING_TOKEN
+        ):
+            return ProfileCapture.HEADER
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return ProfileCapture.SAMPLED
+        return None
+
+    def __call__(self, request):
+        trigger = self.get_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active, serve the request unprofiled.
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        capture = ProfileCapture.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:255],
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            trigger=trigger,
+            stats=dump_stats(profiler),
+        )
+        stale = ProfileCapture.objects.order_by("-created_at").values_list("pk", flat=True)[
+            settings.PROFILING_MAX_CAPTURES :
+        ]
+        ProfileCapture.objects.filter(pk__in=list(stale)).delete()
+        response[settings.PROFILING_HEADER + "-Id"] = str(capture.pk)
+        return response
+
+
+class CompressionMiddleware:
+    """Compress response bodies with the best of `RESPONSE_COMPRESSION` the client accepts
+
+    Only JSON bodies of `RESPONSE_COMPRESSION_MIN_SIZE` bytes or more are
+    compressed; smaller ones gain too little to be worth the CPU, and pages
+    holding the CSRF token must not be (see `COMPRESSIBLE_CONTENT_TYPES`).
+    Compressed responses get a weak ETag, their bytes differ from the identity
+    body's. Removes itself from the chain when no encoding is configured.
+    """
+
+    def __init__(self, get_response):
+        self.encodings = offered_encodings()
+        if not self.encodings:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not response.get("Content-Type", "").startswith(COMPRESSIBLE_CONTENT_TYPES)
+        ):
+            return response
+        # The representation depends on the header from here on, compressed or not.
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+        encoding = negotiate_encoding(
+            request.headers.get("Accept-Encoding", ""), self.encodings
+        )
+        if encoding is None:
+            return response
+
+        content = compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response["Content-Length"] = str(len(content))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_missing_versions(apps, schema_editor):
+    Customer = apps.get_model("core", "Customer")
+    CustomerLoansVersion = apps.get_model("core", "CustomerLoansVersion")
+    CustomerLoansVersion.objects.bulk_create(
+        (
+            CustomerLoansVersion(customer_id=customer_id)
+            for customer_id in Customer.objects.filter(
+                customerloansversion__isnull=True
+            ).values_list("customer_id", flat=True)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_customerloansversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_versions, migrations.RunPython.noop),
+    ]
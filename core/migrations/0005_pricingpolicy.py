@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 13:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_backfill_customerloansversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.CharField(max_length=50, unique=True)),
+                ('max_dti_ratio', models.FloatField(default=0.5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PricingBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_score', models.IntegerField()),
+                ('rate_floor', models.FloatField(blank=True, null=True)),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='core.pricingpolicy')),
+            ],
+            options={
+                'unique_together': {('policy', 'min_score')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_pricingpolicy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLoanHistory',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_history', serialize=False, to='core.customer')),
+                ('total_loan', models.IntegerField(default=0)),
+                ('emi_paid', models.BigIntegerField(default=0)),
+                ('total_emi', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('loan_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('loan_amount', models.IntegerField(default=0)),
+                ('tenure', models.SmallIntegerField(default=0)),
+                ('interest_rate', models.FloatField(default=0.0)),
+                ('monthly_payment', models.FloatField(default=0)),
+                ('emis_paid_on_time', models.SmallIntegerField(default=0)),
+                ('date_of_approval', models.DateField()),
+                ('end_date', models.DateField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='core.customer')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_profilecapture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedloan',
+            name='interest_rate_bps',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedloan',
+            name='monthly_payment_paise',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='monthly_salary_paise',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='interest_rate_bps',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='monthly_payment_paise',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:34
+
+import core.models
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_minor_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(choices=[('customer.registered', 'Customer registered'), ('loan.created', 'Loan created'), ('loan.updated', 'Loan updated')], max_length=30)),
+                ('customer_id', models.IntegerField(db_index=True)),
+                ('loan_id', models.IntegerField(blank=True, null=True)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('transaction_id', models.BigIntegerField(db_default=core.models.CurrentTransactionId(), editable=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['transaction_id', 'id'], name='core_outbox_transac_75a3aa_idx')],
+            },
+        ),
+    ]
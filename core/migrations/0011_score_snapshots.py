@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('customer_id', models.IntegerField()),
+                ('credit_score', models.SmallIntegerField()),
+                ('approved_limit', models.BigIntegerField()),
+                ('monthly_salary_paise', models.BigIntegerField()),
+                ('total_amount', models.BigIntegerField()),
+                ('active_loan', models.SmallIntegerField()),
+                ('total_monthly_payment_paise', models.BigIntegerField()),
+                ('total_loan', models.IntegerField()),
+                ('last_year_loan', models.SmallIntegerField()),
+                ('emi_paid', models.IntegerField()),
+                ('total_emi', models.IntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='customerscoresnapshot',
+            constraint=models.UniqueConstraint(fields=('date', 'customer_id'), name='unique_score_snapshot'),
+        ),
+    ]
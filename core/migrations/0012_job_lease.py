@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+def start_leases(apps, schema_editor):
+    # Jobs already running get a lease from their start, so a dead worker's ones expire too.
+    Job = apps.get_model("core", "Job")
+    Job.objects.filter(status="running").update(
+        heartbeat_at=models.F("started_at"), attempts=1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_score_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(start_leases, migrations.RunPython.noop),
+    ]
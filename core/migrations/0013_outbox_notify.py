@@ -0,0 +1,28 @@
+from django.db import migrations
+
+# Every statement inserting outbox events notifies the feed's listeners once it commits
+# (see `core.outbox.wait_for_events`). Rolled back inserts notify nobody.
+CREATE_TRIGGER = """
+CREATE FUNCTION core_outboxevent_notify() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('core_outboxevent', '');
+    RETURN NULL;
+END $$;
+CREATE TRIGGER core_outboxevent_notify AFTER INSERT ON core_outboxevent
+    FOR EACH STATEMENT EXECUTE FUNCTION core_outboxevent_notify();
+"""
+DROP_TRIGGER = """
+DROP TRIGGER core_outboxevent_notify ON core_outboxevent;
+DROP FUNCTION core_outboxevent_notify();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_job_lease'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER, hints={"model_name": "outboxevent"}),
+    ]
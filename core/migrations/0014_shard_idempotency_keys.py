@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_missing_table(apps, schema_editor):
+    # Shards migrated before idempotency keys moved to them skipped 0002.
+    model = apps.get_model("core", "IdempotencyKey")
+    connection = schema_editor.connection
+    if model._meta.db_table not in connection.introspection.table_names():
+        schema_editor.create_model(model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_outbox_notify'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_missing_table,
+            migrations.RunPython.noop,
+            hints={"model_name": "idempotencykey"},
+        ),
+    ]
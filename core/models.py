@@ -1,7 +1,64 @@
-from django.db import models
+import datetime
+from dateutil import relativedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.utils import timezone
 
+MINOR_UNITS_PER_RUPEE = 100
+BASIS_POINTS_PER_PERCENT = 100
 
-class Customer(models.Model):
+
+def to_minor_units(amount: float | None) -> int | None:
+    """Rupees to paise, rounding half to even like PostgreSQL's round() on floats"""
+    return None if amount is None else round(amount * MINOR_UNITS_PER_RUPEE)
+
+
+def installment_minor_units(monthly_payment: float | None, paise: int | None) -> int | None:
+    """`monthly_payment_paise` for a loan's `monthly_payment`
+
+    The float column holds installments truncated to whole rupees, so a paise
+    amount within a rupee of it is the exact installment (see `CreateLoanAPIView`)
+    and is kept. Anything else is derived from the float.
+    """
+    if (
+        monthly_payment is not None
+        and paise is not None
+        and abs(paise - monthly_payment * MINOR_UNITS_PER_RUPEE) < MINOR_UNITS_PER_RUPEE
+    ):
+        return paise
+    return to_minor_units(monthly_payment)
+
+
+def to_basis_points(rate: float | None) -> int | None:
+    """Percent to basis points"""
+    return None if rate is None else round(rate * BASIS_POINTS_PER_PERCENT)
+
+
+class MinorUnitsQuerySet(models.QuerySet):
+    """Fills the integer minor-unit columns of objects created in bulk
+
+    `save()` does the same through the pre_save signal in `core.signals`.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_minor_units()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class AtomicSaveMixin:
+    """Save inside a transaction, so the rows post_save receivers write (the loans
+    version, outbox events) commit or roll back together with the instance"""
+
+    def save(self, *args, using=None, **kwargs):
+        using = using or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, using=using, **kwargs)
+
+
+class Customer(AtomicSaveMixin, models.Model):
     customer_id = models.AutoField(primary_key=True)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -9,11 +66,50 @@ class Customer(models.Model):
     phone_number = models.CharField(max_length=10)
     monthly_salary = models.FloatField()
     approved_limit = models.IntegerField()
+    # Integer copy of `monthly_salary` in paise, see `backfill_minor_units`
+    monthly_salary_paise = models.BigIntegerField(null=True, blank=True)
+
+    objects = MinorUnitsQuerySet.as_manager()
 
     def __str__(self):
         return self.first_name + " " + self.last_name
 
-class Loan(models.Model):
+    def set_minor_units(self) -> None:
+        self.monthly_salary_paise = to_minor_units(self.monthly_salary)
+
+class LoanQuerySet(MinorUnitsQuerySet):
+    def active(self, on: datetime.date | None = None) -> "LoanQuerySet":
+        """Loans still being repaid on `on` (today by default).
+
+        When `settings.LOAN_MAX_TENURE_MONTHS` is set the approval date is bounded
+        as well, which lets PostgreSQL prune `date_of_approval` partitions.
+        """
+        on = on or datetime.date.today()
+        queryset = self.filter(end_date__gte=on, tenure__gt=models.F("emis_paid_on_time"))
+        if settings.LOAN_MAX_TENURE_MONTHS:
+            queryset = queryset.filter(
+                date_of_approval__gte=on
+                - relativedelta.relativedelta(months=settings.LOAN_MAX_TENURE_MONTHS)
+            )
+        return queryset
+
+    def approved_since(self, date: datetime.date) -> "LoanQuerySet":
+        return self.filter(date_of_approval__gte=date)
+
+    def archivable(self, on: datetime.date | None = None) -> "LoanQuerySet":
+        """Closed loans approved more than a year before `on` (today by default).
+
+        Such loans no longer affect the active-loan or last-year figures of the
+        credit score, only its lifetime counters.
+        """
+        on = on or datetime.date.today()
+        return self.filter(
+            models.Q(end_date__lt=on) | models.Q(emis_paid_on_time=models.F("tenure")),
+            date_of_approval__lt=on - datetime.timedelta(days=365),
+        )
+
+
+class Loan(AtomicSaveMixin, models.Model):
     loan_id = models.AutoField(primary_key=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     loan_amount = models.IntegerField(default=0)
@@ -23,6 +119,248 @@ class Loan(models.Model):
     emis_paid_on_time = models.IntegerField(default=0)
     date_of_approval = models.DateField()
     end_date = models.DateField()
+    # Integer copies of `interest_rate` and `monthly_payment`, see `backfill_minor_units`
+    interest_rate_bps = models.IntegerField(null=True, blank=True)
+    monthly_payment_paise = models.BigIntegerField(null=True, blank=True)
+
+    objects = LoanQuerySet.as_manager()
 
     def __str__(self):
         return self.customer.first_name + " " + self.customer.last_name + " " + str(self.loan_id)
+
+    def set_minor_units(self) -> None:
+        self.interest_rate_bps = to_basis_points(self.interest_rate)
+        self.monthly_payment_paise = installment_minor_units(
+            self.monthly_payment, self.monthly_payment_paise
+        )
+
+
+class ArchivedLoan(models.Model):
+    """Closed loan moved out of the hot `Loan` table by the `archive_loans` command."""
+
+    loan_id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="archived_loans")
+    loan_amount = models.IntegerField(default=0)
+    tenure = models.SmallIntegerField(default=0)
+    interest_rate = models.FloatField(default=0.0)
+    monthly_payment = models.FloatField(default=0)
+    emis_paid_on_time = models.SmallIntegerField(default=0)
+    date_of_approval = models.DateField()
+    end_date = models.DateField()
+    interest_rate_bps = models.IntegerField(null=True, blank=True)
+    monthly_payment_paise = models.BigIntegerField(null=True, blank=True)
+
+    objects = MinorUnitsQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.customer_id} {self.loan_id}"
+
+    def set_minor_units(self) -> None:
+        self.interest_rate_bps = to_basis_points(self.interest_rate)
+        self.monthly_payment_paise = installment_minor_units(
+            self.monthly_payment, self.monthly_payment_paise
+        )
+
+
+class CustomerLoanHistory(models.Model):
+    """Credit score counters of a customer's archived loans.
+
+    Archived loans are closed and older than a year, so they only ever add to
+    the loan count, the EMIs paid on time and the EMIs due.
+    """
+
+    customer = models.OneToOneField(
+        Customer, on_delete=models.CASCADE, primary_key=True, related_name="loan_history"
+    )
+    total_loan = models.IntegerField(default=0)
+    emi_paid = models.BigIntegerField(default=0)
+    total_emi = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.customer_id} ({self.total_loan} archived loans)"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an ``Idempotency-Key`` header."""
+
+    key = models.CharField(max_length=255, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.IntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class CustomerLoansVersion(models.Model):
+    """Counter bumped whenever one of the customer's loans is written.
+
+    Used to derive ETags and cache keys for loan read endpoints.
+    """
+
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.customer_id} v{self.version}"
+
+
+class PricingPolicy(models.Model):
+    """Score bands and affordability limit used to price loans of a product."""
+
+    product = models.CharField(max_length=50, unique=True)
+    max_dti_ratio = models.FloatField(default=0.5)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.product
+
+
+class PricingBand(models.Model):
+    """Applies to credit scores strictly greater than `min_score`.
+
+    Scores at or below the lowest band of a policy are rejected. A `rate_floor`
+    of `None` approves the requested interest rate as is.
+    """
+
+    policy = models.ForeignKey(PricingPolicy, on_delete=models.CASCADE, related_name="bands")
+    min_score = models.IntegerField()
+    rate_floor = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("policy", "min_score")
+
+    def __str__(self):
+        return f"{self.policy} > {self.min_score}"
+
+
+class Job(models.Model):
+    """Unit of background work picked up by the `run_jobs` worker."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    )
+
+    job_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker running the job, see `requeue_expired_jobs`
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.job_type} #{self.pk} ({self.status})"
+
+
+class ProfileCapture(models.Model):
+    """cProfile statistics of one request, captured by `ProfilingMiddleware`."""
+
+    HEADER = "header"
+    SAMPLED = "sampled"
+    TRIGGER_CHOICES = ((HEADER, "Header"), (SAMPLED, "Sampled"))
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField(db_index=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    # Marshalled `pstats` data, the same bytes `pstats.Stats.dump_stats` writes
+    stats = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.1f} ms)"
+
+
+class CurrentTransactionId(models.Func):
+    """64-bit id of the current PostgreSQL transaction (PostgreSQL 13+)"""
+
+    template = "pg_current_xact_id()::text::bigint"
+    output_field = models.BigIntegerField()
+
+
+class SnapshotXmin(models.Func):
+    """Oldest transaction id still running when the current snapshot was taken"""
+
+    template = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+    output_field = models.BigIntegerField()
+
+
+class OutboxEvent(models.Model):
+    """Change to a customer or loan, written in the transaction that made it
+
+    Read through the `/events/` feed (see `core.outbox`). Rows are only ever
+    inserted; the id is the sequence number consumers resume from.
+    """
+
+    CUSTOMER_REGISTERED = "customer.registered"
+    LOAN_CREATED = "loan.created"
+    LOAN_UPDATED = "loan.updated"
+    EVENT_TYPE_CHOICES = (
+        (CUSTOMER_REGISTERED, "Customer registered"),
+        (LOAN_CREATED, "Loan created"),
+        (LOAN_UPDATED, "Loan updated"),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    # Plain ids rather than foreign keys: events outlive the rows they describe.
+    customer_id = models.IntegerField(db_index=True)
+    loan_id = models.IntegerField(null=True, blank=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    # Transaction that wrote the event, the feed's order (see `core.outbox.read_events`)
+    transaction_id = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["transaction_id", "id"])]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.pk}"
+
+
+class CustomerScoreSnapshot(models.Model):
+    """A customer's `get_loan_aggregates` figures and credit score on one day
+
+    Written for every customer by the `snapshot_scores` command, read by policy
+    backtests (see `core.backtest`). Money is kept in paise.
+    """
+
+    date = models.DateField()
+    customer_id = models.IntegerField()
+    credit_score = models.SmallIntegerField()
+    approved_limit = models.BigIntegerField()
+    monthly_salary_paise = models.BigIntegerField()
+    total_amount = models.BigIntegerField()
+    active_loan = models.SmallIntegerField()
+    total_monthly_payment_paise = models.BigIntegerField()
+    total_loan = models.IntegerField()
+    last_year_loan = models.SmallIntegerField()
+    emi_paid = models.IntegerField()
+    total_emi = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "customer_id"], name="unique_score_snapshot")
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id} {self.date} ({self.credit_score})"
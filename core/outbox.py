@@ -0,0 +1,114 @@
+import select
+import threading
+import time
+from django.db import connections
+from django.db.models import Q, Subquery
+
+from core.models import Customer, Loan, OutboxEvent, SnapshotXmin
+
+CUSTOMER_PAYLOAD_FIELDS = ("customer_id", "monthly_salary", "approved_limit")
+LOAN_PAYLOAD_FIELDS = (
+    "loan_id",
+    "customer_id",
+    "loan_amount",
+    "interest_rate",
+    "tenure",
+    "monthly_payment",
+    "emis_paid_on_time",
+    "date_of_approval",
+    "end_date",
+)
+# Channel the outbox table's trigger notifies on every insert (see migration 0013)
+NOTIFY_CHANNEL = "core_outboxevent"
+# Listening connections of each thread by shard, see `get_listener`
+listeners = threading.local()
+
+
+def customer_payload(customer: Customer) -> dict:
+    return {field: getattr(customer, field) for field in CUSTOMER_PAYLOAD_FIELDS}
+
+
+def loan_payload(loan: Loan) -> dict:
+    return {field: getattr(loan, field) for field in LOAN_PAYLOAD_FIELDS}
+
+
+def record_event(
+    using: str, event_type: str, customer_id: int, payload: dict, loan_id: int | None = None
+) -> OutboxEvent:
+    """Append an event in the current transaction of `using`"""
+    return OutboxEvent.objects.using(using).create(
+        event_type=event_type, customer_id=customer_id, loan_id=loan_id, payload=payload
+    )
+
+
+def read_events(alias: str, after: int, limit: int) -> list[OutboxEvent]:
+    """Up to `limit` events of shard `alias` that follow the event with id `after`
+
+    Ids are taken when a row is inserted, not when it commits, so a smaller id
+    can become visible after a larger one was already served. Events are
+    therefore ordered by (transaction id, id) and only returned once every
+    transaction older than theirs has finished: whatever commits later sorts
+    after the events already served and can't be skipped by a consumer.
+    """
+    events = OutboxEvent.objects.using(alias).filter(transaction_id__lt=SnapshotXmin())
+    if after:
+        cursor = Subquery(
+            OutboxEvent.objects.using(alias).filter(pk=after).values("transaction_id")
+        )
+        events = events.filter(
+            Q(transaction_id__gt=cursor) | Q(transaction_id=cursor, id__gt=after)
+        )
+    return list(events.order_by("transaction_id", "id")[:limit])
+
+
+def get_listener(alias: str):
+    """This thread's connection LISTENing to the inserts of shard `alias`'s outbox table
+
+    Kept open between requests, so a long poll does not pay for a connection.
+    """
+    by_alias = listeners.__dict__.setdefault("by_alias", {})
+    listener = by_alias.get(alias)
+    if listener is None or listener.closed:
+        connection = connections[alias]
+        listener = connection.get_new_connection(connection.get_connection_params())
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        by_alias[alias] = listener
+    return listener
+
+
+def close_listeners() -> None:
+    """Close this thread's listening connections"""
+    for listener in listeners.__dict__.pop("by_alias", {}).values():
+        listener.close()
+
+
+def wait_for_events(alias: str, after: int, limit: int, wait: float) -> list[OutboxEvent]:
+    """`read_events`, waiting up to `wait` seconds for new events when there are none
+
+    Waits on the thread's listening connection (see `get_listener`), so a write
+    committed by any process wakes it up right away.
+    """
+    events = read_events(alias, after, limit)
+    if events or wait <= 0:
+        return events
+    listener = get_listener(alias)
+    try:
+        # Forget the inserts notified before, then read again: whatever commits
+        # from here on is notified and wakes us up.
+        listener.poll()
+        listener.notifies.clear()
+        events = read_events(alias, after, limit)
+        if events:
+            return events
+        deadline = time.monotonic() + wait
+        while (remaining := deadline - time.monotonic()) > 0:
+            if select.select([listener], [], [], remaining)[0]:
+                listener.poll()
+                if listener.notifies:
+                    break
+    except connections[alias].Database.Error:
+        # The connection was lost, e.g. the server restarted. The next wait opens another.
+        listeners.by_alias.pop(alias).close()
+    return read_events(alias, after, limit)
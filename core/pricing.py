@@ -0,0 +1,75 @@
+import time
+from bisect import bisect_left
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from core.constants import DEFAULT_PRICING_PRODUCT, UNKNOWN_PRICING_PRODUCT_MESSAGE
+from core.models import PricingBand, PricingPolicy
+
+
+class CompiledPricingPolicy:
+    """Pricing policy compiled into a sorted lookup table.
+
+    `thresholds` holds the band lower bounds in ascending order and
+    `rate_floors` the matching floors, so banding a score is a single bisect.
+    """
+
+    def __init__(self, product: str, max_dti_ratio: float, bands: list) -> None:
+        bands = sorted(bands, key=lambda band: band[0])
+        self.product = product
+        self.max_dti_ratio = max_dti_ratio
+        self.thresholds = [min_score for min_score, _ in bands]
+        self.rate_floors = [rate_floor for _, rate_floor in bands]
+
+    def price(self, credit_score: int) -> tuple[bool, float | None]:
+        """Return `(is_eligible, rate_floor)` for a credit score
+
+        A score belongs to the highest band whose `min_score` it strictly exceeds.
+        """
+        band = bisect_left(self.thresholds, credit_score) - 1
+        if band < 0:
+            return False, None
+        return True, self.rate_floors[band]
+
+
+_compiled_policies: dict[str, tuple[float, CompiledPricingPolicy]] = {}
+
+
+def load_pricing_policy(product: str) -> CompiledPricingPolicy:
+    """Compile the pricing policy of a product from the database, or from settings for the default product"""
+    bands = list(
+        PricingBand.objects.filter(policy__product=product).select_related("policy")
+    )
+    if bands:
+        policy = bands[0].policy
+    else:
+        policy = PricingPolicy.objects.filter(product=product).first()
+    if policy is not None:
+        return CompiledPricingPolicy(
+            product,
+            policy.max_dti_ratio,
+            [(band.min_score, band.rate_floor) for band in bands],
+        )
+    if product == DEFAULT_PRICING_PRODUCT:
+        config = settings.DEFAULT_PRICING_POLICY
+        return CompiledPricingPolicy(product, config["max_dti_ratio"], config["bands"])
+    raise ValidationError(UNKNOWN_PRICING_PRODUCT_MESSAGE)
+
+
+def get_pricing_policy(product: str = DEFAULT_PRICING_PRODUCT) -> CompiledPricingPolicy:
+    """Return the compiled pricing policy of a product, cached per process
+
+    Policies are reloaded after `PRICING_POLICY_RELOAD_SECONDS`, or immediately
+    in this process when a policy or band is saved (see `core.signals`).
+    """
+    now = time.monotonic()
+    cached = _compiled_policies.get(product)
+    if cached is not None and now - cached[0] < settings.PRICING_POLICY_RELOAD_SECONDS:
+        return cached[1]
+    policy = load_pricing_policy(product)
+    _compiled_policies[product] = (now, policy)
+    return policy
+
+
+def invalidate_pricing_policies() -> None:
+    _compiled_policies.clear()
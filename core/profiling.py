@@ -0,0 +1,79 @@
+import marshal
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+# Calls shorter than this are folded into their caller's self time in speedscope output.
+SPEEDSCOPE_MIN_DURATION_MS = 0.01
+SPEEDSCOPE_MAX_DEPTH = 200
+
+
+def dump_stats(profiler) -> bytes:
+    """Serialize a disabled `cProfile.Profile` in the `pstats` file format"""
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+def frame_name(func: tuple) -> str:
+    filename, line, name = func
+    return name if filename == "~" else f"{name} ({filename}:{line})"
+
+
+def stats_to_speedscope(data: bytes, name: str) -> dict:
+    """Convert `pstats` data into a speedscope evented profile
+
+    cProfile only records caller/callee totals, not full stacks, so the call tree
+    is rebuilt the way snakeviz and gprof do: a function's children get their
+    edge time scaled by the share of the function's total time spent in this
+    branch. Recursive calls are cut at their first repetition.
+    """
+    stats = marshal.loads(data)
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3] * 1000))
+
+    frames, frame_ids, events = [], {}, []
+
+    def frame_id(func: tuple) -> int:
+        if func not in frame_ids:
+            frame_ids[func] = len(frames)
+            frames.append({"name": frame_name(func), "file": func[0], "line": func[1]})
+        return frame_ids[func]
+
+    def visit(func: tuple, start: float, duration: float, stack: tuple) -> None:
+        index = frame_id(func)
+        events.append({"type": "O", "frame": index, "at": start})
+        total = stats[func][3] * 1000
+        if total and len(stack) < SPEEDSCOPE_MAX_DEPTH:
+            scale = duration / total
+            at = start
+            for child, edge_ms in sorted(callees.get(func, ()), key=lambda item: -item[1]):
+                child_duration = min(edge_ms * scale, start + duration - at)
+                if child in stack or child_duration < SPEEDSCOPE_MIN_DURATION_MS:
+                    continue
+                visit(child, at, child_duration, stack + (child,))
+                at += child_duration
+        events.append({"type": "C", "frame": index, "at": start + duration})
+
+    at = 0.0
+    roots = [func for func, (_, _, _, _, callers) in stats.items() if not callers]
+    for root in sorted(roots, key=lambda func: -stats[func][3]):
+        duration = stats[root][3] * 1000
+        visit(root, at, duration, (root,))
+        at += duration
+
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "name": name,
+        "exporter": "core.profiling",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "evented",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": at,
+                "events": events,
+            }
+        ],
+    }
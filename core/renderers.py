@@ -0,0 +1,42 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # falls back to DRF's encoder
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """`JSONRenderer` producing the same document with orjson, several times faster
+
+    Values orjson has no native encoding for (dates, decimals, lazy strings...)
+    go through DRF's encoder as usual. Renders with DRF's encoder when orjson
+    is not installed, when indented output is asked for (e.g. by the browsable
+    API), when `UNICODE_JSON` or `COMPACT_JSON` are turned off, and for data
+    orjson refuses, such as integers beyond 64 bits.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like `JSONRenderer` does, to keep the output a strict javascript subset.
+        if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+            content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return content
@@ -1,7 +1,11 @@
 import datetime
+from django.conf import settings
 from rest_framework import serializers
 
-from core.models import Customer, Loan
+from core.constants import DEFAULT_PRICING_PRODUCT
+from core.jobs import JOB_TYPES
+from core.models import Customer, Job, Loan, OutboxEvent, ProfileCapture
+from core.sharding import get_shards, new_customer_shard
 from core.utils import calculate_emis_till_date
 
 
@@ -27,7 +31,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         validated_data["approved_limit"] = self.calculate_approved_limit(
             validated_data["monthly_salary"]
         )
-        return super().create(validated_data)
+        return Customer.objects.db_manager(new_customer_shard()).create(**validated_data)
 
 
 class LoanRequestBodySerializer(serializers.Serializer):
@@ -39,6 +43,40 @@ class LoanRequestBodySerializer(serializers.Serializer):
     loan_amount = serializers.FloatField()
     interest_rate = serializers.FloatField()
     tenure = serializers.IntegerField()
+    product = serializers.CharField(
+        max_length=50, required=False, default=DEFAULT_PRICING_PRODUCT
+    )
+
+    def validate_tenure(self, value: int) -> int:
+        if settings.LOAN_MAX_TENURE_MONTHS and value > settings.LOAN_MAX_TENURE_MONTHS:
+            raise serializers.ValidationError(
+                f"Tenure can not exceed {settings.LOAN_MAX_TENURE_MONTHS} months."
+            )
+        return value
+
+
+class BacktestRequestSerializer(serializers.Serializer):
+    """
+    Serializer for the payload of the `backtest_policy` job.
+    """
+
+    loan_amount = serializers.FloatField()
+    interest_rate = serializers.FloatField()
+    tenure = serializers.IntegerField(min_value=1)
+    product = serializers.CharField(
+        max_length=50, required=False, default=DEFAULT_PRICING_PRODUCT
+    )
+    since = serializers.DateField()
+    until = serializers.DateField(required=False, help_text="Today by default.")
+    step = serializers.IntegerField(
+        min_value=1, default=1, help_text="Days between the snapshot days read."
+    )
+
+    def validate(self, attrs: dict) -> dict:
+        attrs.setdefault("until", datetime.date.today())
+        if attrs["since"] > attrs["until"]:
+            raise serializers.ValidationError("`since` must not be after `until`.")
+        return attrs
 
 
 class LoanEligibilityResponseSerializer(serializers.Serializer):
@@ -54,6 +92,54 @@ class LoanEligibilityResponseSerializer(serializers.Serializer):
     monthly_installment = serializers.FloatField()
 
 
+class LoanAggregatesSerializer(serializers.Serializer):
+    total_amount = serializers.IntegerField(help_text="Principal of active loans.")
+    active_loan = serializers.IntegerField(help_text="Number of active loans.")
+    total_monthly_payment = serializers.FloatField(help_text="EMIs of active loans.")
+    total_loan = serializers.IntegerField(help_text="Number of loans ever taken.")
+    last_year_loan = serializers.IntegerField(help_text="Loans approved in the last 365 days.")
+    emi_paid = serializers.IntegerField(help_text="EMIs paid on time.")
+    total_emi = serializers.IntegerField(help_text="EMIs due till date.")
+
+
+class CreditScoreComponentsSerializer(serializers.Serializer):
+    limit_exceeded = serializers.BooleanField(
+        help_text="Active loans reach the approved limit, the score is 0."
+    )
+    repayment_ratio = serializers.FloatField(help_text="EMIs paid on time out of EMIs due.")
+    loan_history = serializers.FloatField(help_text="Points out of 80.")
+    recent_loans = serializers.FloatField(help_text="Points out of 20.")
+
+
+class CreditScoreQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the credit score breakdown API.
+    """
+
+    as_of = serializers.DateField(
+        required=False, help_text="Score the customer as of this past date instead of today."
+    )
+
+    def validate_as_of(self, value: datetime.date) -> datetime.date:
+        if value > datetime.date.today():
+            raise serializers.ValidationError("Date can not be in the future.")
+        return value
+
+
+class CreditScoreBreakdownSerializer(serializers.Serializer):
+    """
+    Serializer for the response of the credit score breakdown API.
+    """
+
+    customer_id = serializers.IntegerField()
+    as_of = serializers.DateField()
+    credit_score = serializers.IntegerField()
+    approved_limit = serializers.IntegerField()
+    monthly_salary = serializers.FloatField()
+    components = CreditScoreComponentsSerializer()
+    loans = LoanAggregatesSerializer()
+
+
 class LoanCreateResponseSerializer(serializers.Serializer):
     """
     Serializer for the response of the create loan API.
@@ -70,13 +156,20 @@ class LoanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Loan
         fields = "__all__"
+        # The view passes the already fetched customer to `save()`
+        read_only_fields = ("customer",)
+
+    def create(self, validated_data):
+        # A loan lives on the shard of its customer.
+        customer = validated_data["customer"]
+        return Loan.objects.db_manager(customer._state.db).create(**validated_data)
 
     def to_representation(self, instance):
         "if extra attribute passed while creting this serializer like create_view then use LoanCreateResponseSerializer"
         data = LoanCreateResponseSerializer(
             data={
                 "loan_id": instance.loan_id,
-                "customer_id": instance.customer.customer_id,
+                "customer_id": instance.customer_id,
                 "loan_approved": True if instance.loan_id else False,
                 "monthly_installment": instance.monthly_payment,
                 "message": self.context.get("message"),
@@ -133,3 +226,90 @@ class CustomerLoanSerializer(serializers.ModelSerializer):
             "monthly_installment",
             "repayments_left",
         )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "job_type",
+            "payload",
+            "status",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "attempts",
+        )
+        read_only_fields = (
+            "status",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "attempts",
+        )
+
+    def validate_job_type(self, value: str) -> str:
+        job_type = JOB_TYPES.get(value)
+        if job_type is None or not job_type.public:
+            raise serializers.ValidationError("Unknown job type.")
+        return value
+
+
+class ProfileCaptureSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProfileCapture
+        fields = (
+            "id",
+            "method",
+            "path",
+            "status_code",
+            "duration_ms",
+            "trigger",
+            "created_at",
+        )
+
+
+class OutboxEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OutboxEvent
+        fields = ("id", "event_type", "customer_id", "loan_id", "payload", "created_at")
+
+
+class EventFeedQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the event feed.
+    """
+
+    after = serializers.IntegerField(
+        min_value=0, default=0, help_text="`next` of the previous page, 0 for the first page."
+    )
+    limit = serializers.IntegerField(min_value=1, default=100)
+    wait = serializers.FloatField(
+        min_value=0, default=0, help_text="Seconds to wait for new events when there are none."
+    )
+    shard = serializers.CharField(default="default", help_text="Database shard to read.")
+
+    def validate_limit(self, value: int) -> int:
+        return min(value, settings.EVENT_FEED_MAX_LIMIT)
+
+    def validate_wait(self, value: float) -> float:
+        return min(value, settings.EVENT_FEED_MAX_WAIT)
+
+    def validate_shard(self, value: str) -> str:
+        if value not in get_shards():
+            raise serializers.ValidationError("Unknown shard.")
+        return value
+
+
+class EventFeedSerializer(serializers.Serializer):
+    """
+    Serializer for the response of the event feed.
+    """
+
+    events = OutboxEventSerializer(many=True)
+    next = serializers.IntegerField()
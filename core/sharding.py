@@ -0,0 +1,112 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models stored on the shard of their customer. Every other model lives on `default`.
+SHARDED_MODELS = frozenset(
+    (
+        "customer",
+        "loan",
+        "archivedloan",
+        "customerloanhistory",
+        "customerloansversion",
+        "outboxevent",
+        "customerscoresnapshot",
+        "idempotencykey",
+    )
+)
+
+
+def get_shards() -> list[str]:
+    """Database aliases holding customers, `default` first"""
+    return settings.SHARD_DATABASES
+
+
+def shard_for_id(object_id: int) -> str:
+    """Shard of a customer or loan id
+
+    Each shard's sequences hand out ids with `(id - 1) % shards == shard index`
+    (see `configure_shards`), so the id alone tells where its row lives. Ids up
+    to `SHARD_LEGACY_MAX_ID` predate sharding and stay on `default`.
+    """
+    shards = get_shards()
+    if len(shards) == 1 or object_id <= settings.SHARD_LEGACY_MAX_ID:
+        return DEFAULT_DB_ALIAS
+    return shards[(object_id - 1) % len(shards)]
+
+
+def shard_for_customer(customer_id: int) -> str:
+    return shard_for_id(customer_id)
+
+
+def shard_for_loan(loan_id: int) -> str:
+    """A loan is written to its customer's shard and takes its id from that shard's sequence"""
+    return shard_for_id(loan_id)
+
+
+def new_customer_shard() -> str:
+    """Shard a newly registered customer is created on"""
+    return random.choice(get_shards())
+
+
+def group_by_shard(object_ids) -> dict[str, list[int]]:
+    groups = {}
+    for object_id in object_ids:
+        groups.setdefault(shard_for_id(object_id), []).append(object_id)
+    return groups
+
+
+def run_on_shard(func, alias: str, *args):
+    try:
+        return func(alias, *args)
+    finally:
+        # Pool threads open their own connections, don't leave them behind.
+        connections.close_all()
+
+
+def for_each_shard(func, *args) -> dict[str, object]:
+    """Call `func(alias, *args)` for every shard in parallel and return the results by alias
+
+    With a single shard the call runs inline, on the caller's connection.
+    """
+    shards = get_shards()
+    if len(shards) == 1:
+        return {shards[0]: func(shards[0], *args)}
+    with ThreadPoolExecutor(len(shards)) as executor:
+        futures = {alias: executor.submit(run_on_shard, func, alias, *args) for alias in shards}
+        return {alias: future.result() for alias, future in futures.items()}
+
+
+class ShardRouter:
+    """Route customers and their loans to the shard of the customer
+
+    Instances are routed by their customer id, querysets without an instance
+    hint go to `default`, so code reaching a sharded table by id picks the
+    database with `.using(shard_for_customer(...))`.
+    """
+
+    def get_shard(self, model, instance) -> str | None:
+        if model._meta.model_name not in SHARDED_MODELS:
+            return DEFAULT_DB_ALIAS
+        if instance is None:
+            return None
+        if instance._state.db:
+            return instance._state.db
+        customer_id = instance.pk if model._meta.model_name == "customer" else instance.customer_id
+        return shard_for_customer(customer_id) if customer_id else None
+
+    def db_for_read(self, model, **hints):
+        return self.get_shard(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        return self.get_shard(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in get_shards():
+            return None
+        # Other shards only hold the customer tables (and run model-less data migrations).
+        return app_label == "core" and (model_name is None or model_name in SHARDED_MODELS)
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import (
+    ArchivedLoan,
+    Customer,
+    CustomerLoansVersion,
+    Loan,
+    OutboxEvent,
+    PricingBand,
+    PricingPolicy,
+)
+from core.outbox import customer_payload, loan_payload, record_event
+from core.pricing import invalidate_pricing_policies
+from core.utils import bump_customer_loans_version
+
+
+@receiver(pre_save, sender=Customer)
+@receiver(pre_save, sender=Loan)
+@receiver(pre_save, sender=ArchivedLoan)
+def set_minor_units(sender, instance, **kwargs):
+    # Dual write: the float columns stay the source of truth until every reader moved over.
+    instance.set_minor_units()
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance: Customer, created: bool, using: str, **kwargs):
+    if created:
+        CustomerLoansVersion.objects.using(using).create(customer=instance)
+        record_event(
+            using, OutboxEvent.CUSTOMER_REGISTERED, instance.pk, customer_payload(instance)
+        )
+
+
+@receiver(post_save, sender=Loan)
+def loan_saved(sender, instance: Loan, created: bool, using: str, **kwargs):
+    bump_customer_loans_version(instance.customer_id)
+    record_event(
+        using,
+        OutboxEvent.LOAN_CREATED if created else OutboxEvent.LOAN_UPDATED,
+        instance.customer_id,
+        loan_payload(instance),
+        loan_id=instance.pk,
+    )
+
+
+@receiver(post_delete, sender=Loan)
+def loan_deleted(sender, instance: Loan, **kwargs):
+    bump_customer_loans_version(instance.customer_id)
+
+
+@receiver([post_save, post_delete], sender=PricingPolicy)
+@receiver([post_save, post_delete], sender=PricingBand)
+def pricing_policy_changed(sender, **kwargs):
+    invalidate_pricing_policies()
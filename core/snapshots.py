@@ -0,0 +1,119 @@
+import datetime
+from django.db import connections, transaction
+
+from core.exposure import CREDIT_SCORE_SQL
+from core.models import (
+    MINOR_UNITS_PER_RUPEE,
+    ArchivedLoan,
+    Customer,
+    CustomerScoreSnapshot,
+    Loan,
+)
+
+# `get_loan_aggregates_as_of` and `calculate_credit_score` for every customer of a
+# shard at once: one scan of the loans approved by `as_of`, grouped by customer.
+# Customers without loans get zeroes. Existing snapshots of the date are kept.
+SNAPSHOT_SQL = """
+WITH loans AS (
+    SELECT
+        customer_id, loan_amount, tenure, emis_paid_on_time, date_of_approval, end_date,
+        COALESCE(monthly_payment_paise, round(monthly_payment * {per_rupee})::bigint)
+            AS monthly_payment_paise,
+        (%(as_of_year)s - EXTRACT(YEAR FROM date_of_approval)::int) * 12
+            + %(as_of_month)s - EXTRACT(MONTH FROM date_of_approval)::int AS months_due
+    FROM {loan_table}
+    WHERE date_of_approval <= %(as_of)s
+    UNION ALL
+    SELECT
+        customer_id, loan_amount, tenure, emis_paid_on_time, date_of_approval, end_date,
+        COALESCE(monthly_payment_paise, round(monthly_payment * {per_rupee})::bigint),
+        (%(as_of_year)s - EXTRACT(YEAR FROM date_of_approval)::int) * 12
+            + %(as_of_month)s - EXTRACT(MONTH FROM date_of_approval)::int
+    FROM {archived_loan_table}
+    WHERE date_of_approval <= %(as_of)s
+),
+repaid AS (
+    SELECT
+        *,
+        CASE
+            WHEN %(is_past)s AND %(as_of)s <= end_date
+                THEN LEAST(emis_paid_on_time, months_due)
+            ELSE emis_paid_on_time
+        END AS paid
+    FROM loans
+),
+aggregates AS (
+    SELECT
+        customer_id,
+        SUM(loan_amount) FILTER (WHERE end_date >= %(as_of)s AND tenure > paid)
+            AS total_amount,
+        COUNT(*) FILTER (WHERE end_date >= %(as_of)s AND tenure > paid) AS active_loan,
+        SUM(monthly_payment_paise) FILTER (WHERE end_date >= %(as_of)s AND tenure > paid)
+            AS total_monthly_payment_paise,
+        COUNT(*) AS total_loan,
+        COUNT(*) FILTER (WHERE date_of_approval >= %(last_year)s) AS last_year_loan,
+        SUM(paid) AS emi_paid,
+        SUM(
+            CASE
+                WHEN %(as_of)s > end_date OR paid = tenure THEN tenure
+                ELSE months_due
+            END
+        ) AS total_emi
+    FROM repaid
+    GROUP BY customer_id
+),
+totals AS (
+    SELECT
+        c.customer_id,
+        c.approved_limit,
+        COALESCE(c.monthly_salary_paise, round(c.monthly_salary * {per_rupee})::bigint)
+            AS monthly_salary_paise,
+        COALESCE(a.total_amount, 0) AS total_amount,
+        COALESCE(a.active_loan, 0) AS active_loan,
+        COALESCE(a.total_monthly_payment_paise, 0) AS total_monthly_payment_paise,
+        COALESCE(a.total_loan, 0) AS total_loan,
+        COALESCE(a.last_year_loan, 0) AS last_year_loan,
+        COALESCE(a.emi_paid, 0) AS emi_paid,
+        COALESCE(a.total_emi, 0) AS total_emi
+    FROM {customer_table} c
+    LEFT JOIN aggregates a ON a.customer_id = c.customer_id
+)
+INSERT INTO {snapshot_table} (
+    date, customer_id, credit_score, approved_limit, monthly_salary_paise, total_amount,
+    active_loan, total_monthly_payment_paise, total_loan, last_year_loan, emi_paid, total_emi
+)
+SELECT
+    %(as_of)s, customer_id, {credit_score}, approved_limit, monthly_salary_paise, total_amount,
+    active_loan, total_monthly_payment_paise, total_loan, last_year_loan, emi_paid, total_emi
+FROM totals
+ON CONFLICT (date, customer_id) DO NOTHING
+"""
+
+
+def snapshot_scores(alias: str, as_of: datetime.date, overwrite: bool = False) -> int:
+    """Write the `CustomerScoreSnapshot`s of `as_of` for every customer of a shard
+
+    Returns the number of snapshots written. Snapshots already taken that day
+    are kept unless `overwrite` is set.
+    """
+    sql = SNAPSHOT_SQL.format(
+        per_rupee=MINOR_UNITS_PER_RUPEE,
+        loan_table=Loan._meta.db_table,
+        archived_loan_table=ArchivedLoan._meta.db_table,
+        customer_table=Customer._meta.db_table,
+        snapshot_table=CustomerScoreSnapshot._meta.db_table,
+        credit_score=CREDIT_SCORE_SQL,
+    )
+    params = {
+        "as_of": as_of,
+        "as_of_year": as_of.year,
+        "as_of_month": as_of.month,
+        "last_year": as_of - datetime.timedelta(days=365),
+        "is_past": as_of < datetime.date.today(),
+    }
+    with transaction.atomic(using=alias):
+        if overwrite:
+            CustomerScoreSnapshot.objects.using(alias).filter(date=as_of).delete()
+        with connections[alias].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
@@ -0,0 +1,220 @@
+import copy
+import json
+import logging
+import time
+import unittest
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase
+from django.test.runner import (
+    DiscoverRunner,
+    ParallelTestSuite,
+    RemoteTestResult,
+    RemoteTestRunner,
+    get_max_test_processes,
+    parallel_type,
+)
+
+from core.models import Customer
+
+# Test database holding the synthetic book, see `TestRunner.seed`
+SEED_DATABASE = "seed"
+# Tag of test classes `TestRunner` keeps out of the parallel run
+SERIAL_TAG = "serial"
+
+
+def add_seed_database() -> None:
+    """Define the `seed` database next to `default`, for test runs only"""
+    default = settings.DATABASES[DEFAULT_DB_ALIAS]
+    settings.DATABASES[SEED_DATABASE] = {
+        **copy.deepcopy(default),
+        "NAME": f"{default['NAME']}_seed",
+    }
+    # Connections only read DATABASES once.
+    connections.settings = connections.configure_settings(settings.DATABASES)
+
+
+class SeededTestCase(TestCase):
+    """Test case that can read a synthetic book of `TEST_SEED_CUSTOMERS` customers
+
+    The book lives on the `seed` database (reach it with `.using(SEED_DATABASE)`
+    or by passing the alias), `default` starts empty as usual. Changes to
+    either are rolled back after every test.
+    """
+
+    databases = {"default", SEED_DATABASE}
+
+
+class TimedTestResult(unittest.TextTestResult):
+    """Text result that records how long each test took, setUp and tearDown included
+
+    Tests run in a worker process report their own time through `addTiming`
+    before their `stopTest` is replayed here.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.timings: dict[str, float] = {}
+        self.test_started = None
+
+    def startTest(self, test) -> None:
+        self.test_started = time.perf_counter()
+        super().startTest(test)
+
+    def addTiming(self, test, elapsed: float) -> None:
+        self.timings[test.id()] = elapsed
+
+    def stopTest(self, test) -> None:
+        super().stopTest(test)
+        self.timings.setdefault(test.id(), time.perf_counter() - self.test_started)
+
+
+class TimedRemoteTestResult(RemoteTestResult):
+    def startTest(self, test) -> None:
+        self.test_started = time.perf_counter()
+        super().startTest(test)
+
+    def stopTest(self, test) -> None:
+        self.events.append(("addTiming", self.test_index, time.perf_counter() - self.test_started))
+        super().stopTest(test)
+
+
+class TimedRemoteTestRunner(RemoteTestRunner):
+    resultclass = TimedRemoteTestResult
+
+
+class SeededParallelTestSuite(ParallelTestSuite):
+    def process_setup(*args) -> None:
+        # Spawned workers start from the settings module, without the `seed` alias.
+        add_seed_database()
+
+
+class TimedParallelTestSuite(SeededParallelTestSuite):
+    runner_class = TimedRemoteTestRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests in parallel, against test databases cloned from seeded templates
+
+    - Without `--parallel` the tests run in `TEST_PARALLEL` processes.
+    - The `seed` database is only defined for the run, next to `default`.
+    - Every test database is created and migrated once. The `seed` one, when a
+      test uses it, is then loaded with the synthetic book through COPY (see
+      `generate_synthetic_data`). Only then are the databases cloned for each
+      process, with PostgreSQL's `CREATE DATABASE ... TEMPLATE`.
+    - `--keepdb` keeps the seeded database, so later runs skip both steps.
+    - Test classes tagged "serial" run in this process once the parallel ones
+      are done, for tests that other processes' open transactions would disturb
+      and for those starting processes of their own.
+    - `--benchmark` reports how long every test took.
+    """
+
+    parallel_test_suite = SeededParallelTestSuite
+
+    def __init__(self, benchmark: int | None = None, benchmark_json: str | None = None, **kwargs):
+        if not kwargs.get("parallel") and not kwargs.get("pdb"):
+            parallel = parallel_type(settings.TEST_PARALLEL)
+            kwargs["parallel"] = get_max_test_processes() if parallel == "auto" else parallel
+        super().__init__(**kwargs)
+        self.benchmark = benchmark
+        self.benchmark_json = benchmark_json
+        if self.is_benchmarking:
+            self.parallel_test_suite = TimedParallelTestSuite
+
+    @classmethod
+    def add_arguments(cls, parser) -> None:
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--benchmark",
+            nargs="?",
+            const=20,
+            type=int,
+            metavar="N",
+            help="Time every test and list the N slowest (20 by default).",
+        )
+        parser.add_argument(
+            "--benchmark-json",
+            metavar="PATH",
+            help="Time every test and write the durations in seconds to this JSON file.",
+        )
+
+    @property
+    def is_benchmarking(self) -> bool:
+        return self.benchmark is not None or bool(self.benchmark_json)
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        if not isinstance(suite, ParallelTestSuite):
+            return suite
+        parallel, serial = [], []
+        for subsuite in suite.subsuites:
+            tags = getattr(type(next(iter(subsuite))), "tags", set())
+            (serial if SERIAL_TAG in tags else parallel).append(subsuite)
+        suite.subsuites = parallel
+        return unittest.TestSuite([suite, *serial] if parallel else serial)
+
+    def setup_test_environment(self, **kwargs) -> None:
+        add_seed_database()
+        super().setup_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        # Clone only once the templates are complete.
+        parallel, self.parallel = self.parallel, 0
+        try:
+            old_config = super().setup_databases(**kwargs)
+        finally:
+            self.parallel = parallel
+        if SEED_DATABASE in (kwargs.get("aliases") or ()):
+            self.seed(SEED_DATABASE)
+        if self.parallel > 1:
+            for connection, _, is_created in old_config:
+                if not is_created:
+                    continue
+                for index in range(self.parallel):
+                    with self.time_keeper.timed(f"  Cloning '{connection.alias}'"):
+                        connection.creation.clone_test_db(
+                            suffix=str(index + 1), verbosity=self.verbosity, keepdb=self.keepdb
+                        )
+        return old_config
+
+    def seed(self, alias: str) -> None:
+        """Load the synthetic book into a test database, unless kept from an earlier run"""
+        if Customer.objects.using(alias).exists():
+            self.log(f"Using the synthetic book kept in '{alias}'.", level=logging.DEBUG)
+            return
+        output = StringIO()
+        with self.time_keeper.timed(f"  Seeding '{alias}'"):
+            call_command(
+                "generate_synthetic_data",
+                customers=settings.TEST_SEED_CUSTOMERS,
+                database=alias,
+                stdout=output,
+            )
+        self.log(output.getvalue().strip(), level=logging.DEBUG)
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass()
+        if resultclass is None and self.is_benchmarking:
+            return TimedTestResult
+        return resultclass
+
+    def run_suite(self, suite, **kwargs):
+        result = super().run_suite(suite, **kwargs)
+        if self.is_benchmarking and hasattr(result, "timings"):
+            self.report_timings(result.timings)
+        return result
+
+    def report_timings(self, timings: dict[str, float]) -> None:
+        timings = dict(sorted(timings.items(), key=lambda item: item[1], reverse=True))
+        if self.benchmark:
+            self.log(
+                f"\nSlowest {min(self.benchmark, len(timings))} of {len(timings)} tests "
+                f"({sum(timings.values()):.2f}s in total):"
+            )
+            for test_id, elapsed in list(timings.items())[: self.benchmark]:
+                self.log(f"{elapsed:9.3f}s  {test_id}")
+        if self.benchmark_json:
+            with open(self.benchmark_json, "w") as file:
+                json.dump(timings, file, indent=2)
@@ -1,10 +1,122 @@
-from rest_framework.test import APIClient, APITestCase
+import contextlib
+import datetime
+import gzip
+import json
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from io import StringIO
+from unittest import mock
 
-from core.models import Customer, Loan
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    IntegrityError,
+    connection,
+    connections,
+    models,
+    transaction,
+)
+from django.test import TransactionTestCase, override_settings, tag
+from django.urls import get_resolver
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from core.admission import acquire_slot, queue_delay_ms, release_slot, take_token
+from core.backtest import OUTCOMES
+from core.compression import negotiate_encoding
+from core.exposure import create_loan_if_eligible
+from core.jobs import (
+    JOB_TYPES,
+    JobType,
+    claim_job,
+    enqueue_daily_jobs,
+    enqueue_job,
+    heartbeat_jobs,
+    requeue_expired_jobs,
+    run_job,
+)
+from core.log import (
+    JsonFormatter,
+    QueueStreamHandler,
+    RequestContextFilter,
+    SamplingFilter,
+    request_id_var,
+)
+from core.management.commands.load_data_from_excel import CONFIG
+from core.middleware import AdmissionControlMiddleware
+from core.models import (
+    ArchivedLoan,
+    Customer,
+    CustomerLoanHistory,
+    CustomerLoansVersion,
+    CustomerScoreSnapshot,
+    IdempotencyKey,
+    Job,
+    Loan,
+    OutboxEvent,
+    PricingBand,
+    PricingPolicy,
+    ProfileCapture,
+    to_minor_units,
+)
+from core.outbox import close_listeners, loan_payload
+from core.pricing import CompiledPricingPolicy, invalidate_pricing_policies
+from core.renderers import FastJSONRenderer
+from core.sharding import (
+    ShardRouter,
+    for_each_shard,
+    group_by_shard,
+    shard_for_customer,
+    shard_for_loan,
+)
+from core.serializers import CustomerLoanSerializer
+from core.snapshots import snapshot_scores
+from core.testing import (
+    SEED_DATABASE,
+    SERIAL_TAG,
+    SeededTestCase,
+    TestRunner,
+    TimedRemoteTestResult,
+)
+from core.utils import calculate_credit_score, calculate_emi, determine_loan_eligibility
 from core.loan_test_data import LOAN_TEST_DATA
 from core.constants import LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE
 
 
+def create_customer(loans=(), using: str = DEFAULT_DB_ALIAS, **fields) -> Customer:
+    """Create the customer the loan tests share, with `loans` shaped like `LOAN_TEST_DATA`
+
+    `fields` override the customer's defaults. The loans are bulk created, so
+    without the signals `Loan.objects.create` sends.
+    """
+    customer = Customer.objects.using(using).create(
+        **{
+            "first_name": "John",
+            "last_name": "Doe",
+            "age": 25,
+            "phone_number": "1234567890",
+            "monthly_salary": 253000.0,
+            "approved_limit": 3900000.0,
+            **fields,
+        }
+    )
+    Loan.objects.using(using).bulk_create(Loan(customer=customer, **loan) for loan in loans)
+    return customer
+
+
 # Create your tests here.
 class TestCustomer(APITestCase):
     def setUp(self) -> None:
@@ -27,6 +139,7 @@ class TestCustomer(APITestCase):
 class TestLoan(APITestCase):
     def setUp(self) -> None:
         self.client = APIClient()
+        cache.clear()
         test_suit = [
             "test_loan_eligibility_return_updated_interest_rate",
             "test_loan_eligibility_rejected_exceed_50_salary",
@@ -63,6 +176,25 @@ class TestLoan(APITestCase):
         self.assertEqual(response.data["corrected_interest_rate"], 8.0)
         self.assertTrue(response.data["approval"])
 
+    def test_credit_score_breakdown(self):
+        response = self.client.get(f"/credit-score/{self.customer.customer_id}")
+        self.assertEqual(response.status_code, 200)
+        customer = Customer.objects.select_related("loan_history").get(pk=self.customer.pk)
+        credit_score, loans = calculate_credit_score(customer)
+        self.assertEqual(response.data["credit_score"], credit_score)
+        self.assertEqual(response.data["loans"], loans)
+        components = response.data["components"]
+        self.assertFalse(components["limit_exceeded"])
+        self.assertEqual(
+            round(components["loan_history"] + components["recent_loans"]), credit_score
+        )
+
+        response = self.client.get(
+            f"/credit-score/{self.customer.customer_id}", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/credit-score/0").status_code, 404)
+
     def test_loan_eligibility_rejected_exceed_50_salary(self):
         data = {
             "customer_id": self.customer.customer_id,
@@ -111,6 +243,34 @@ class TestLoan(APITestCase):
         self.assertEqual(loan.tenure, 10)
         loan.delete()
 
+    def test_create_loan_idempotency_key_replays_response(self):
+        data = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 10000,
+            "interest_rate": 16,
+            "tenure": 10,
+        }
+        loans_before = Loan.objects.count()
+        first = self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="retry-1")
+        second = self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="retry-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Loan.objects.count(), loans_before + 1)
+
+    def test_create_loan_idempotency_key_reused_with_different_body(self):
+        data = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 10000,
+            "interest_rate": 16,
+            "tenure": 10,
+        }
+        self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="retry-2")
+        data["loan_amount"] = 20000
+        response = self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="retry-2")
+        self.assertEqual(response.status_code, 422)
+
     def test_create_loan_unsuccessful(self):
         data = {
             "customer_id": self.customer.customer_id,
@@ -145,3 +305,1305 @@ class TestLoan(APITestCase):
         self.assertEqual(
             len(response.data), Loan.objects.filter(customer=self.customer).count()
         )
+
+    def test_retrieve_customer_loans_not_modified(self):
+        url = f"/view-loans/{self.customer.customer_id}"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(
+            "/create-loan",
+            {
+                "customer_id": self.customer.customer_id,
+                "loan_amount": 10000,
+                "interest_rate": 16,
+                "tenure": 10,
+            },
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data), len(LOAN_TEST_DATA) + 1)
+
+    def test_retrieve_single_loan_served_from_cache(self):
+        loan = Loan.objects.first()
+        first = self.client.get(f"/view-loan/{loan.pk}/")
+        with self.assertNumQueries(1):
+            second = self.client.get(f"/view-loan/{loan.pk}/")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+
+@override_settings(QUERY_BUDGET_ENFORCED=True)
+class TestQueryBudget(APITestCase):
+    """Every view runs within its `query_budget`, however many loans the customer has."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        cache.clear()
+        self.customer = create_customer(
+            LOAN_TEST_DATA * 5, monthly_salary=2530000.0, approved_limit=39000000.0
+        )
+
+        self.loan_request = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 10000,
+            "interest_rate": 16,
+            "tenure": 10,
+        }
+
+    def test_every_core_view_declares_a_budget(self):
+        for pattern in get_resolver().url_patterns[1].url_patterns:
+            callback = pattern.callback
+            view_class = getattr(callback, "cls", None) or callback.view_class
+            if view_class.__module__ != "core.views":
+                continue
+            actions = getattr(callback, "actions", None) or {
+                method: method
+                for method in view_class.http_method_names
+                if method not in ("options", "head") and hasattr(view_class, method)
+            }
+            for action in actions.values():
+                self.assertTrue(
+                    hasattr(getattr(view_class, action), "query_budget"),
+                    f"{view_class.__name__}.{action} has no query budget",
+                )
+
+    def test_customer_register_budget(self):
+        response = self.client.post(
+            "/register/",
+            {
+                "first_name": "Jane",
+                "last_name": "Doe",
+                "age": 30,
+                "phone_number": "1234567890",
+                "monthly_salary": 50000,
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_check_eligibility_budget(self):
+        response = self.client.post("/check-eligibility", self.loan_request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_loan_budget(self):
+        response = self.client.post("/create-loan", self.loan_request)
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_loan_with_idempotency_key_budget(self):
+        response = self.client.post(
+            "/create-loan", self.loan_request, HTTP_IDEMPOTENCY_KEY="budget"
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_retrieve_single_loan_budget(self):
+        loan = Loan.objects.first()
+        response = self.client.get(f"/view-loan/{loan.pk}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_job_endpoints_budget(self):
+        response = self.client.post(
+            "/jobs/", {"job_type": "rescore_portfolio"}, format="json"
+        )
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(f"/jobs/{response.data['id']}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_customer_loans_budget(self):
+        response = self.client.get(f"/view-loans/{self.customer.customer_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(LOAN_TEST_DATA) * 5)
+
+    def test_credit_score_breakdown_budget(self):
+        response = self.client.get(f"/credit-score/{self.customer.customer_id}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_event_feed_budget(self):
+        response = self.client.get("/events", {"after": 1})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestPricingPolicy(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        invalidate_pricing_policies()
+        self.customer = create_customer()
+
+    def tearDown(self) -> None:
+        invalidate_pricing_policies()
+
+    def test_score_banding(self):
+        policy = CompiledPricingPolicy("test", 0.5, [(30, 12), (50, None), (10, 16)])
+        self.assertEqual(policy.price(100), (True, None))
+        self.assertEqual(policy.price(51), (True, None))
+        self.assertEqual(policy.price(50), (True, 12))
+        self.assertEqual(policy.price(11), (True, 16))
+        self.assertEqual(policy.price(10), (False, None))
+        self.assertEqual(policy.price(0), (False, None))
+
+    def test_loan_eligibility_uses_product_policy(self):
+        policy = PricingPolicy.objects.create(product="premium", max_dti_ratio=0.5)
+        PricingBand.objects.create(policy=policy, min_score=-1, rate_floor=20)
+        data = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 100000,
+            "interest_rate": 8,
+            "tenure": 10,
+            "product": "premium",
+        }
+        response = self.client.post("/check-eligibility", data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["approval"])
+        self.assertEqual(response.data["corrected_interest_rate"], 20.0)
+
+    def test_loan_eligibility_unknown_product(self):
+        data = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 100000,
+            "interest_rate": 8,
+            "tenure": 10,
+            "product": "missing",
+        }
+        response = self.client.post("/check-eligibility", data)
+        self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Single statement path needs PostgreSQL")
+class TestSingleStatementLoanCreation(APITestCase):
+    """`create_loan_if_eligible` decides exactly like `determine_loan_eligibility`."""
+
+    def assert_parity(self, customer: Customer, policy, loan_amount, interest_rate, tenure):
+        customer = Customer.objects.select_related("loan_history").get(pk=customer.pk)
+        expected = determine_loan_eligibility(
+            loan_amount, interest_rate, tenure, customer, policy
+        )
+        loans_before = Loan.objects.filter(customer=customer).count()
+        today = datetime.date.today()
+        *decision, loan = create_loan_if_eligible(
+            customer.customer_id, loan_amount, interest_rate, tenure, policy, today, today
+        )
+        self.assertEqual(tuple(decision), expected)
+        self.outcomes.add(expected[:2] + (expected[3],))
+        approved = expected[0] and not expected[1]
+        self.assertEqual(loan is not None, approved)
+        self.assertEqual(
+            Loan.objects.filter(customer=customer).count(), loans_before + approved
+        )
+
+    def test_parity(self):
+        today = datetime.date.today()
+        recent = [
+            {
+                "loan_amount": 50000,
+                "tenure": 12,
+                "interest_rate": 10,
+                "monthly_payment": 4400.0,
+                "emis_paid_on_time": emis,
+                "date_of_approval": today - datetime.timedelta(days=days),
+                "end_date": today + datetime.timedelta(days=365 - days),
+            }
+            for emis, days in ((1, 40), (3, 100), (0, 10))
+        ]
+        customers = [
+            create_customer(LOAN_TEST_DATA),
+            create_customer(
+                LOAN_TEST_DATA[:3] + recent, monthly_salary=60000.0, approved_limit=2200000.0
+            ),
+            create_customer(recent, monthly_salary=30000.0, approved_limit=100000.0),
+            create_customer(monthly_salary=45000.0, approved_limit=1600000.0),
+        ]
+        CustomerLoanHistory.objects.create(
+            customer=customers[1], total_loan=4, emi_paid=30, total_emi=90
+        )
+        policies = [
+            CompiledPricingPolicy("default", 0.5, [(50, None), (30, 12), (10, 16)]),
+            CompiledPricingPolicy("strict", 0.3, [(70, 14), (40, 18.5)]),
+            CompiledPricingPolicy("floors", 0.9, [(-1, 15.5)]),
+            CompiledPricingPolicy("empty", 0.5, []),
+        ]
+        self.outcomes = set()
+        for customer in customers:
+            for policy in policies:
+                for loan_amount, interest_rate, tenure in (
+                    (10000, 8, 12),
+                    (10000, 12, 12),
+                    (10000, 17, 24),
+                    (500000, 10, 6),
+                    (2000000, 14, 120),
+                ):
+                    with self.subTest(
+                        customer=customer.pk,
+                        policy=policy.product,
+                        amount=loan_amount,
+                        rate=interest_rate,
+                    ):
+                        self.assert_parity(customer, policy, loan_amount, interest_rate, tenure)
+        # Approved, rate corrected, rejected on DTI and rejected on score were all covered.
+        self.assertEqual(len(self.outcomes), 4)
+
+    @override_settings(MONEY_MINOR_UNITS_READS=True)
+    def test_parity_reading_minor_units(self):
+        self.test_parity()
+
+    def test_bumps_loans_version(self):
+        customer = create_customer()
+        today = datetime.date.today()
+        policy = CompiledPricingPolicy("default", 0.5, [(-1, None)])
+        *_, loan = create_loan_if_eligible(customer.pk, 10000, 10, 12, policy, today, today)
+        self.assertEqual(Loan.objects.get(pk=loan.pk).customer_id, customer.pk)
+        self.assertEqual(CustomerLoansVersion.objects.get(pk=customer.pk).version, 1)
+
+    def test_unknown_customer(self):
+        today = datetime.date.today()
+        with self.assertRaises(Customer.DoesNotExist):
+            create_loan_if_eligible(0, 10000, 10, 12, CompiledPricingPolicy("x", 0.5, []), today)
+
+    def test_view_parity(self):
+        customer = create_customer(
+            LOAN_TEST_DATA[:3], monthly_salary=60000.0, approved_limit=2200000.0
+        )
+        for interest_rate in (8, 20):
+            data = {
+                "customer_id": customer.pk,
+                "loan_amount": 10000,
+                "interest_rate": interest_rate,
+                "tenure": 12,
+            }
+            with override_settings(LOAN_CREATE_SINGLE_STATEMENT=False):
+                expected = self.client.post("/create-loan", data)
+            response = self.client.post("/create-loan", data)
+            self.assertEqual(response.status_code, expected.status_code)
+            expected.data.pop("loan_id")
+            response.data.pop("loan_id")
+            self.assertEqual(response.data, expected.data)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Partitioning needs PostgreSQL")
+class TestPartitionLoans(APITestCase):
+    def setUp(self) -> None:
+        self.customer = create_customer(LOAN_TEST_DATA)
+
+
+    def test_migrate_existing_table(self):
+        loan_ids = set(Loan.objects.values_list("loan_id", flat=True))
+        call_command("partition_loans", "--migrate", "--drop-old", stdout=StringIO())
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'core_loan'")
+            self.assertEqual(cursor.fetchone()[0], "p")
+        self.assertEqual(set(Loan.objects.values_list("loan_id", flat=True)), loan_ids)
+
+        loan = Loan.objects.create(
+            customer=self.customer,
+            loan_amount=1000,
+            tenure=6,
+            interest_rate=12,
+            monthly_payment=172,
+            date_of_approval=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=180),
+        )
+        self.assertGreater(loan.loan_id, max(loan_ids))
+
+        # loan_id stays unique although the primary key now includes date_of_approval.
+        duplicate = Loan(
+            loan_id=loan.loan_id,
+            customer=self.customer,
+            loan_amount=1000,
+            tenure=6,
+            interest_rate=12,
+            monthly_payment=172,
+            date_of_approval=datetime.date(2015, 1, 1),
+            end_date=datetime.date(2015, 7, 1),
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Loan.objects.bulk_create([duplicate])
+
+    def test_requires_migrate_flag(self):
+        with self.assertRaises(CommandError):
+            call_command("partition_loans", stdout=StringIO())
+
+
+class TestArchiveLoans(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        cache.clear()
+        self.customer = create_customer()
+        for loan in LOAN_TEST_DATA:
+            Loan.objects.create(customer=self.customer, **loan)
+
+    def get_customer(self) -> Customer:
+        return Customer.objects.select_related("loan_history").get(
+            pk=self.customer.pk
+        )
+
+    def test_archive_keeps_score_and_listing(self):
+        score_before = calculate_credit_score(self.get_customer())
+        listing_before = self.client.get(f"/view-loans/{self.customer.customer_id}")
+        archivable = Loan.objects.archivable().count()
+        self.assertGreater(archivable, 0)
+
+        call_command("archive_loans", "--chunk-size", "2", stdout=StringIO())
+
+        self.assertEqual(ArchivedLoan.objects.count(), archivable)
+        self.assertEqual(Loan.objects.archivable().count(), 0)
+        self.assertEqual(calculate_credit_score(self.get_customer()), score_before)
+        listing_after = self.client.get(f"/view-loans/{self.customer.customer_id}")
+        self.assertCountEqual(listing_after.data, listing_before.data)
+
+    def test_retrieve_archived_loan(self):
+        call_command("archive_loans", stdout=StringIO())
+        archived_loan = ArchivedLoan.objects.first()
+        response = self.client.get(f"/view-loan/{archived_loan.loan_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["customer"]["customer_id"], self.customer.customer_id
+        )
+        self.assertEqual(response.data["tenure"], archived_loan.tenure)
+
+
+class TestScoreSnapshots(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        cache.clear()
+        self.customer = create_customer()
+        for loan in LOAN_TEST_DATA:
+            Loan.objects.create(customer=self.customer, **loan)
+        Customer.objects.create(
+            first_name="Jane",
+            last_name="Doe",
+            age=30,
+            phone_number="1234567891",
+            monthly_salary=1000.0,
+            approved_limit=36000,
+        )
+        call_command("archive_loans", stdout=StringIO())
+        self.past = datetime.date(2016, 1, 1)
+
+    def get_customers(self) -> list[Customer]:
+        return list(Customer.objects.select_related("loan_history").order_by("pk"))
+
+    def test_as_of_today_matches_current_figures(self):
+        self.assertGreater(ArchivedLoan.objects.count(), 0)
+        for customer in self.get_customers():
+            credit_score, loans = calculate_credit_score(customer)
+            credit_score_as_of, loans_as_of = calculate_credit_score(
+                customer, datetime.date.today()
+            )
+            self.assertEqual(credit_score_as_of, credit_score)
+            self.assertAlmostEqual(
+                loans_as_of.pop("total_monthly_payment"), loans.pop("total_monthly_payment")
+            )
+            self.assertEqual(loans_as_of, loans)
+
+    def test_past_date(self):
+        _, loans = calculate_credit_score(self.get_customers()[0], self.past)
+        # Three loans approved by then, all still being repaid, EMIs paid capped at EMIs due.
+        self.assertEqual(loans["total_loan"], 3)
+        self.assertEqual(loans["active_loan"], 3)
+        self.assertEqual(loans["last_year_loan"], 1)
+        self.assertEqual(loans["emi_paid"], 69 + 29 + 11)
+        self.assertEqual(loans["total_emi"], 69 + 29 + 11)
+
+        response = self.client.get(
+            f"/credit-score/{self.customer.customer_id}", {"as_of": self.past.isoformat()}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["as_of"], self.past.isoformat())
+        self.assertEqual(response.data["loans"]["total_loan"], 3)
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        response = self.client.get(
+            f"/credit-score/{self.customer.customer_id}", {"as_of": tomorrow.isoformat()}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_snapshots_match_scores(self):
+        for as_of in (self.past, datetime.date.today()):
+            call_command("snapshot_scores", "--date", as_of.isoformat(), stdout=StringIO())
+            for customer in self.get_customers():
+                credit_score, loans = calculate_credit_score(customer, as_of)
+                snapshot = CustomerScoreSnapshot.objects.get(
+                    date=as_of, customer_id=customer.customer_id
+                )
+                self.assertEqual(snapshot.credit_score, credit_score)
+                self.assertEqual(snapshot.monthly_salary_paise, customer.monthly_salary_paise)
+                self.assertEqual(
+                    snapshot.total_monthly_payment_paise,
+                    to_minor_units(loans.pop("total_monthly_payment")),
+                )
+                for key, value in loans.items():
+                    self.assertEqual(getattr(snapshot, key), value, key)
+        # Re-running a day keeps its snapshots.
+        call_command("snapshot_scores", stdout=StringIO())
+        self.assertEqual(CustomerScoreSnapshot.objects.count(), 4)
+
+    def test_backtest_matches_eligibility(self):
+        call_command(
+            "snapshot_scores",
+            "--since",
+            "2015-12-30",
+            "--date",
+            "2016-01-02",
+            stdout=StringIO(),
+        )
+        self.assertEqual(CustomerScoreSnapshot.objects.count(), 8)
+        job = enqueue_job(
+            "backtest_policy",
+            {
+                "loan_amount": 100000,
+                "interest_rate": 8,
+                "tenure": 12,
+                "since": "2015-12-30",
+                "until": "2016-01-02",
+            },
+        )
+        months = run_job(job).result["months"]
+        self.assertEqual([month["month"] for month in months], ["2015-12", "2016-01"])
+
+        expected = {}
+        for customer in self.get_customers():
+            is_eligible, is_rate_updated, _, message = determine_loan_eligibility(
+                100000, 8, 12, customer, as_of=self.past
+            )
+            if message == LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE:
+                outcome = "dti_exceeded"
+            elif not is_eligible:
+                outcome = "rejected"
+            else:
+                outcome = "rate_updated" if is_rate_updated else "approved"
+            expected[outcome] = expected.get(outcome, 0) + 2
+        self.assertEqual(months[1]["snapshots"], 4)
+        self.assertEqual(
+            {outcome: months[1][outcome] for outcome in OUTCOMES if months[1][outcome]},
+            expected,
+        )
+
+
+class TestMinorUnits(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.customer = create_customer(LOAN_TEST_DATA, monthly_salary=253000.55)
+
+
+    def assert_minor_units(self) -> None:
+        for customer in Customer.objects.all():
+            self.assertEqual(customer.monthly_salary_paise, round(customer.monthly_salary * 100))
+        for loan in Loan.objects.all():
+            # Exact installments of created loans differ from the truncated float by under a rupee.
+            self.assertLess(abs(loan.monthly_payment_paise - loan.monthly_payment * 100), 100)
+            self.assertEqual(loan.interest_rate_bps, round(loan.interest_rate * 100))
+
+    def test_dual_write(self):
+        self.assertEqual(self.customer.monthly_salary_paise, 25300055)
+        response = self.client.post(
+            "/create-loan",
+            {
+                "customer_id": self.customer.customer_id,
+                "loan_amount": 10000,
+                "interest_rate": 16.25,
+                "tenure": 10,
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Loan.objects.get(pk=response.data["loan_id"]).interest_rate_bps, 1625)
+        self.assert_minor_units()
+
+    def test_exact_installment(self):
+        data = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 10000,
+            "interest_rate": 16.25,
+            "tenure": 10,
+        }
+        # 1075.98 rupees, truncated to 1075 in the float column.
+        installment = to_minor_units(calculate_emi(10000, 10, 16.25))
+        self.assertEqual(installment, 107598)
+        created = []
+        for single_statement in (False, True):
+            with override_settings(LOAN_CREATE_SINGLE_STATEMENT=single_statement):
+                response = self.client.post("/create-loan", data)
+            self.assertEqual(response.status_code, 201)
+            created.append(Loan.objects.get(pk=response.data["loan_id"]))
+        for loan in created:
+            self.assertEqual(loan.monthly_payment, 1075)
+            self.assertEqual(loan.monthly_payment_paise, installment)
+        # Saving the loan again keeps the exact amount, changing the installment does not.
+        created[0].emis_paid_on_time = 1
+        created[0].save()
+        self.assertEqual(Loan.objects.get(pk=created[0].pk).monthly_payment_paise, installment)
+        created[0].monthly_payment = 900
+        created[0].save()
+        self.assertEqual(Loan.objects.get(pk=created[0].pk).monthly_payment_paise, 90000)
+
+    def test_backfill(self):
+        Customer.objects.update(monthly_salary_paise=None)
+        Loan.objects.update(monthly_payment_paise=None, interest_rate_bps=None)
+        call_command("backfill_minor_units", "--chunk-size", "2", stdout=StringIO())
+        self.assertFalse(Loan.objects.filter(monthly_payment_paise__isnull=True).exists())
+        self.assert_minor_units()
+
+    def test_reads_match_float_columns(self):
+        customer = Customer.objects.select_related("loan_history").get(pk=self.customer.pk)
+        expected = calculate_credit_score(customer)
+        # Rows not backfilled yet are converted on the fly.
+        Loan.objects.filter(pk=Loan.objects.first().pk).update(monthly_payment_paise=None)
+        with override_settings(MONEY_MINOR_UNITS_READS=True):
+            self.assertEqual(calculate_credit_score(customer), expected)
+
+
+@override_settings(SHARD_DATABASES=["default", "shard_1", "shard_2"], SHARD_LEGACY_MAX_ID=10)
+class TestSharding(APITestCase):
+    def test_shard_for_id(self):
+        self.assertEqual(shard_for_customer(7), "default")
+        self.assertEqual(shard_for_customer(11), "shard_1")
+        self.assertEqual(shard_for_customer(12), "shard_2")
+        self.assertEqual(shard_for_loan(13), "default")
+        self.assertEqual(
+            group_by_shard([3, 11, 12, 14]),
+            {"default": [3], "shard_1": [11, 14], "shard_2": [12]},
+        )
+        with override_settings(SHARD_DATABASES=["default"]):
+            self.assertEqual(shard_for_customer(12), "default")
+
+    def test_router(self):
+        router = ShardRouter()
+        self.assertEqual(router.db_for_read(Job, instance=Job()), "default")
+        self.assertEqual(router.db_for_write(Loan, instance=Loan(customer_id=12)), "shard_2")
+        self.assertEqual(
+            router.db_for_write(Customer, instance=Customer(customer_id=11)), "shard_1"
+        )
+        # Rows already loaded stay on the database they came from.
+        customer = Customer(customer_id=11)
+        customer._state.db = "default"
+        self.assertEqual(router.db_for_write(Customer, instance=customer), "default")
+        self.assertIsNone(router.db_for_read(Loan))
+
+        self.assertIsNone(router.allow_migrate("default", "auth", "user"))
+        self.assertTrue(router.allow_migrate("shard_1", "core", "loan"))
+        self.assertTrue(router.allow_migrate("shard_1", "core"))
+        self.assertTrue(router.allow_migrate("shard_1", "core", "idempotencykey"))
+        self.assertFalse(router.allow_migrate("shard_1", "core", "job"))
+        self.assertFalse(router.allow_migrate("shard_1", "auth", "user"))
+
+    @override_settings(SHARD_DATABASES=["default"], SHARD_LEGACY_MAX_ID=0)
+    def test_single_shard(self):
+        customer = create_customer()
+        self.assertEqual(
+            for_each_shard(lambda alias: Customer.objects.using(alias).count()), {"default": 1}
+        )
+        if connection.vendor == "postgresql":
+            call_command("configure_shards", stdout=StringIO())
+            response = self.client.post(
+                "/register/",
+                {
+                    "first_name": "Jane",
+                    "last_name": "Doe",
+                    "age": 30,
+                    "phone_number": "1234567891",
+                    "monthly_salary": 100000,
+                },
+            )
+            self.assertEqual(response.data["customer_id"], customer.customer_id + 1)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Sharded ids need PostgreSQL")
+@override_settings(
+    SHARD_DATABASES=["default", SEED_DATABASE],
+    SHARD_LEGACY_MAX_ID=0,
+    DATABASE_ROUTERS=["core.sharding.ShardRouter"],
+)
+class TestPrepareServer(SeededTestCase):
+    def test_fresh_sharded_deploy(self):
+        import pandas as pd
+
+        # The seed database stands in for a second, empty shard.
+        with connections[SEED_DATABASE].cursor() as cursor:
+            cursor.execute(f'TRUNCATE "{Customer._meta.db_table}" CASCADE')
+        call_command("prepare_server", "--skip-collectstatic", verbosity=0, stdout=StringIO())
+
+        loaded_loans = Counter()
+        for alias in (DEFAULT_DB_ALIAS, SEED_DATABASE):
+            customers = Customer.objects.using(alias).in_bulk()
+            self.assertTrue(customers)
+            self.assertEqual({shard_for_customer(pk) for pk in customers}, {alias})
+            for loan in Loan.objects.using(alias):
+                self.assertEqual(shard_for_loan(loan.pk), alias)
+                customer = customers[loan.customer_id]
+                loaded_loans[customer.first_name, customer.phone_number] += 1
+        # Every loan of the files belongs to the same customer once loaded.
+        customer_file, loan_file = (pd.read_excel(config["file_path"]) for config in CONFIG)
+        customer_file = customer_file.set_index("Customer ID")
+        expected_loans = Counter(
+            (
+                customer_file.at[customer_id, "First Name"],
+                str(customer_file.at[customer_id, "Phone Number"]),
+            )
+            for customer_id in loan_file["Customer ID"]
+        )
+        self.assertEqual(loaded_loans, expected_loans)
+
+
+@override_settings(
+    SHARD_DATABASES=["default", SEED_DATABASE],
+    SHARD_LEGACY_MAX_ID=0,
+    DATABASE_ROUTERS=["core.sharding.ShardRouter"],
+)
+class TestShardedIdempotency(SeededTestCase):
+    def test_key_commits_with_the_loan(self):
+        # An even id lives on the second shard.
+        customer = create_customer(LOAN_TEST_DATA, SEED_DATABASE, customer_id=10**6)
+        loans = Loan.objects.using(SEED_DATABASE).filter(customer=customer)
+
+        data = {
+            "customer_id": customer.customer_id,
+            "loan_amount": 10000,
+            "interest_rate": 16,
+            "tenure": 10,
+        }
+        with mock.patch.object(IdempotencyKey, "save", side_effect=DatabaseError("lost")):
+            response = self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="sharded")
+        self.assertEqual(response.status_code, 500)
+        # Storing the response failed, so the loan went with it and a retry is safe.
+        self.assertEqual(loans.count(), len(LOAN_TEST_DATA))
+
+        first = self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="sharded")
+        second = self.client.post("/create-loan", data, HTTP_IDEMPOTENCY_KEY="sharded")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(loans.count(), len(LOAN_TEST_DATA) + 1)
+        self.assertTrue(IdempotencyKey.objects.using(SEED_DATABASE).filter(key="sharded").exists())
+        self.assertFalse(IdempotencyKey.objects.filter(key="sharded").exists())
+
+
+@tag(SERIAL_TAG)
+class TestEventFeed(TransactionTestCase):
+    """Uses real commits: events only reach the feed once their transaction has committed
+
+    Runs alone, as the feed also waits for transactions of other test processes.
+    """
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.customer_id = self.client.post(
+            "/register/",
+            {
+                "first_name": "Jane",
+                "last_name": "Doe",
+                "age": 30,
+                "phone_number": "1234567890",
+                "monthly_salary": 500000,
+            },
+        ).data["customer_id"]
+        # A customer without loans scores 0, which this policy still approves.
+        policy = PricingPolicy.objects.create(product="starter", max_dti_ratio=0.5)
+        PricingBand.objects.create(policy=policy, min_score=-1, rate_floor=10)
+        self.loan_request = {
+            "customer_id": self.customer_id,
+            "loan_amount": 10000,
+            "interest_rate": 16,
+            "tenure": 10,
+            "product": "starter",
+        }
+
+    def tearDown(self) -> None:
+        close_listeners()
+
+    def get_events(self, **params) -> dict:
+        response = self.client.get("/events", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_feed(self):
+        single_statement_id = self.client.post("/create-loan", self.loan_request).data["loan_id"]
+        with override_settings(LOAN_CREATE_SINGLE_STATEMENT=False):
+            loan_id = self.client.post("/create-loan", self.loan_request).data["loan_id"]
+        loan = Loan.objects.get(pk=loan_id)
+        loan.emis_paid_on_time = 1
+        loan.save()
+
+        page = self.get_events(limit=2)
+        self.assertEqual(
+            [event["event_type"] for event in page["events"]],
+            [OutboxEvent.CUSTOMER_REGISTERED, OutboxEvent.LOAN_CREATED],
+        )
+        rest = self.get_events(after=page["next"])["events"]
+        self.assertEqual(
+            [(event["event_type"], event["loan_id"]) for event in rest],
+            [(OutboxEvent.LOAN_CREATED, loan_id), (OutboxEvent.LOAN_UPDATED, loan_id)],
+        )
+        self.assertEqual(rest[1]["payload"]["emis_paid_on_time"], 1)
+        # The single-statement path writes the same payload as the signal.
+        self.assertEqual(
+            page["events"][1]["payload"],
+            json.loads(
+                json.dumps(
+                    loan_payload(Loan.objects.get(pk=single_statement_id)), cls=DjangoJSONEncoder
+                )
+            ),
+        )
+        self.assertEqual(
+            self.get_events(after=rest[-1]["id"]), {"events": [], "next": rest[-1]["id"]}
+        )
+
+    def test_rolled_back_changes_have_no_events(self):
+        after = self.get_events()["next"]
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Loan.objects.create(
+                customer_id=self.customer_id,
+                loan_amount=1000,
+                date_of_approval=datetime.date.today(),
+                end_date=datetime.date.today(),
+            )
+            raise RuntimeError
+        self.assertEqual(self.get_events(after=after)["events"], [])
+
+    def test_long_poll_wakes_up_on_commit(self):
+        after = self.get_events()["next"]
+
+        def create_loan():
+            time.sleep(0.3)
+            self.client.post("/create-loan", self.loan_request)
+            connection.close()
+
+        thread = threading.Thread(target=create_loan)
+        thread.start()
+        start = time.monotonic()
+        events = self.get_events(after=after, wait=10)["events"]
+        thread.join()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([event["event_type"] for event in events], [OutboxEvent.LOAN_CREATED])
+
+    def test_long_poll_listens_once_per_thread(self):
+        self.client.post("/create-loan", self.loan_request)
+        database = connections[DEFAULT_DB_ALIAS]
+        with mock.patch.object(
+            database, "get_new_connection", wraps=database.get_new_connection
+        ) as connect:
+            # Events already there are served without listening.
+            page = self.get_events(wait=10)
+            self.assertTrue(page["events"])
+            connect.assert_not_called()
+            for _ in range(2):
+                self.assertEqual(self.get_events(after=page["next"], wait=0.1)["events"], [])
+        connect.assert_called_once()
+
+    def test_unknown_shard(self):
+        response = self.client.get("/events", {"shard": "shard_9"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestAdmissionControl(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    @override_settings(ADMISSION_RATE=2, ADMISSION_BURST=2)
+    def test_token_bucket(self):
+        self.assertEqual(take_token("client", now=100), 0)
+        self.assertEqual(take_token("client", now=100), 0)
+        self.assertEqual(take_token("client", now=100), 0.5)
+        self.assertEqual(take_token("other", now=100), 0)
+        self.assertEqual(take_token("client", now=100.5), 0)
+
+    def test_queue_delay(self):
+        now = 1_700_000_000.5
+        for header in ("t=1700000000.25", "1700000000250", "t=1700000000250000"):
+            request = APIRequestFactory().get("/", HTTP_X_REQUEST_START=header)
+            self.assertAlmostEqual(queue_delay_ms(request, now=now), 250, places=3)
+        request = APIRequestFactory().get("/", HTTP_X_REQUEST_START="t=soon")
+        self.assertIsNone(queue_delay_ms(request, now=now))
+
+    @override_settings(ADMISSION_RATE=1, ADMISSION_CACHE="default")
+    def test_per_process_cache_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            AdmissionControlMiddleware(lambda request: None)
+        with self.assertRaises(ImproperlyConfigured):
+            acquire_slot("scoring", 1)
+
+    def test_slots(self):
+        slots = [acquire_slot("scoring", 2), acquire_slot("scoring", 2)]
+        self.assertEqual(len(set(slots)), 2)
+        self.assertIsNone(acquire_slot("scoring", 2))
+        release_slot(slots[0])
+        self.assertEqual(acquire_slot("scoring", 2), slots[0])
+
+    @override_settings(ADMISSION_RATE=0.5, ADMISSION_BURST=1)
+    def test_rate_limited_client(self):
+        client = APIClient()
+        self.assertEqual(client.get("/view-loans/1").status_code, 200)
+        response = client.get("/view-loans/1")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(client.get("/view-loans/1", REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    @override_settings(ADMISSION_MAX_QUEUE_DELAY_MS=1000)
+    def test_queued_request_is_shed(self):
+        client = APIClient()
+        response = client.get("/view-loans/1", HTTP_X_REQUEST_START=f"t={time.time() - 5}")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        response = client.get("/view-loans/1", HTTP_X_REQUEST_START=f"t={time.time()}")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ADMISSION_CONCURRENCY={"scoring": 1})
+    def test_concurrency_limit(self):
+        customer = create_customer()
+        loan_request = {
+            "customer_id": customer.customer_id,
+            "loan_amount": 1000,
+            "interest_rate": 10,
+            "tenure": 6,
+        }
+        slot = acquire_slot("scoring", 1)
+        response = self.client.post("/check-eligibility", loan_request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        release_slot(slot)
+        # The slot taken by a request is released once it has been served.
+        for _ in range(2):
+            self.assertEqual(self.client.post("/check-eligibility", loan_request).status_code, 200)
+
+
+@override_settings(RESPONSE_COMPRESSION=["zstd", "gzip"], RESPONSE_COMPRESSION_MIN_SIZE=256)
+class TestResponseRendering(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.customer = create_customer()
+        for loan in LOAN_TEST_DATA:
+            Loan.objects.create(customer=self.customer, **loan)
+        self.url = f"/view-loans/{self.customer.customer_id}"
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = CustomerLoanSerializer(Loan.objects.all(), many=True).data
+        data[0]["note"] = "line\u2028separator, caf\u00e9"
+        data[0][3] = datetime.datetime(2024, 1, 2, 3, 4, 5, 678901)
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+        self.assertEqual(FastJSONRenderer().render({"id": 2**70}), b'{"id":%d}' % 2**70)
+
+    def test_negotiate_encoding(self):
+        offered = ["zstd", "gzip"]
+        self.assertEqual(negotiate_encoding("gzip, deflate, br, zstd", offered), "zstd")
+        self.assertEqual(negotiate_encoding("zstd;q=0.5, gzip", offered), "gzip")
+        self.assertEqual(negotiate_encoding("*;q=0.1, gzip;q=0", offered), "zstd")
+        self.assertIsNone(negotiate_encoding("identity", offered))
+        self.assertIsNone(negotiate_encoding("", offered))
+
+    def test_response_compressed(self):
+        plain = self.client.get(self.url)
+        self.assertGreater(len(plain.content), 256)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+        # The weak tag still revalidates.
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_response_not_compressed(self):
+        response = self.client.get("/view-loans/0", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_html_response_not_compressed(self):
+        response = self.client.get(
+            self.url, HTTP_ACCEPT="text/html", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+        self.assertGreater(len(response.content), 1024)
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command("benchmark_rendering", rows=5, repeat=1, stdout=output)
+        self.assertIn(f"customer {self.customer.customer_id}", output.getvalue())
+        self.assertIn("compress gzip", output.getvalue())
+
+
+class TestGenerateSyntheticData(APITestCase):
+    def generate(self, *args) -> None:
+        call_command("generate_synthetic_data", "--customers", "50", *args, stdout=StringIO())
+
+    def test_export_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            self.generate("--seed", "7", "--no-db", "--export-dir", first)
+            self.generate("--seed", "7", "--no-db", "--export-dir", second)
+            for name in ("customer_data.csv", "loan_data.csv"):
+                with open(os.path.join(first, name)) as a, open(os.path.join(second, name)) as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def test_as_of(self):
+        self.generate("--seed", "7", "--as-of", "2020-06-30")
+        self.assertLessEqual(
+            Loan.objects.aggregate(latest=models.Max("date_of_approval"))["latest"],
+            datetime.date(2020, 6, 30),
+        )
+        # Loans still running on that day have EMIs left to pay.
+        self.assertTrue(
+            Loan.objects.filter(
+                end_date__gt=datetime.date(2020, 7, 31), emis_paid_on_time__lt=models.F("tenure")
+            ).exists()
+        )
+        with self.assertRaises(CommandError):
+            self.generate("--as-of", "2009-12-31")
+
+    def test_write_to_db(self):
+        self.generate("--revalidate-foreign-keys")
+        self.generate()
+
+        self.assertEqual(Customer.objects.count(), 100)
+        self.assertEqual(CustomerLoansVersion.objects.count(), 100)
+        self.assertGreater(Loan.objects.count(), 0)
+        self.assertFalse(Loan.objects.filter(end_date__lte=models.F("date_of_approval")).exists())
+        # Sequences continue after the generated ids.
+        customer = create_customer()
+        generated_ids = Customer.objects.exclude(pk=customer.pk).values_list("pk", flat=True)
+        self.assertGreater(customer.customer_id, max(generated_ids))
+
+
+class TestSeededBook(SeededTestCase):
+    def test_book_is_on_its_own_database(self):
+        self.assertEqual(
+            Customer.objects.using(SEED_DATABASE).count(), settings.TEST_SEED_CUSTOMERS
+        )
+        self.assertGreater(Loan.objects.using(SEED_DATABASE).count(), 0)
+        self.assertFalse(Customer.objects.exists())
+
+    def test_snapshots_match_scores(self):
+        today = datetime.date.today()
+        self.assertEqual(snapshot_scores(SEED_DATABASE, today), settings.TEST_SEED_CUSTOMERS)
+        snapshots = {
+            snapshot.customer_id: snapshot
+            for snapshot in CustomerScoreSnapshot.objects.using(SEED_DATABASE)
+        }
+        customers = (
+            Customer.objects.using(SEED_DATABASE)
+            .select_related("loan_history")
+            .filter(customer_id__in=range(1, settings.TEST_SEED_CUSTOMERS + 1, 20))
+        )
+        for customer in customers:
+            credit_score, loans = calculate_credit_score(customer)
+            snapshot = snapshots[customer.customer_id]
+            self.assertEqual(snapshot.credit_score, credit_score)
+            self.assertEqual(
+                snapshot.total_monthly_payment_paise,
+                to_minor_units(loans.pop("total_monthly_payment")),
+            )
+            for key, value in loans.items():
+                self.assertEqual(getattr(snapshot, key), value, key)
+
+
+class TestTestRunner(APITestCase):
+    def test_parallel_default(self):
+        with override_settings(TEST_PARALLEL="3"):
+            self.assertEqual(TestRunner().parallel, 3)
+            self.assertEqual(TestRunner(parallel=1).parallel, 1)
+        with override_settings(TEST_PARALLEL="auto"), mock.patch.dict(
+            os.environ, {"DJANGO_TEST_PROCESSES": "2"}
+        ):
+            self.assertEqual(TestRunner().parallel, 2)
+
+    def test_benchmark(self):
+        class Sample(unittest.TestCase):
+            def test_fast(self):
+                pass
+
+            def test_slow(self):
+                time.sleep(0.05)
+
+        # Timings measured in a worker process are sent back as events.
+        remote_result = TimedRemoteTestResult()
+        Sample("test_slow")(remote_result)
+        self.assertEqual(
+            [event[0] for event in remote_result.events],
+            ["startTest", "addSuccess", "addTiming", "stopTest"],
+        )
+        self.assertGreaterEqual(remote_result.events[2][2], 0.05)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timings.json")
+            runner = TestRunner(benchmark=1, benchmark_json=path, parallel=1)
+            output = StringIO()
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(StringIO()):
+                result = runner.run_suite(
+                    unittest.TestSuite([Sample("test_fast"), Sample("test_slow")])
+                )
+            with open(path) as file:
+                timings = json.load(file)
+        self.assertTrue(result.wasSuccessful())
+        slow_id = Sample("test_slow").id()
+        self.assertEqual(list(timings), [slow_id, Sample("test_fast").id()])
+        self.assertGreaterEqual(timings[slow_id], 0.05)
+        self.assertIn(f"s  {slow_id}", output.getvalue())
+
+
+@override_settings(PROFILING_TOKEN="secret")
+class TestProfiling(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.customer = create_customer()
+        self.admin = get_user_model().objects.create_superuser("admin", password="admin")
+
+    def check_eligibility(self, **headers):
+        return self.client.post(
+            "/check-eligibility",
+            {
+                "customer_id": self.customer.customer_id,
+                "loan_amount": 10000,
+                "interest_rate": 16,
+                "tenure": 10,
+            },
+            format="json",
+            headers=headers,
+        )
+
+    def test_capture_on_header(self):
+        self.assertNotIn("X-Profile-Id", self.check_eligibility())
+        self.assertNotIn("X-Profile-Id", self.check_eligibility(**{"X-Profile": "wrong"}))
+        response = self.check_eligibility(**{"X-Profile": "secret"})
+        self.assertEqual(response.status_code, 200)
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(capture.pk))
+        self.assertEqual(capture.path, "/check-eligibility")
+        self.assertEqual(capture.trigger, ProfileCapture.HEADER)
+
+    @override_settings(PROFILING_TOKEN="")
+    def test_not_loaded_when_off(self):
+        self.check_eligibility(**{"X-Profile": "secret"})
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_download(self):
+        self.check_eligibility(**{"X-Profile": "secret"})
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(self.client.get("/profiles/").status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        listing = self.client.get("/profiles/")
+        self.assertEqual(listing.data[0]["id"], capture.pk)
+
+        response = self.client.get(f"/profiles/{capture.pk}/pstats/")
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(response.content)
+            file.flush()
+            functions = pstats.Stats(file.name).stats
+        self.assertTrue(any(name == "determine_loan_eligibility" for _, _, name in functions))
+
+        profile = self.client.get(f"/profiles/{capture.pk}/speedscope/").json()["profiles"][0]
+        opened = sum(event["type"] == "O" for event in profile["events"])
+        self.assertEqual(opened * 2, len(profile["events"]))
+        self.assertGreater(profile["endValue"], 0)
+
+
+class TestLogging(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.customer = create_customer()
+
+    def test_unhandled_error_is_logged_with_context(self):
+        with mock.patch(
+            "core.views.determine_loan_eligibility", side_effect=RuntimeError("boom")
+        ), self.assertLogs("core.decorators", "ERROR") as logs:
+            response = self.client.post(
+                "/check-eligibility",
+                {
+                    "customer_id": self.customer.customer_id,
+                    "loan_amount": 10000,
+                    "interest_rate": 16,
+                    "tenure": 10,
+                },
+                format="json",
+                headers={"X-Request-ID": "req-1"},
+            )
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response["X-Request-ID"], "req-1")
+        record = logs.records[0]
+        self.assertEqual(record.view, "LoanEligibilityCheckAPIView.post")
+        self.assertEqual(record.customer_id, self.customer.customer_id)
+        self.assertGreaterEqual(record.duration_ms, 0)
+        self.assertIsNotNone(record.exc_info)
+
+    def test_queue_handler_writes_json(self):
+        handler = QueueStreamHandler()
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RequestContextFilter())
+        stream = StringIO()
+        handler.target.setStream(stream)
+        logger = logging.getLogger("core.tests.queue")
+        logger.addHandler(handler)
+        token = request_id_var.set("req-2")
+        try:
+            try:
+                raise RuntimeError("boom")
+            except RuntimeError:
+                logger.exception("Failed for %s", "John", extra={"customer_id": 7})
+        finally:
+            request_id_var.reset(token)
+            logger.removeHandler(handler)
+            handler.close()
+
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "Failed for John")
+        self.assertEqual(entry["request_id"], "req-2")
+        self.assertEqual(entry["customer_id"], 7)
+        self.assertIn("RuntimeError: boom", entry["exception"])
+
+    def test_sampling(self):
+        sampling = SamplingFilter(burst=2, window=0.05)
+
+        def make_record():
+            return logging.makeLogRecord(
+                {"name": "core", "msg": "Slow request %s", "levelno": logging.WARNING}
+            )
+
+        passed = [sampling.filter(make_record()) for _ in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        time.sleep(0.06)
+        record = make_record()
+        self.assertTrue(sampling.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+        # Errors are never sampled away.
+        errors = [
+            logging.makeLogRecord(
+                {"name": "core", "msg": "Unhandled error in %s", "levelno": logging.ERROR}
+            )
+            for _ in range(5)
+        ]
+        self.assertTrue(all(sampling.filter(error) for error in errors))
+
+
+class TestJobs(APITestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.customer = create_customer()
+        for loan in LOAN_TEST_DATA:
+            Loan.objects.create(customer=self.customer, **loan)
+
+    def test_bulk_eligibility_job(self):
+        loan_request = {
+            "customer_id": self.customer.customer_id,
+            "loan_amount": 100000,
+            "interest_rate": 8,
+            "tenure": 10,
+        }
+        response = self.client.post(
+            "/jobs/",
+            {
+                "job_type": "bulk_eligibility",
+                "payload": {"requests": [loan_request, {**loan_request, "customer_id": 0}]},
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], Job.PENDING)
+
+        run_job(claim_job(["bulk_eligibility"]))
+
+        response = self.client.get(f"/jobs/{response.data['id']}/")
+        self.assertEqual(response.data["status"], Job.SUCCEEDED)
+        results = response.data["result"]["results"]
+        eligibility = self.client.post("/check-eligibility", loan_request).data
+        self.assertEqual(results[0], dict(eligibility))
+        self.assertEqual(results[1]["error"], "Customer not found.")
+
+    @override_settings(JOB_LEASE_SECONDS=60, JOB_MAX_ATTEMPTS=2)
+    def test_requeue_expired_jobs(self):
+        stale = timezone.now() - datetime.timedelta(seconds=61)
+        lost = Job.objects.create(job_type="rescore_portfolio")
+        self.assertEqual(claim_job(["rescore_portfolio"]), lost)
+        Job.objects.filter(pk=lost.pk).update(heartbeat_at=stale)
+        exhausted = Job.objects.create(
+            job_type="rescore_portfolio", status=Job.RUNNING, heartbeat_at=stale, attempts=2
+        )
+        alive = Job.objects.create(
+            job_type="rescore_portfolio", status=Job.RUNNING, heartbeat_at=stale, attempts=1
+        )
+        heartbeat_jobs([alive.pk])
+
+        self.assertEqual(requeue_expired_jobs(), (1, 1))
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.attempts), (Job.PENDING, 1))
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, Job.FAILED)
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, Job.RUNNING)
+        # The re-queued job is claimed again, as its second attempt.
+        self.assertEqual(claim_job(["rescore_portfolio"]).attempts, 2)
+
+    def test_private_job_types_are_not_exposed(self):
+        response = self.client.post(
+            "/jobs/", {"job_type": "load_data_from_excel"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@tag(SERIAL_TAG)
+class TestJobWorker(TransactionTestCase):
+    """Runs in the main process, as test processes are daemons and cannot fork workers"""
+
+    def test_run_jobs_once(self):
+        create_customer()
+        job = Job.objects.create(job_type="rescore_portfolio")
+        failing_job = Job.objects.create(
+            job_type="bulk_eligibility", payload={"requests": [{}]}
+        )
+
+        call_command("run_jobs", "--once", "--workers", "2", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result["customers"], 1)
+        failing_job.refresh_from_db()
+        self.assertEqual(failing_job.status, Job.FAILED)
+        self.assertIn("ValidationError", failing_job.error)
+
+    def test_daily_jobs(self):
+        with (
+            contextlib.redirect_stdout(StringIO()) as printed,
+            self.assertLogs("core.management.commands.snapshot_scores", logging.INFO) as logs,
+        ):
+            for _ in range(2):
+                call_command(
+                    "run_jobs", "--once", "--job-type", "snapshot_scores", stdout=StringIO()
+                )
+
+        # The job logs its outcome instead of printing the command's progress.
+        self.assertEqual(printed.getvalue(), "")
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].snapshots, 0)
+        job = Job.objects.get(job_type="snapshot_scores")
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.payload, {"date": timezone.localdate().isoformat()})
+        with override_settings(JOB_DAILY=[]):
+            self.assertEqual(enqueue_daily_jobs(["snapshot_scores"]), [])
+        self.assertEqual(enqueue_daily_jobs(["rescore_portfolio"]), [])
+
+    def test_worker_survives_a_crashed_process(self):
+        crashing = JobType("crash", lambda payload: os._exit(1), 1, False)
+        with mock.patch.dict(JOB_TYPES, {"crash": crashing}):
+            crashed_job = Job.objects.create(job_type="crash")
+            job = Job.objects.create(job_type="rescore_portfolio")
+            call_command(
+                "run_jobs",
+                "--once",
+                "--pool",
+                "process",
+                "--workers",
+                "1",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+
+        crashed_job.refresh_from_db()
+        self.assertEqual(crashed_job.status, Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
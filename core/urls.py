@@ -7,16 +7,24 @@ from core.views import (
     CreateLoanAPIView,
     LoanRetrieveViewSet,
     CustomerLoansAPIView,
+    CreditScoreBreakdownAPIView,
+    EventFeedAPIView,
+    JobViewSet,
+    ProfileCaptureViewSet,
 )
 
 
 router = DefaultRouter()
 router.register(r"register", CustomerRegisterViewSet, basename="customer")
 router.register(r"view-loan", LoanRetrieveViewSet, basename="loan")
+router.register(r"jobs", JobViewSet, basename="job")
+router.register(r"profiles", ProfileCaptureViewSet, basename="profile")
 
 urlpatterns = [
     path("check-eligibility", LoanEligibilityCheckAPIView.as_view()),
     path("create-loan", CreateLoanAPIView.as_view()),
     path("view-loans/<int:customer_id>", CustomerLoansAPIView.as_view()),
+    path("credit-score/<int:customer_id>", CreditScoreBreakdownAPIView.as_view()),
+    path("events", EventFeedAPIView.as_view()),
 ]
 urlpatterns += router.urls
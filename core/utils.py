@@ -1,14 +1,30 @@
-from datetime import datetime, timedelta
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Sum, When, Case, F, Expression, fields, Value, Q
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
 
-from core.models import Customer, Loan
+from core.models import (
+    BASIS_POINTS_PER_PERCENT,
+    MINOR_UNITS_PER_RUPEE,
+    ArchivedLoan,
+    Customer,
+    CustomerLoanHistory,
+    CustomerLoansVersion,
+    Loan,
+    to_minor_units,
+)
 from core.constants import (
+    LOAN_INTEREST_RATE_UPDATED_MESSAGE,
     LOAN_SUCCESSFUL_MESSAGE,
-    LOAN_UNSUCCESSFUL_12_MESSAGE,
-    LOAN_UNSUCCESSFUL_16_MESSAGE,
     LOAN_UNSUCCESSFUL_MESSAGE,
     LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE,
 )
+from core.pricing import CompiledPricingPolicy, get_pricing_policy
+from core.sharding import shard_for_customer, shard_for_loan
 
 
 def calculate_emis_till_date(
@@ -16,9 +32,10 @@ def calculate_emis_till_date(
     emis_paid_on_time: int,
     approval_date: datetime.date,
     end_date: datetime.date,
+    as_of: date | None = None,
 ) -> int:
-    """Calculate the total number of actual EMIs till date from the date of approval of loan"""
-    today = datetime.today().date()
+    """Calculate the total number of actual EMIs till date (or `as_of`) since the loan's approval"""
+    today = as_of or datetime.today().date()
     if today > end_date or emis_paid_on_time == tenure:
         return tenure
     total_emis = (
@@ -27,23 +44,55 @@ def calculate_emis_till_date(
     return total_emis
 
 
-def calculate_credit_score(customer: Customer) -> tuple[int, dict]:
-    """Calculate the credit score of a customer based on the number of loans and EMIs paid on time
+def minor_units(field: str) -> Expression:
+    """Database-side rupees to paise of a float column, see `core.models.to_minor_units`"""
+    return Cast(Round(F(field) * MINOR_UNITS_PER_RUPEE), fields.BigIntegerField())
 
-    ## Algorithm:
-    - If customer has no loan credit score is 100
-    - Credit score will be 0 < score <= 100
-    - Check sum of all loans if >= approved_limit then score = 0
-    - Credit score wil be based on two parts
-        - 80% depends on total loan volume and weight factor (30)
-        for normalization and ratio of emi_paid_on_time to total_emis till date.
-        - 20% depends on loans taken in last year and weight factor (10)
-        for normalization.
+
+def basis_points(field: str) -> Expression:
+    """Database-side percent to basis points of a float column"""
+    return Cast(Round(F(field) * BASIS_POINTS_PER_PERCENT), fields.IntegerField())
+
+
+def get_loan_history(customer: Customer) -> CustomerLoanHistory | None:
+    """Return the counters of the customer's archived loans, if any were archived
+
+    Fetch customers with `select_related("loan_history")` to avoid a query here.
     """
+    try:
+        return customer.loan_history
+    except CustomerLoanHistory.DoesNotExist:
+        return None
+
+
+def get_loan_aggregates(customer: Customer, as_of: date | None = None) -> dict:
+    """Figures of a customer's loans the credit score is computed from
+
+    total_amount, active_loan and total_monthly_payment cover active loans,
+    total_loan, emi_paid and total_emi every loan including archived ones, and
+    last_year_loan the loans approved in the last 365 days.
+
+    With `as_of` the figures are those of that date, see `get_loan_aggregates_as_of`.
+
+    The lifetime figures need every loan of the customer, so on a partitioned
+    loan table (see `partition_loans`) this probes every partition and is slower
+    than on a plain one; archiving closed loans is what keeps it small.
+    """
+    if as_of is not None:
+        return get_loan_aggregates_as_of(customer, as_of)
     active_loan_predicate = Q(end_date__gte=datetime.today().date()) & Q(
         tenure__gt=F("emis_paid_on_time")
     )
-    loans = Loan.objects.filter(customer=customer).aggregate(
+    if settings.MONEY_MINOR_UNITS_READS:
+        # Exact integer sum, rows not backfilled yet are converted on the fly.
+        monthly_payment, no_payment = (
+            Coalesce("monthly_payment_paise", minor_units("monthly_payment")),
+            0,
+        )
+    else:
+        monthly_payment, no_payment = F("monthly_payment"), 0.0
+    # The related manager reads from the customer's shard.
+    loans = customer.loan_set.aggregate(
         total_amount=Sum(
             Case(
                 When(
@@ -66,9 +115,9 @@ def calculate_credit_score(customer: Customer) -> tuple[int, dict]:
             Case(
                 When(
                     active_loan_predicate,
-                    then=F("monthly_payment"),
+                    then=monthly_payment,
                 ),
-                default=0.0,
+                default=no_payment,
             )
         ),
         total_loan=Count("loan_id"),
@@ -83,26 +132,128 @@ def calculate_credit_score(customer: Customer) -> tuple[int, dict]:
         ),
         emi_paid=Sum("emis_paid_on_time"),
     )
-    approved_loan_date = Loan.objects.filter(customer=customer).values_list(
+    approved_loan_date = customer.loan_set.values_list(
         "tenure", "emis_paid_on_time", "date_of_approval", "end_date"
     )
     total_emi = 0
-    for date in approved_loan_date:
-        total_emi += calculate_emis_till_date(*date)
+    for loan_dates in approved_loan_date:
+        total_emi += calculate_emis_till_date(*loan_dates)
     loans["total_emi"] = total_emi
     for key in loans:
         if not loans[key]:
             loans[key] = 0
+    if settings.MONEY_MINOR_UNITS_READS:
+        loans["total_monthly_payment"] /= MINOR_UNITS_PER_RUPEE
+    history = get_loan_history(customer)
+    if history is not None:
+        loans["total_loan"] += history.total_loan
+        loans["emi_paid"] += history.emi_paid
+        loans["total_emi"] += history.total_emi
+    return loans
+
 
-    if customer.approved_limit <= loans.get("total_amount", 0):
-        return 0, loans
+def get_loan_aggregates_as_of(customer: Customer, as_of: date) -> dict:
+    """`get_loan_aggregates` as it would have been computed on `as_of`
+
+    Only loans approved by then count, archived ones included. Repayments are
+    kept as a running count rather than dated, so for a past date a loan's
+    EMIs paid are capped at the EMIs due by then. For today the figures equal
+    those of `get_loan_aggregates`. Daily `CustomerScoreSnapshot`s record the
+    exact figures from the day they are taken (see `snapshot_scores`).
+    """
+    is_past = as_of < datetime.today().date()
+    last_year = as_of - timedelta(days=365)
+    columns = (
+        "loan_amount",
+        "tenure",
+        "monthly_payment",
+        "monthly_payment_paise",
+        "emis_paid_on_time",
+        "date_of_approval",
+        "end_date",
+    )
+    rows = [
+        *customer.loan_set.filter(date_of_approval__lte=as_of).values_list(*columns),
+        *customer.archived_loans.filter(date_of_approval__lte=as_of).values_list(*columns),
+    ]
+    loans = dict.fromkeys(
+        (
+            "total_amount",
+            "active_loan",
+            "total_monthly_payment",
+            "total_loan",
+            "last_year_loan",
+            "emi_paid",
+            "total_emi",
+        ),
+        0,
+    )
+    for amount, tenure, payment, payment_paise, paid, approval_date, end_date in rows:
+        if is_past and as_of <= end_date:
+            months_due = (as_of.year - approval_date.year) * 12 + as_of.month - approval_date.month
+            paid = min(paid, months_due)
+        if end_date >= as_of and tenure > paid:
+            loans["total_amount"] += amount
+            loans["active_loan"] += 1
+            if settings.MONEY_MINOR_UNITS_READS:
+                payment = payment_paise if payment_paise is not None else to_minor_units(payment)
+            loans["total_monthly_payment"] += payment
+        loans["total_loan"] += 1
+        loans["last_year_loan"] += approval_date >= last_year
+        loans["emi_paid"] += paid
+        loans["total_emi"] += calculate_emis_till_date(
+            tenure, paid, approval_date, end_date, as_of
+        )
+    if settings.MONEY_MINOR_UNITS_READS:
+        loans["total_monthly_payment"] /= MINOR_UNITS_PER_RUPEE
+    return loans
+
+
+def credit_score_components(customer: Customer, loans: dict) -> dict:
+    """Points each part of the credit score contributes, from `get_loan_aggregates` figures
+
+    - limit_exceeded: active loans reach the approved limit, which makes the score 0
+    - repayment_ratio: EMIs paid on time out of the EMIs due till date
+    - loan_history: up to 80 points, loan volume (30 per loan) weighted by repayment_ratio
+    - recent_loans: up to 20 points, 10 per loan approved in the last year
+    """
     emis_paid_on_time_factor = loans.get("emi_paid", 0) / (loans.get("total_emi") or 1)
     all_loans = loans.get("total_loan", 0) * 30
     last_year_loan = loans.get("last_year_loan", 0) * 10
-    credit_score = min(20, last_year_loan) + min(
-        80, min(80, all_loans) * emis_paid_on_time_factor
-    )
-    return round(credit_score), loans
+    return {
+        "limit_exceeded": customer.approved_limit <= loans.get("total_amount", 0),
+        "repayment_ratio": emis_paid_on_time_factor,
+        "loan_history": min(80, min(80, all_loans) * emis_paid_on_time_factor),
+        "recent_loans": min(20, last_year_loan),
+    }
+
+
+def credit_score_from_components(components: dict) -> int:
+    if components["limit_exceeded"]:
+        return 0
+    return round(components["recent_loans"] + components["loan_history"])
+
+
+def calculate_credit_score(
+    customer: Customer, as_of: date | None = None
+) -> tuple[int, dict]:
+    """Calculate the credit score of a customer based on the number of loans and EMIs paid on time
+
+    ## Algorithm:
+    - If customer has no loan credit score is 100
+    - Credit score will be 0 < score <= 100
+    - Check sum of all loans if >= approved_limit then score = 0
+    - Loans moved to the archive (see `archive_loans`) count through `CustomerLoanHistory`
+    - Credit score wil be based on two parts
+        - 80% depends on total loan volume and weight factor (30)
+        for normalization and ratio of emi_paid_on_time to total_emis till date.
+        - 20% depends on loans taken in last year and weight factor (10)
+        for normalization.
+
+    Returns the score and the `get_loan_aggregates` figures, as of `as_of` when given.
+    """
+    loans = get_loan_aggregates(customer, as_of)
+    return credit_score_from_components(credit_score_components(customer, loans)), loans
 
 
 def calculate_emi(
@@ -116,10 +267,19 @@ def calculate_emi(
 
 
 def determine_loan_eligibility(
-    loan_amount: float, interest_rate: float, tenure: int, customer: Customer
+    loan_amount: float,
+    interest_rate: float,
+    tenure: int,
+    customer: Customer,
+    policy: CompiledPricingPolicy | None = None,
+    as_of: date | None = None,
 ) -> tuple[bool, bool, dict, str]:
     """Determine the loan eligibility of a customer based on the credit score and monthly payment
 
+    The score bands, corrected interest rates and the maximum share of the salary
+    going to EMIs come from the pricing `policy` (the default product's policy if
+    not given). With `as_of` the customer is scored as of that date.
+
     Returns:
     - A tuple of two boolean values and a dictionary (is_eligible, is_interest_rate_updated, loan_data, message)
         - is_eligible: `True` if the customer is eligible for the loan, `False` otherwise
@@ -130,7 +290,9 @@ def determine_loan_eligibility(
         - message: A string containing the message for the customer
 
     """
-    credit_score, loan_data = calculate_credit_score(customer)
+    if policy is None:
+        policy = get_pricing_policy()
+    credit_score, loan_data = calculate_credit_score(customer, as_of)
 
     monthly_payment = calculate_emi(loan_amount, tenure, interest_rate)
     res_data = {
@@ -141,28 +303,66 @@ def determine_loan_eligibility(
 
     if (
         loan_data["total_monthly_payment"] + monthly_payment
-        > customer.monthly_salary * 0.5
+        > customer.monthly_salary * policy.max_dti_ratio
     ):
         msg = LOAN_UNSUCCESSFUL_MONTHLY_PAYMENT_EXCEED_50_MESSAGE
         return False, False, res_data, msg
 
-    if credit_score > 50:
+    is_eligible, rate_floor = policy.price(credit_score)
+    if not is_eligible:
+        return False, False, res_data, LOAN_UNSUCCESSFUL_MESSAGE
+
+    if rate_floor is None or interest_rate >= rate_floor:
         return True, False, res_data, msg
+    res_data["interest_rate"] = rate_floor
+    res_data["monthly_payment"] = calculate_emi(loan_amount, tenure, rate_floor)
+    msg = LOAN_INTEREST_RATE_UPDATED_MESSAGE.format(rate=rate_floor)
+    return True, True, res_data, msg
+
+
+def request_fingerprint(data) -> str:
+    """Stable hash of a request body, used to detect reuse of an idempotency key"""
+    if hasattr(data, "dict"):
+        data = data.dict()
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
-    if credit_score > 30:
-        if interest_rate >= 12:
-            return True, False, res_data, msg
-        res_data["interest_rate"] = 12
-        res_data["monthly_payment"] = calculate_emi(loan_amount, tenure, 12)
-        msg = LOAN_UNSUCCESSFUL_12_MESSAGE
-        return True, True, res_data, msg
-
-    if credit_score > 10:
-        if interest_rate >= 16:
-            return True, False, res_data, msg
-        res_data["interest_rate"] = 16
-        res_data["monthly_payment"] = calculate_emi(loan_amount, tenure, 16)
-        msg = LOAN_UNSUCCESSFUL_16_MESSAGE
-        return True, True, res_data, msg
-
-    return False, False, res_data, LOAN_UNSUCCESSFUL_MESSAGE
+
+def get_customer_loans_version(customer_id: int) -> tuple[int, datetime] | None:
+    """Return the `(version, updated_at)` of a customer's loans, `None` if the customer does not exist"""
+    return (
+        CustomerLoansVersion.objects.using(shard_for_customer(customer_id))
+        .filter(customer_id=customer_id)
+        .values_list("version", "updated_at")
+        .first()
+    )
+
+
+def bump_customer_loans_version(customer_id: int) -> None:
+    """Invalidate cached loan responses of a customer by bumping its version counter"""
+    CustomerLoansVersion.objects.using(shard_for_customer(customer_id)).filter(
+        customer_id=customer_id
+    ).update(version=F("version") + 1, updated_at=timezone.now())
+
+
+def get_loan_customer_id(loan_id: int) -> int | None:
+    """Return the customer id owning a loan, cached since a loan never changes owner"""
+    cache_key = f"loan-customer:{loan_id}"
+    customer_id = cache.get(cache_key)
+    if customer_id is None:
+        customer_id = (
+            Loan.objects.using(shard_for_loan(loan_id))
+            .filter(loan_id=loan_id)
+            .values_list("customer_id", flat=True)
+            .first()
+        )
+        if customer_id is None:
+            customer_id = (
+                ArchivedLoan.objects.using(shard_for_loan(loan_id))
+                .filter(loan_id=loan_id)
+                .values_list("customer_id", flat=True)
+                .first()
+            )
+        if customer_id is not None:
+            cache.set(cache_key, customer_id, None)
+    return customer_id
@@ -2,25 +2,55 @@ import calendar
 import datetime
 from dateutil import relativedelta
 from rest_framework.viewsets import GenericViewSet
-from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
+from rest_framework.mixins import CreateModelMixin, ListModelMixin, RetrieveModelMixin
 from rest_framework import status
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.generics import get_object_or_404
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from django.http import Http404, HttpResponse, JsonResponse
+from django.db import DEFAULT_DB_ALIAS
 from drf_yasg.utils import swagger_auto_schema
 
-from core.models import Customer, Loan
+from core.constants import CUSTOMER_NOT_FOUND_MESSAGE
+from core.models import ArchivedLoan, Customer, Job, Loan, ProfileCapture, to_minor_units
 from core.serializers import (
     CustomerSerializer,
     LoanRequestBodySerializer,
     LoanEligibilityResponseSerializer,
+    CreditScoreBreakdownSerializer,
+    CreditScoreQuerySerializer,
     LoanSerializer,
     LoanCreateResponseSerializer,
     LoanSingleRecordSerializer,
     CustomerLoanSerializer,
+    JobSerializer,
+    ProfileCaptureSerializer,
+    EventFeedQuerySerializer,
+    EventFeedSerializer,
+    OutboxEventSerializer,
+)
+from core.exposure import can_create_loan_in_one_statement, create_loan_if_eligible
+from core.pricing import get_pricing_policy
+from core.sharding import shard_for_customer, shard_for_loan
+from core.outbox import wait_for_events
+from core.profiling import stats_to_speedscope
+from core.utils import (
+    credit_score_components,
+    credit_score_from_components,
+    determine_loan_eligibility,
+    get_loan_aggregates,
+    get_loan_customer_id,
+)
+from core.decorators import (
+    conditional_customer_response,
+    handle_exceptions,
+    idempotent,
+    limit_concurrency,
+    query_budget,
 )
-from core.utils import determine_loan_eligibility
-from core.decorators import handle_exceptions
 
 
 class CustomerRegisterViewSet(CreateModelMixin, GenericViewSet):
@@ -30,6 +60,7 @@ class CustomerRegisterViewSet(CreateModelMixin, GenericViewSet):
     @swagger_auto_schema(
         tags=["Customer"],
     )
+    @query_budget(3)
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
@@ -47,14 +78,24 @@ class LoanEligibilityCheckAPIView(APIView):
         request_body=LoanRequestBodySerializer,
         responses={200: LoanEligibilityResponseSerializer},
     )
+    @limit_concurrency("scoring")
+    @query_budget(5)
     @handle_exceptions
     def post(self, request: Request) -> Response:
         data = LoanRequestBodySerializer(data=request.data)
         data.is_valid(raise_exception=True)
         data = data.validated_data
-        customer = Customer.objects.get(customer_id=data["customer_id"])
+        customer = (
+            Customer.objects.using(shard_for_customer(data["customer_id"]))
+            .select_related("loan_history")
+            .get(customer_id=data["customer_id"])
+        )
         is_eligible, _, updated_data, _ = determine_loan_eligibility(
-            data["loan_amount"], data["interest_rate"], data["tenure"], customer
+            data["loan_amount"],
+            data["interest_rate"],
+            data["tenure"],
+            customer,
+            get_pricing_policy(data["product"]),
         )
         res_data = LoanEligibilityResponseSerializer(
             data={
@@ -89,45 +130,49 @@ class CreateLoanAPIView(APIView):
         operation_description=(
             "Create a loan for the customer. \
             If the customer is not eligible, the loan will not be approved. \
-            If the customer is eligible, the loan will be approved."
+            If the customer is eligible, the loan will be approved. \
+            Send an `Idempotency-Key` header to safely retry the request: \
+            repeated keys return the stored response without creating another loan."
         ),
         request_body=LoanRequestBodySerializer,
         responses={200: LoanCreateResponseSerializer},
     )
+    @limit_concurrency("scoring")
+    @query_budget(8)
     @handle_exceptions
+    @idempotent
     def post(self, request: Request) -> Response:
         req_data = LoanRequestBodySerializer(data=request.data)
         req_data.is_valid(raise_exception=True)
         req_data = req_data.validated_data
-        customer = Customer.objects.get(customer_id=req_data["customer_id"])
+        policy = get_pricing_policy(req_data["product"])
+        if can_create_loan_in_one_statement(req_data["loan_amount"]):
+            return self.create_in_one_statement(req_data, policy)
+
+        customer = (
+            Customer.objects.using(shard_for_customer(req_data["customer_id"]))
+            .select_related("loan_history")
+            .get(customer_id=req_data["customer_id"])
+        )
         is_eligible, is_updated, updated_data, message = determine_loan_eligibility(
             req_data["loan_amount"],
             req_data["interest_rate"],
             req_data["tenure"],
             customer,
+            policy,
         )
 
         data = {
-            "customer": customer.customer_id,
             "loan_amount": req_data["loan_amount"],
             "interest_rate": updated_data.get("interest_rate"),
             "tenure": req_data["tenure"],
             "monthly_payment": int(updated_data.get("monthly_payment")),
+            "monthly_payment_paise": to_minor_units(updated_data.get("monthly_payment")),
         }
 
         # If the customer is not eligible or the interest rate is updated, then the loan is not approved
         if not is_eligible or is_updated:
-            data = {
-                "loan_id": None,
-                "customer_id": customer.customer_id,
-                "loan_approved": False,
-                "monthly_payment": updated_data.get("monthly_payment"),
-                "message": message,
-            }
-            return Response(
-                data,
-                status=status.HTTP_200_OK,
-            )
+            return self.rejected_response(customer.customer_id, updated_data, message)
 
         # Add the date of approval and end date
         today = datetime.date.today()
@@ -137,22 +182,84 @@ class CreateLoanAPIView(APIView):
         # Save the loan
         serializer = LoanSerializer(data=data, context={"message": message})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(customer=customer)
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED,
         )
 
+    def create_in_one_statement(self, req_data: dict, policy) -> Response:
+        """Same decision and responses as `post`, with the eligibility checks and
+        the insert done by a single SQL statement (see `core.exposure`)"""
+        today = datetime.date.today()
+        is_eligible, is_updated, updated_data, message, loan = create_loan_if_eligible(
+            req_data["customer_id"],
+            req_data["loan_amount"],
+            req_data["interest_rate"],
+            req_data["tenure"],
+            policy,
+            end_date=self.calculate_end_date(today, req_data["tenure"]),
+            today=today,
+        )
+        if not is_eligible or is_updated:
+            return self.rejected_response(req_data["customer_id"], updated_data, message)
+        return Response(
+            LoanSerializer(loan, context={"message": message}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    def rejected_response(self, customer_id: int, updated_data: dict, message: str) -> Response:
+        data = {
+            "loan_id": None,
+            "customer_id": customer_id,
+            "loan_approved": False,
+            "monthly_payment": updated_data.get("monthly_payment"),
+            "message": message,
+        }
+        return Response(
+            data,
+            status=status.HTTP_200_OK,
+        )
+
 
 class LoanRetrieveViewSet(RetrieveModelMixin, GenericViewSet):
-    queryset = Loan.objects.all().prefetch_related("customer")
+    queryset = Loan.objects.select_related("customer").only(
+        "loan_id",
+        "loan_amount",
+        "interest_rate",
+        "tenure",
+        "monthly_payment",
+        "customer__customer_id",
+        "customer__first_name",
+        "customer__last_name",
+        "customer__age",
+        "customer__phone_number",
+    )
     serializer_class = LoanSingleRecordSerializer
 
+    def get_shard(self) -> str:
+        pk = self.kwargs["pk"]
+        return shard_for_loan(int(pk)) if pk.isdigit() else DEFAULT_DB_ALIAS
+
+    def get_queryset(self):
+        return super().get_queryset().using(self.get_shard())
+
     @swagger_auto_schema(
         tags=["Loan"],
     )
+    @query_budget(5)
+    @conditional_customer_response(
+        lambda pk, **kwargs: get_loan_customer_id(int(pk)) if pk.isdigit() else None
+    )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived_loan = get_object_or_404(
+                ArchivedLoan.objects.using(self.get_shard()).select_related("customer"),
+                pk=kwargs["pk"],
+            )
+            return Response(self.get_serializer(archived_loan).data)
 
 
 class CustomerLoansAPIView(APIView):
@@ -161,11 +268,168 @@ class CustomerLoansAPIView(APIView):
         operation_description="Retrieve all the loans of a customer",
         responses={200: CustomerLoanSerializer(many=True)},
     )
+    @query_budget(3)
     @handle_exceptions
+    @conditional_customer_response(lambda customer_id, **kwargs: customer_id)
     def get(self, request: Request, customer_id: int) -> Response:
-        loans = Loan.objects.filter(customer_id=customer_id)
-        data = CustomerLoanSerializer(loans, many=True)
+        shard = shard_for_customer(customer_id)
+        loans = Loan.objects.using(shard).filter(customer_id=customer_id).only(
+            "loan_id",
+            "loan_amount",
+            "interest_rate",
+            "monthly_payment",
+            "tenure",
+            "emis_paid_on_time",
+            "date_of_approval",
+            "end_date",
+        )
+        archived_loans = ArchivedLoan.objects.using(shard).filter(customer_id=customer_id)
+        data = CustomerLoanSerializer([*loans, *archived_loans], many=True)
         return Response(
             data.data,
             status=status.HTTP_200_OK,
         )
+
+
+class CreditScoreBreakdownAPIView(APIView):
+    @swagger_auto_schema(
+        tags=["Customer"],
+        operation_description=(
+            "Credit score of the customer, the points each part of it contributes and \
+            the loan figures it is computed from, as used by check-eligibility. With \
+            `as_of` the customer is scored as of a past date: only loans approved by \
+            then count, and EMIs paid are capped at the EMIs due by then."
+        ),
+        query_serializer=CreditScoreQuerySerializer,
+        responses={200: CreditScoreBreakdownSerializer},
+    )
+    @query_budget(4)
+    @handle_exceptions
+    @conditional_customer_response(lambda customer_id, **kwargs: customer_id)
+    def get(self, request: Request, customer_id: int) -> Response:
+        params = CreditScoreQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        as_of = params.validated_data.get("as_of")
+        customer = (
+            Customer.objects.using(shard_for_customer(customer_id))
+            .select_related("loan_history")
+            .filter(customer_id=customer_id)
+            .first()
+        )
+        if customer is None:
+            return Response(
+                {"message": CUSTOMER_NOT_FOUND_MESSAGE},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        loans = get_loan_aggregates(customer, as_of)
+        components = credit_score_components(customer, loans)
+        data = {
+            "customer_id": customer.customer_id,
+            "as_of": as_of or datetime.date.today(),
+            "credit_score": credit_score_from_components(components),
+            "approved_limit": customer.approved_limit,
+            "monthly_salary": customer.monthly_salary,
+            "components": components,
+            "loans": loans,
+        }
+        return Response(
+            CreditScoreBreakdownSerializer(data).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class EventFeedAPIView(APIView):
+    @swagger_auto_schema(
+        tags=["Event"],
+        operation_description=(
+            "Customer registrations and loan changes in commit order, for consumers \
+            that keep a copy of the loan data. Pass the returned `next` as `after` to \
+            get the following events; with `wait` the request is held open until new \
+            events arrive. Each shard has its own feed."
+        ),
+        query_serializer=EventFeedQuerySerializer,
+        responses={200: EventFeedSerializer},
+    )
+    @query_budget(2)
+    @handle_exceptions
+    def get(self, request: Request) -> Response:
+        params = EventFeedQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        events = wait_for_events(
+            params["shard"], params["after"], params["limit"], params["wait"]
+        )
+        return Response(
+            {
+                "events": OutboxEventSerializer(events, many=True).data,
+                "next": events[-1].pk if events else params["after"],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class JobViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+    @swagger_auto_schema(
+        tags=["Job"],
+        operation_description=(
+            "Queue a long-running job (`bulk_eligibility`, `rescore_portfolio` or \
+            `backtest_policy`). The job runs in the background worker, poll its status \
+            with the returned id."
+        ),
+        responses={202: JobSerializer},
+    )
+    @query_budget(1)
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @swagger_auto_schema(
+        tags=["Job"],
+    )
+    @query_budget(1)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ProfileCaptureViewSet(ListModelMixin, GenericViewSet):
+    queryset = ProfileCapture.objects.defer("stats").order_by("-duration_ms")
+    serializer_class = ProfileCaptureSerializer
+    permission_classes = (IsAdminUser,)
+
+    @swagger_auto_schema(
+        tags=["Profiling"],
+        operation_description="List the slowest stored request profiles.",
+    )
+    @query_budget(1)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        tags=["Profiling"],
+        operation_description="Download a profile for `python -m pstats` or snakeviz.",
+    )
+    @action(detail=True, url_path="pstats")
+    @query_budget(1)
+    def download_pstats(self, request, pk=None):
+        capture = get_object_or_404(ProfileCapture, pk=pk)
+        response = HttpResponse(bytes(capture.stats), content_type="application/octet-stream")
+        response["Content-Disposition"] = f'attachment; filename="profile-{capture.pk}.pstats"'
+        return response
+
+    @swagger_auto_schema(
+        tags=["Profiling"],
+        operation_description="Download a profile to open in https://www.speedscope.app.",
+    )
+    @action(detail=True, url_path="speedscope")
+    @query_budget(1)
+    def download_speedscope(self, request, pk=None):
+        capture = get_object_or_404(ProfileCapture, pk=pk)
+        response = JsonResponse(stats_to_speedscope(bytes(capture.stats), str(capture)))
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{capture.pk}.speedscope.json"'
+        )
+        return response